@@ -0,0 +1,344 @@
+import email.utils
+import io
+import json
+import logging
+import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from http import HTTPStatus
+from urllib.parse import unquote, urlsplit
+from compress import COMPRESSIBLE_EXTENSIONS, DEFAULT_MIN_SIZE
+from server import (
+    ENCODINGS,
+    StaticRequestHandler,
+    StaticServer,
+    content_type_for,
+    parse_accept_encoding,
+    parse_headers_file,
+    run_server,
+)
+from state import save_state
+
+# Archive suffix -> format; only "tar" and "zip" archives can be served in place
+ARCHIVE_FORMATS = {".zip": "zip", ".tar": "tar", ".tar.gz": "tar.gz", ".tgz": "tar.gz", ".tar.xz": "tar.xz"}
+
+# The member index is written next to the archive: site.tar -> site.tar.index.json
+INDEX_SUFFIX = ".index.json"
+
+TAR_BLOCK = 512
+
+
+def archive_format(path: str) -> str:
+    for suffix, archive_type in ARCHIVE_FORMATS.items():
+        if path.endswith(suffix):
+            return archive_type
+    raise ValueError(f"Unsupported archive {path}: use one of {', '.join(ARCHIVE_FORMATS)}")
+
+
+def is_compressible_name(name: str) -> bool:
+    return posixpath.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+class ArchiveWriter:
+    """Writes build outputs straight into a tar or zip archive, with no files on disk.
+
+    It offers the write/stream/save interface of OutputWriter, so the page
+    generators can write into it unchanged. The archive is written under a
+    temporary name and renamed on close, together with an index mapping
+    every member to the offset of its data, which ArchiveSite uses to serve
+    members without unpacking.
+
+    .tar.gz and .tar.xz archives compress the whole stream (smallest for
+    transfer, cannot be served in place); .zip archives deflate text
+    members one by one and can be served.
+
+    Attributes:
+        members: name -> [data offset, size, stored size, "stored" or "deflated"]
+        written: Number of pages written
+    """
+
+    def __init__(self, path: str, root_dir: str, encoders: dict | None = None,
+                 min_size: int = DEFAULT_MIN_SIZE, report=None):
+        """
+        Args:
+            path: Archive to create
+            root_dir: Directory the paths given to write and stream are
+                under; member names are relative to it
+            encoders: Sibling extension -> compress function; text members
+                of at least min_size bytes get precompressed siblings
+        """
+        self.path = path
+        self.format = archive_format(path)
+        self.root_dir = root_dir
+        self.encoders = encoders or {}
+        self.min_size = min_size
+        self.report = report
+        self.tmp_path = f"{path}.tmp"
+        if self.format == "zip":
+            self.archive = zipfile.ZipFile(self.tmp_path, "w")
+        else:
+            mode = {"tar": "w", "tar.gz": "w:gz", "tar.xz": "w:xz"}[self.format]
+            self.archive = tarfile.open(self.tmp_path, mode)
+        self.mtime = time.time()
+        self.members = {}
+        self.written = 0
+        self.unchanged = 0
+        self.lock = threading.Lock()
+
+    def add(self, name: str, data: bytes):
+        """Add a member from memory, plus its precompressed siblings."""
+        with self.lock:
+            self.add_member(name, data)
+            if self.encoders and is_compressible_name(name) and len(data) >= self.min_size:
+                for ext, encode in self.encoders.items():
+                    compressed = encode(data)
+                    if len(compressed) < len(data):
+                        self.add_member(name + ext, compressed)
+
+    def add_member(self, name: str, data: bytes):
+        self.add_member_from(name, io.BytesIO(data), len(data))
+
+    def add_member_from(self, name: str, f, size: int):
+        """Add a member of size bytes, copied from the file object f in blocks."""
+        if self.format == "zip":
+            info = zipfile.ZipInfo(name, date_time=time.localtime(self.mtime)[:6])
+            info.external_attr = 0o644 << 16
+            info.compress_type = zipfile.ZIP_DEFLATED if is_compressible_name(name) else zipfile.ZIP_STORED
+            with self.archive.open(info, "w", force_zip64=size >= zipfile.ZIP64_LIMIT) as dest:
+                shutil.copyfileobj(f, dest)
+            self.record_zip_member(info)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = int(self.mtime)
+            info.mode = 0o644
+            self.archive.addfile(info, f)
+            self.record_tar_member(info)
+
+    def record_zip_member(self, info: zipfile.ZipInfo):
+        # The data ends where the archive file now ends
+        offset = self.archive.fp.tell() - info.compress_size
+        method = "deflated" if info.compress_type == zipfile.ZIP_DEFLATED else "stored"
+        self.members[info.filename] = [offset, info.file_size, info.compress_size, method]
+
+    def record_tar_member(self, info: tarfile.TarInfo):
+        # TarFile.offset is past the data, padded to a whole block
+        offset = self.archive.offset - -(-info.size // TAR_BLOCK) * TAR_BLOCK
+        self.members[info.name] = [offset, info.size, info.size, "stored"]
+
+    def add_file(self, name: str, path: str):
+        """Add a file from disk, streaming it into the archive."""
+        if self.encoders and is_compressible_name(name) and os.path.getsize(path) >= self.min_size:
+            with open(path, 'rb') as f:
+                self.add(name, f.read())
+            return
+        with self.lock:
+            if self.format == "zip":
+                compress_type = zipfile.ZIP_DEFLATED if is_compressible_name(name) else zipfile.ZIP_STORED
+                self.archive.write(path, name, compress_type)
+                self.record_zip_member(self.archive.infolist()[-1])
+            else:
+                info = self.archive.gettarinfo(path, name)
+                with open(path, 'rb') as f:
+                    self.archive.addfile(info, f)
+                self.record_tar_member(info)
+
+    def add_link(self, name: str, target: str, path: str):
+        """Add name as a second name for the member target (read from path)."""
+        if self.format == "zip":
+            self.add_file(name, path)
+            return
+        with self.lock:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.LNKTYPE
+            info.linkname = target
+            info.mtime = int(self.mtime)
+            self.archive.addfile(info)
+            for ext in ("", *self.encoders):
+                if target + ext in self.members:
+                    self.members[name + ext] = self.members[target + ext]
+
+    def add_tree(self, src_dir: str, include=None, rename=None):
+        """Add a static directory, like copy_directory does for a directory build.
+
+        Args:
+            include (set[str] | None): If given, only add these relative paths
+            rename (dict[str, str] | None): Fingerprint manifest; listed files
+                are added under their fingerprinted name and linked under
+                the original one
+        """
+        for root, _, files in os.walk(src_dir):
+            for file_name in sorted(files):
+                path = os.path.join(root, file_name)
+                rel_path = os.path.relpath(path, src_dir).replace(os.sep, "/")
+                if include is not None and rel_path not in include:
+                    continue
+                if rename and rel_path in rename:
+                    self.add_file(rename[rel_path], path)
+                    self.add_link(rel_path, rename[rel_path], path)
+                else:
+                    self.add_file(rel_path, path)
+
+    def member_name(self, dest_path: str) -> str:
+        return os.path.relpath(dest_path, self.root_dir).replace(os.sep, "/")
+
+    def write(self, dest_path: str, data: bytes, page: bool = True) -> bool:
+        self.add(self.member_name(dest_path), data)
+        if not page:
+            return True
+        with self.lock:
+            self.written += 1
+        if self.report:
+            self.report.add("pages written")
+        return True
+
+    def stream(self, dest_path: str, chunks) -> bool:
+        """Like write, for text chunks too large to hold.
+
+        tar and zip both need a member's size up front, so the chunks are
+        spooled to a temporary file next to the archive first. Precompressed
+        siblings, when enabled, still compress the page in one piece.
+        """
+        name = self.member_name(dest_path)
+        with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(self.tmp_path))) as f:
+            for chunk in chunks:
+                f.write(chunk.encode("utf-8"))
+            size = f.tell()
+            f.seek(0)
+            if self.encoders and is_compressible_name(name) and size >= self.min_size:
+                self.add(name, f.read())
+            else:
+                with self.lock:
+                    self.add_member_from(name, f, size)
+        with self.lock:
+            self.written += 1
+        if self.report:
+            self.report.add("pages written")
+        return True
+
+    def save(self):
+        """Nothing to save between pages and static files; see close."""
+
+    def close(self):
+        """Finish the archive and its index, and move both into place."""
+        self.archive.close()
+        index = {"format": self.format, "mtime": self.mtime, "members": self.members}
+        index_path = self.path + INDEX_SUFFIX
+        save_state(index_path, index)
+        os.replace(self.tmp_path, self.path)
+        logging.info(f"Wrote {len(self.members)} members to {self.path}")
+
+    def abort(self):
+        """Drop a partly written archive."""
+        try:
+            self.archive.close()
+        except Exception:
+            pass
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class ArchiveSite:
+    """Random access to the members of an archive written by ArchiveWriter, through its index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path + INDEX_SUFFIX, 'r') as f:
+            index = json.load(f)
+        if index["format"] not in ("tar", "zip"):
+            raise ValueError(f"{path} is a compressed {index['format']} archive; serve a .tar or .zip instead")
+        self.mtime = index["mtime"]
+        self.members = index["members"]
+        self.header_rules = {}
+        if "_headers" in self.members:
+            self.header_rules = parse_headers_file(self.read("_headers").decode("utf-8").splitlines())
+
+    def read(self, name: str) -> bytes:
+        offset, _, stored_size, method = self.members[name]
+        with open(self.path, 'rb') as f:
+            data = os.pread(f.fileno(), stored_size, offset)
+        if method == "deflated":
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+        return data
+
+
+class ArchiveRequestHandler(StaticRequestHandler):
+    """Serve members of server.site, sending stored ones straight from the archive file."""
+
+    def handle_request(self, send_body: bool):
+        site = self.server.site
+        url_path = unquote(urlsplit(self.path).path)
+        name = posixpath.normpath(url_path).lstrip("/")
+        if name == ".":
+            name = ""
+        if name and not url_path.endswith("/") and f"{name}/index.html" in site.members:
+            self.redirect_to_directory()
+            return
+        if url_path.endswith("/"):
+            name = posixpath.join(name, "index.html")
+        if name not in site.members:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        self.send_member(url_path, name, send_body)
+
+    def send_member(self, url_path: str, name: str, send_body: bool):
+        site = self.server.site
+        accepted = parse_accept_encoding(self.headers.get("Accept-Encoding"))
+        body_name, coding = name, None
+        for candidate, ext in ENCODINGS:
+            if candidate in accepted and name + ext in site.members:
+                body_name, coding = name + ext, candidate
+                break
+        offset, size, _, method = site.members[body_name]
+        etag = f'"{offset:x}-{size:x}-{int(site.mtime):x}"'
+        extra_headers = site.header_rules.get(url_path, {})
+        headers = {
+            "ETag": etag,
+            "Last-Modified": email.utils.formatdate(site.mtime, usegmt=True),
+            "Cache-Control": extra_headers.get("Cache-Control", self.server.cache_control),
+        }
+        if any(name + ext in site.members for _, ext in ENCODINGS):
+            headers["Vary"] = "Accept-Encoding"
+        if self.not_modified(etag, site.mtime):
+            self.send_not_modified(headers)
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type_for(name))
+        self.send_header("Content-Length", str(size))
+        if coding:
+            self.send_header("Content-Encoding", coding)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        for header, value in extra_headers.items():
+            if header not in headers:
+                self.send_header(header, value)
+        self.end_headers()
+        if not send_body:
+            return
+        if method == "deflated":
+            self.wfile.write(site.read(body_name))
+            return
+        with open(site.path, 'rb') as f:
+            self.send_body(f, size, offset)
+
+
+class ArchiveServer(StaticServer):
+    def __init__(self, address, site: ArchiveSite, handler_class=ArchiveRequestHandler, metrics: bool = False):
+        super().__init__(address, os.path.dirname(os.path.abspath(site.path)), handler_class=handler_class,
+                         metrics=metrics)
+        self.site = site
+
+
+def serve_archive(path: str, host: str = "127.0.0.1", port: int = 8888, metrics: bool = False):
+    """Serve the site in an archive written with --archive until interrupted."""
+    site = ArchiveSite(path)
+    server = ArchiveServer((host, port), site, metrics=metrics)
+    logging.info(f"Serving {len(site.members)} members of {path} at http://{host}:{server.server_address[1]}/")
+    run_server(server)
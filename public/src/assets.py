@@ -0,0 +1,154 @@
+import fnmatch
+import os
+import posixpath
+import re
+from urllib.parse import unquote, urlsplit
+
+# Assets that pages never reference directly but the site still needs
+DEFAULT_KEEP_GLOBS = ("*.css", "fonts/*", "*.woff", "*.woff2", "*.ttf", "*.otf")
+
+# Attributes whose values point at other files
+REFERENCE_PROPS = ("src", "href")
+
+TEMPLATE_REFERENCE_PATTERN = re.compile(r'\b(?:src|href)\s*=\s*"([^"]*)"')
+
+# url(...) values and @import strings in stylesheets
+CSS_REFERENCE_PATTERN = re.compile(
+    r"""url\(\s*(?:"([^"]*)"|'([^']*)'|([^"')\s]*))\s*\)|@import\s+(?:"([^"]*)"|'([^']*)')"""
+)
+
+
+def collect_references(node) -> list[str]:
+    """Collect every src/href value found in an HTMLNode tree.
+
+    Args:
+        node: The root HTMLNode of a rendered page
+
+    Returns:
+        list[str]: The referenced URLs in document order
+    """
+    references = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.props:
+            for prop in REFERENCE_PROPS:
+                if current.props.get(prop):
+                    references.append(current.props[prop])
+        if current.children:
+            stack.extend(reversed(current.children))
+    return references
+
+
+def extract_template_references(template: str) -> list[str]:
+    """Collect the src/href attribute values from raw template HTML."""
+    return TEMPLATE_REFERENCE_PATTERN.findall(template)
+
+
+def template_references(template_paths) -> set[str]:
+    """Resolve the src/href values of a template and its partials to site-root relative paths.
+
+    Args:
+        template_paths: The template file followed by the partials it
+            includes (see template.template_files)
+
+    Returns:
+        set[str]: Paths like "images/logo.png"
+    """
+    references = set()
+    for template_path in template_paths:
+        with open(template_path, 'r') as f:
+            for url in extract_template_references(f.read()):
+                resolved = resolve_reference(url)
+                if resolved:
+                    references.add(resolved)
+    return references
+
+
+def extract_css_references(css: str) -> list[str]:
+    """Collect the url() and @import references from a stylesheet."""
+    return [next(group for group in match if group)
+            for match in CSS_REFERENCE_PATTERN.findall(css) if any(match)]
+
+
+def resolve_reference(url: str, base: str = "/") -> str | None:
+    """Resolve a URL to a path relative to the site root.
+
+    Args:
+        url: The URL as written in the page
+        base: The URL path of the directory the page is served from
+
+    Returns:
+        str | None: A relative path like "images/a.png", or None for
+            external, protocol-relative and fragment-only URLs
+    """
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    path = unquote(parts.path)
+    if not path.startswith("/"):
+        path = posixpath.join(base, path)
+    path = posixpath.normpath(path).lstrip("/")
+    if path in ("", ".") or path.startswith(".."):
+        return None
+    return path
+
+
+def select_assets(static_dir, referenced, keep_globs=DEFAULT_KEEP_GLOBS):
+    """Split the files under static_dir into reachable and unused assets.
+
+    A file is reachable when a page references it by path, or when it
+    matches one of keep_globs (stylesheets and fonts are usually loaded
+    from the template or from CSS, which pages never mention). Files that
+    a reachable stylesheet points at with url() or @import are reachable
+    too, resolved against the stylesheet's own directory.
+
+    Args:
+        static_dir (str): Path to the static directory
+        referenced (set[str]): Site-root relative paths referenced by pages
+        keep_globs: Glob patterns of paths that are always copied
+
+    Returns:
+        tuple[set[str], list[str]]: The reachable relative paths and the
+            sorted list of unused relative paths
+    """
+    reachable = set()
+    unused = []
+    for root, _, files in os.walk(static_dir):
+        for file_name in files:
+            rel_path = os.path.relpath(os.path.join(root, file_name), static_dir)
+            rel_path = rel_path.replace(os.sep, "/")
+            if rel_path in referenced or any(
+                fnmatch.fnmatch(rel_path, pattern) for pattern in keep_globs
+            ):
+                reachable.add(rel_path)
+            else:
+                unused.append(rel_path)
+    unused = set(unused)
+    pending = [rel_path for rel_path in reachable if rel_path.endswith(".css")]
+    while pending:
+        rel_path = pending.pop()
+        with open(os.path.join(static_dir, rel_path), 'r', errors="replace") as f:
+            css = f.read()
+        base = posixpath.join("/", posixpath.dirname(rel_path), "")
+        for url in extract_css_references(css):
+            target = resolve_reference(url, base)
+            if target in unused:
+                unused.discard(target)
+                reachable.add(target)
+                if target.endswith(".css"):
+                    pending.append(target)
+    return reachable, sorted(unused)
+
+
+def write_asset_report(report_path, unused, static_dir):
+    """Write the list of unused assets, with their sizes, to report_path."""
+    total = 0
+    lines = []
+    for rel_path in unused:
+        size = os.path.getsize(os.path.join(static_dir, rel_path))
+        total += size
+        lines.append(f"{size:>12}  {rel_path}")
+    lines.append(f"{total:>12}  total ({len(unused)} unused files)")
+    with open(report_path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
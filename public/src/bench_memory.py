@@ -0,0 +1,82 @@
+"""Benchmark: peak RSS of a build as the content tree grows.
+
+Usage:
+    python3 src/bench_memory.py [--sizes 10000 100000 1000000]
+
+For each size a tree of small markdown files is generated (1000 per
+directory) and built in a fresh child process, once with the regular
+build and once with --stream. Peak RSS is read from the child's rusage.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TEMPLATE = "<html><head><title>{{ Title }}</title></head><body>{{ Content }}</body></html>"
+
+FILES_PER_DIR = 1000
+
+
+def make_content(content_dir: str, pages: int):
+    for i in range(pages):
+        directory = os.path.join(content_dir, f"d{i // FILES_PER_DIR}")
+        if i % FILES_PER_DIR == 0:
+            os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"p{i}.md"), 'w') as f:
+            f.write(f"# Page {i}\n\nSome text with a [link](/d0/p0/) and ![img](/images/{i % 50}.png).\n")
+
+
+def child(mode: str, content_dir: str, template_path: str, out_dir: str, state_dir: str):
+    from main import generate_pages_recursive
+    from stream import LINK_GRAPH_FILE, LinkGraph, generate_pages_streaming
+    if mode == "stream":
+        links = LinkGraph(os.path.join(state_dir, LINK_GRAPH_FILE))
+        generate_pages_streaming(content_dir, template_path, out_dir, links)
+        links.close()
+    else:
+        generate_pages_recursive(content_dir, template_path, out_dir)
+
+
+def measure(mode: str, content_dir: str, template_path: str, tmp: str) -> tuple[float, float]:
+    """Build in a child process; return (seconds, peak RSS in MB)."""
+    out_dir = os.path.join(tmp, f"out-{mode}")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--child", mode, content_dir, template_path, out_dir, tmp],
+        cwd=SRC_DIR,
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f"{mode} build failed with exit code {process.returncode}")
+    peak = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return time.perf_counter() - start, peak
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(*sys.argv[2:])
+        return
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'pages':>9} {'regular':>22} {'--stream':>22}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            content_dir = os.path.join(tmp, "content")
+            make_content(content_dir, size)
+            template_path = os.path.join(tmp, "template.html")
+            with open(template_path, 'w') as f:
+                f.write(TEMPLATE)
+            results = [measure(mode, content_dir, template_path, tmp) for mode in ("regular", "stream")]
+        cells = [f"{seconds:7.1f}s {peak:8.1f} MB" for seconds, peak in results]
+        print(f"{size:>9} {cells[0]:>22} {cells[1]:>22}")
+
+
+if __name__ == "__main__":
+    main()
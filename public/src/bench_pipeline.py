@@ -0,0 +1,99 @@
+"""Benchmark: sequential page builds against the I/O pipeline on slow storage.
+
+Usage:
+    python3 src/bench_pipeline.py [--pages 200] [--read-ms 5] [--write-ms 5]
+
+Pages are generated into a temporary directory and built twice with the
+same read/render/write functions: once one page after another, as
+generate_page does, and once through run_pipeline. Every read and write
+sleeps for the given latency first to simulate a network filesystem or a
+cold cache. The peak number of pages in flight shows the pipeline's
+memory bound.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from pages import render_html, render_page, write_html
+from pipeline import DEFAULT_DEPTH, DEFAULT_READERS, DEFAULT_WRITERS, run_pipeline
+from template import Template
+
+TEMPLATE = "<html><head><title>{{ Title }}</title></head><body>{{ Content }}</body></html>"
+
+
+def make_content(content_dir: str, pages: int):
+    os.makedirs(content_dir, exist_ok=True)
+    for i in range(pages):
+        paragraphs = "\n\n".join(f"Paragraph {j} of page {i} with **bold** and `code`." for j in range(40))
+        with open(os.path.join(content_dir, f"page{i}.md"), 'w') as f:
+            f.write(f"# Page {i}\n\n{paragraphs}\n\n- one\n- two\n- three\n")
+
+
+class SlowIO:
+    """Read and write functions that wait for a simulated device latency first."""
+
+    def __init__(self, content_dir, out_dir, read_latency, write_latency):
+        self.content_dir = content_dir
+        self.out_dir = out_dir
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self.template = Template(TEMPLATE)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+
+    def read(self, name):
+        time.sleep(self.read_latency)
+        with open(os.path.join(self.content_dir, name), 'r') as f:
+            data = f.read()
+        with self.lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return data
+
+    def process(self, name, markdown_content):
+        return render_html(render_page(markdown_content, self.template))
+
+    def write(self, name, html):
+        time.sleep(self.write_latency)
+        write_html(html, os.path.join(self.out_dir, name.replace(".md", ".html")))
+        with self.lock:
+            self.in_flight -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--read-ms", type=float, default=5.0)
+    parser.add_argument("--write-ms", type=float, default=5.0)
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--readers", type=int, default=DEFAULT_READERS)
+    parser.add_argument("--writers", type=int, default=DEFAULT_WRITERS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        content_dir = os.path.join(tmp, "content")
+        make_content(content_dir, args.pages)
+        names = sorted(os.listdir(content_dir))
+
+        io = SlowIO(content_dir, os.path.join(tmp, "sequential"), args.read_ms / 1000, args.write_ms / 1000)
+        start = time.perf_counter()
+        for name in names:
+            io.write(name, io.process(name, io.read(name)))
+        sequential = time.perf_counter() - start
+
+        io = SlowIO(content_dir, os.path.join(tmp, "pipelined"), args.read_ms / 1000, args.write_ms / 1000)
+        start = time.perf_counter()
+        run_pipeline(names, io.read, io.process, io.write, args.depth, args.readers, args.writers)
+        pipelined = time.perf_counter() - start
+
+    print(f"{args.pages} pages, {args.read_ms}ms per read, {args.write_ms}ms per write")
+    print(f"sequential: {sequential:.2f}s ({args.pages / sequential:.0f} pages/s)")
+    print(f"pipelined:  {pipelined:.2f}s ({args.pages / pipelined:.0f} pages/s), "
+          f"at most {io.peak_in_flight} pages in flight")
+    print(f"speedup:    {sequential / pipelined:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
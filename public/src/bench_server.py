@@ -0,0 +1,111 @@
+"""Load benchmark: the bundled server against `python3 -m http.server`.
+
+Usage (after building the site):
+    python3 src/bench_server.py [--clients 16] [--requests 200] [--path /]
+
+Both servers are started as subprocesses on free ports and hit with the
+same concurrent load from client threads using keep-alive connections
+(http.server answers HTTP/1.0 and closes each connection, so its clients
+reconnect as needed).
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+PUBLIC_DIR = os.path.join(os.path.dirname(SRC_DIR), "public")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+def run_client(port, path, count, headers, latencies, errors):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.will_close:
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def load(port, path, clients, requests, headers):
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=run_client, args=(port, path, requests, headers, latencies, errors))
+        for _ in range(clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests/s": len(latencies) / elapsed,
+        "p50 ms": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p99 ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else float("nan"),
+        "errors": len(errors),
+    }
+
+
+def benchmark(name, command, port, args):
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        headers = {"Accept-Encoding": "gzip, br, zstd"}
+        load(port, args.path, 2, 10, headers)  # warm up
+        result = load(port, args.path, args.clients, args.requests, headers)
+    finally:
+        process.terminate()
+        process.wait()
+    print(f"{name:<16}" + "  ".join(f"{key} {value:>9.1f}" for key, value in result.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="requests per client")
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--dir", default=PUBLIC_DIR)
+    args = parser.parse_args()
+
+    port = free_port()
+    benchmark("http.server", [sys.executable, "-m", "http.server", str(port),
+                              "--bind", "127.0.0.1", "--directory", args.dir], port, args)
+    port = free_port()
+    benchmark("serve", [sys.executable, os.path.join(SRC_DIR, "main.py"), "serve",
+                        "--port", str(port), "--dir", args.dir], port, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Thin client for the build daemon started with `python3 src/main.py daemon`.
+
+Usage:
+    python3 src/client.py build [PATH]      # PATH relative to the current directory
+    python3 src/client.py status
+    python3 src/client.py metrics
+    python3 src/client.py stop
+
+Only the standard library's socket and json modules are imported, so a
+request costs little more than interpreter startup.
+"""
+import json
+import os
+import socket
+import sys
+
+DEFAULT_SOCKET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "daemon.sock")
+
+
+def request(line: str, socket_path: str = DEFAULT_SOCKET) -> dict:
+    """Send one request line to the daemon and return its decoded JSON reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(line.encode("utf-8") + b"\n")
+        with sock.makefile("rb") as reply:
+            return json.loads(reply.readline())
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print(__doc__.strip(), file=sys.stderr)
+        return 2
+    socket_path = os.environ.get("SSG_DAEMON_SOCKET", DEFAULT_SOCKET)
+    if argv[0] == "build" and len(argv) > 1:
+        # The daemon runs in another directory; send paths it can resolve
+        argv = [argv[0], os.path.abspath(argv[1])] + argv[2:]
+    try:
+        reply = request(" ".join(argv), socket_path)
+    except OSError as e:
+        print(f"Cannot reach the build daemon at {socket_path}: {e}", file=sys.stderr)
+        return 1
+    if not reply.get("ok"):
+        print(reply.get("error"), file=sys.stderr)
+        return 1
+    result = reply["result"]
+    print(result if isinstance(result, str) else json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
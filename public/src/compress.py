@@ -0,0 +1,207 @@
+import gzip
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from state import load_state, save_state
+
+# Binary formats like PNG and WOFF2 are already compressed and are skipped
+COMPRESSIBLE_EXTENSIONS = {
+    ".html", ".css", ".js", ".mjs", ".json", ".svg", ".xml", ".txt", ".map", ".md",
+}
+
+DEFAULT_MIN_SIZE = 1024
+
+# Every sibling extension precompression may write
+SIBLING_EXTENSIONS = (".gz", ".zst", ".br")
+
+# Files whose siblings were not kept because they did not shrink, in the state directory
+PRECOMPRESS_SKIPS_FILE = "precompress-skips.json"
+
+# Files queued per worker thread by precompress_tree
+QUEUED_PER_WORKER = 4
+
+try:
+    from compression import zstd as _zstd  # Python 3.14+
+except ImportError:
+    _zstd = None
+    try:
+        import zstandard as _zstandard
+    except ImportError:
+        _zstandard = None
+
+try:
+    import brotli as _brotli
+except ImportError:
+    _brotli = None
+
+
+def _gzip(data: bytes) -> bytes:
+    # mtime=0 keeps the output byte-identical across builds
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    if _zstd is not None:
+        return _zstd.compress(data, level=19)
+    return _zstandard.ZstdCompressor(level=19).compress(data)
+
+
+def _brotli_compress(data: bytes) -> bytes:
+    return _brotli.compress(data, quality=11)
+
+
+def available_encoders() -> dict:
+    """Return a mapping of sibling extension -> compress function.
+
+    gzip is always available; zstd and brotli are used when the interpreter
+    (compression.zstd) or the optional zstandard/brotli modules provide them.
+    """
+    encoders = {".gz": _gzip}
+    if _zstd is not None or _zstandard is not None:
+        encoders[".zst"] = _zstd_compress
+    if _brotli is not None:
+        encoders[".br"] = _brotli_compress
+    return encoders
+
+
+def is_compressible(path: str, min_size: int = DEFAULT_MIN_SIZE) -> bool:
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return False
+    return os.path.getsize(path) >= min_size
+
+
+def compress_file(path: str, encoders: dict, skips: dict | None = None) -> tuple[int, int]:
+    """Write compressed siblings (path + ".gz", ...) for a single file.
+
+    A sibling is considered up to date when its mtime equals the source's,
+    since every sibling written here is stamped with the source mtime.
+    Siblings that would not be smaller than the source are not kept.
+
+    Args:
+        path: The file to compress
+        encoders: Sibling extension -> compress function
+        skips: path -> [size, mtime_ns, extensions] of files whose listed
+            siblings did not shrink them. Checked and updated here, so such
+            a file is not compressed again until its size or mtime changes.
+
+    Returns:
+        tuple[int, int]: Number of siblings written and skipped as up to date
+    """
+    stat = os.stat(path)
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    known = skips.get(path) if skips is not None else None
+    not_smaller = set(known[2]) if known and known[:2] == stamp else set()
+    written = skipped = 0
+    data = None
+    for ext, encode in encoders.items():
+        sibling = path + ext
+        if ext in not_smaller:
+            skipped += 1
+            continue
+        try:
+            if os.stat(sibling).st_mtime_ns == stat.st_mtime_ns:
+                skipped += 1
+                continue
+        except FileNotFoundError:
+            pass
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        compressed = encode(data)
+        if len(compressed) >= len(data):
+            if os.path.exists(sibling):
+                os.remove(sibling)
+            not_smaller.add(ext)
+            continue
+        tmp_path = f"{sibling}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp_path, sibling)
+        written += 1
+    if skips is not None:
+        if not_smaller:
+            skips[path] = stamp + [sorted(not_smaller)]
+        else:
+            skips.pop(path, None)
+    return written, skipped
+
+
+def load_skips(skips_path: str | None, root_dir: str) -> dict:
+    entries = load_state(skips_path, {})
+    return {os.path.join(root_dir, *rel_path.split("/")): entry for rel_path, entry in entries.items()}
+
+
+def save_skips(skips_path: str, root_dir: str, skips: dict, paths):
+    # Only files still in the tree are kept
+    entries = {}
+    for path in paths:
+        if path in skips:
+            entries[os.path.relpath(path, root_dir).replace(os.sep, "/")] = skips[path]
+    save_state(skips_path, entries)
+
+
+def iter_compressible(root_dir: str, min_size: int, sibling_exts: tuple[str, ...]):
+    """Yield the compressible files under root_dir, skipping existing siblings."""
+    for root, _, files in os.walk(root_dir):
+        for file_name in files:
+            if file_name.endswith(sibling_exts):
+                continue
+            path = os.path.join(root, file_name)
+            if is_compressible(path, min_size):
+                yield path
+
+
+def precompress_tree(root_dir: str, min_size: int = DEFAULT_MIN_SIZE, workers: int | None = None,
+                     skips_path: str | None = None):
+    """Precompress every compressible file under root_dir across a thread pool.
+
+    zlib, zstd and brotli release the GIL while compressing, so threads
+    scale across cores without the pickling cost of a process pool. The
+    tree is walked lazily and at most a few files per worker are queued,
+    so memory does not grow with the size of the tree (see --stream).
+
+    Args:
+        root_dir: The build output directory
+        min_size: Files smaller than this many bytes are left alone
+        workers: Worker thread count (defaults to the CPU count)
+        skips_path: JSON file (PRECOMPRESS_SKIPS_FILE) recording the files
+            that did not shrink, by path relative to root_dir, so later
+            runs, into this or another generation, skip them too
+
+    Returns:
+        tuple[int, int]: Total siblings written and skipped as up to date
+    """
+    encoders = available_encoders()
+    skips = load_skips(skips_path, root_dir)
+    recorded = set(skips)
+    # Recorded files that are still in the tree; the rest are dropped on save
+    present = set()
+    workers = workers or os.cpu_count()
+    count = written = skipped = 0
+    pending = set()
+
+    def collect(done):
+        nonlocal written, skipped
+        for future in done:
+            file_written, file_skipped = future.result()
+            written += file_written
+            skipped += file_skipped
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for path in iter_compressible(root_dir, min_size, tuple(encoders)):
+            count += 1
+            if path in recorded:
+                present.add(path)
+            pending.add(pool.submit(compress_file, path, encoders, skips))
+            if len(pending) >= workers * QUEUED_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(wait(pending).done)
+    if skips_path:
+        save_skips(skips_path, root_dir, skips, present | (set(skips) - recorded))
+    logging.info(
+        f"Precompressed {count} files with {', '.join(encoders)}: "
+        f"{written} written, {skipped} up to date"
+    )
+    return written, skipped
@@ -0,0 +1,42 @@
+from state import load_state, save_state
+
+COSTS_FILE = "page-costs.json"
+
+
+class PageCosts:
+    """Render cost of each page, in seconds, as measured by previous builds.
+
+    Stored as JSON mapping a content-relative source path to the seconds
+    its last build took.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.seconds = load_state(path, {})
+
+    def record(self, rel_source: str, seconds: float):
+        self.seconds[rel_source] = seconds
+
+    def estimate(self, sizes: dict[str, int]) -> dict[str, float]:
+        """Return the expected cost of every source in sizes.
+
+        Sources without history are costed by their size, converted to
+        seconds at the average rate of the sources that have one, so the
+        two kinds of estimate can be compared. With no history at all the
+        sizes themselves are the costs.
+
+        Args:
+            sizes: Content-relative source path -> file size in bytes
+
+        Returns:
+            dict[str, float]: Source path -> expected cost
+        """
+        known = {rel_source: self.seconds[rel_source] for rel_source in sizes if rel_source in self.seconds}
+        known_bytes = sum(sizes[rel_source] for rel_source in known)
+        rate = sum(known.values()) / known_bytes if known and known_bytes else 1.0
+        return {rel_source: known.get(rel_source, size * rate) for rel_source, size in sizes.items()}
+
+    def save(self):
+        if not self.path:
+            return
+        save_state(self.path, self.seconds, indent=0, sort_keys=True)
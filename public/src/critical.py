@@ -0,0 +1,322 @@
+import hashlib
+import os
+import re
+import threading
+from urllib.parse import urljoin, urlsplit
+from state import load_state, save_state
+
+# Bump when parse_rules changes, so cached parses are not reused
+PARSER_VERSION = 2
+
+STYLESHEET_LINK = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+ATTRIBUTE = re.compile(r'([\w-]+)\s*=\s*"([^"]*)"')
+COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+AT_RULE_START = re.compile(r"\s*@")
+# Semicolons between declarations, not inside url(data:...;base64,...)
+DECLARATION_SEPARATOR = re.compile(r";(?![^(]*\))")
+
+# url(...) values, and the string form of @import
+CSS_URL = re.compile(r"""url\(\s*(["']?)([^"')]*)\1\s*\)""")
+IMPORT_STRING = re.compile(r"""^(@import\s+)(["'])([^"']*)\2""")
+
+# Markup in the template itself: <tag ...> and class/id attributes
+TEMPLATE_TAG = re.compile(r"<([a-zA-Z][\w-]*)")
+TEMPLATE_CLASS = re.compile(r'\bclass\s*=\s*"([^"{]*)"')
+TEMPLATE_ID = re.compile(r'\bid\s*=\s*"([^"{]*)"')
+
+# Pseudo-classes, pseudo-elements and attribute selectors never rule a page out
+IGNORED_SELECTOR_PARTS = re.compile(r"::?[\w-]+(?:\([^)]*\))?|\[[^\]]*\]")
+COMBINATOR = re.compile(r"\s*[>+~]\s*|\s+")
+
+# At-rules whose contents are rules that may be critical; others load with the full stylesheet
+GROUPING_AT_RULES = ("@media", "@supports")
+
+# Loads a stylesheet without blocking rendering; <noscript> covers browsers without JavaScript
+ASYNC_STYLESHEET = (
+    '<link rel="preload" href="{href}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">'
+    '<noscript><link rel="stylesheet" href="{href}"></noscript>'
+)
+
+
+def parse_rules(css: str, base: str | None = None) -> list:
+    """Parse a stylesheet into rules.
+
+    Args:
+        css: The stylesheet text
+        base: URL of the stylesheet; relative url() and @import targets are
+            rebased against it, so the rules still work inlined into a page
+            served from another directory. None leaves them as written.
+
+    Returns:
+        list: [selectors, declarations] for style rules,
+            [at-rule prelude, nested rules] for @media and @supports and
+            [at-rule, None] for @import; other at-rules are dropped
+    """
+    css = COMMENT.sub("", css)
+    rules, _ = parse_block(css, 0, base)
+    return rules
+
+
+def rebase_url(url: str, base: str) -> str:
+    """Resolve a relative URL from a stylesheet against the stylesheet's URL."""
+    parts = urlsplit(url)
+    if not url or parts.scheme or parts.netloc or url.startswith(("/", "#")):
+        return url
+    return urljoin(base, url)
+
+
+def rebase_urls(text: str, base: str | None) -> str:
+    """Rebase the url() values (and an @import string) in a declaration block or at-rule."""
+    if base is None:
+        return text
+    text = CSS_URL.sub(lambda m: f"url({m.group(1)}{rebase_url(m.group(2), base)}{m.group(1)})", text)
+    return IMPORT_STRING.sub(lambda m: f"{m.group(1)}{m.group(2)}{rebase_url(m.group(3), base)}{m.group(2)}", text)
+
+
+def parse_block(css: str, position: int, base: str | None = None) -> tuple[list, int]:
+    rules = []
+    while position < len(css):
+        brace = css.find("{", position)
+        close = css.find("}", position)
+        semicolon = css.find(";", position)
+        # Statement at-rules such as @import end at a semicolon, not a block
+        if AT_RULE_START.match(css, position) and semicolon != -1 and all(
+                index == -1 or semicolon < index for index in (brace, close)):
+            prelude = " ".join(css[position:semicolon].split())
+            if prelude.startswith("@import"):
+                rules.append([rebase_urls(prelude, base), None])
+            position = semicolon + 1
+            continue
+        if close != -1 and (brace == -1 or close < brace):
+            return rules, close + 1
+        if brace == -1:
+            break
+        prelude = " ".join(css[position:brace].split())
+        if prelude.startswith(GROUPING_AT_RULES):
+            nested, position = parse_block(css, brace + 1, base)
+            rules.append([prelude, nested])
+            continue
+        end = css.find("}", brace)
+        if end == -1:
+            break
+        if not prelude.startswith("@"):
+            declarations = ";".join(compact_declaration(declaration)
+                                    for declaration in DECLARATION_SEPARATOR.split(css[brace + 1:end])
+                                    if declaration.strip())
+            selectors = [selector.strip() for selector in prelude.split(",") if selector.strip()]
+            rules.append([selectors, rebase_urls(declarations, base)])
+        else:
+            # Skip the whole block, nested braces included (e.g. @keyframes)
+            depth, end = 1, brace + 1
+            while depth and end < len(css):
+                depth += {"{": 1, "}": -1}.get(css[end], 0)
+                end += 1
+            end -= 1
+        position = end + 1
+    return rules, len(css)
+
+
+def compact_declaration(declaration: str) -> str:
+    name, _, value = declaration.partition(":")
+    return f"{name.strip()}:{' '.join(value.split())}"
+
+
+def selector_may_match(selector: str, tags, classes, ids) -> bool:
+    """Return False only when a page without those tags, classes and ids cannot match the selector.
+
+    Every compound selector (e.g. "code.language-python") must be
+    satisfiable on its own; where the elements are in the tree is not
+    checked, so some rules that do not apply are kept.
+    """
+    selector = IGNORED_SELECTOR_PARTS.sub("", selector)
+    for compound in COMBINATOR.split(selector.strip()):
+        tag = re.match(r"[a-zA-Z][\w-]*", compound)
+        if tag and tag.group(0).lower() not in tags:
+            return False
+        if any(name not in classes for name in re.findall(r"\.([\w-]+)", compound)):
+            return False
+        if any(name not in ids for name in re.findall(r"#([\w-]+)", compound)):
+            return False
+    return True
+
+
+def select_rules(rules: list, tags, classes, ids) -> str:
+    """Serialize the rules that may match, keeping only their matching selectors.
+
+    @import rules are always kept, and put first as CSS requires.
+    """
+    imports = []
+    parts = []
+    for prelude, body in rules:
+        if body is None:
+            imports.append(f"{prelude};")
+            continue
+        if isinstance(body, list):
+            nested = select_rules(body, tags, classes, ids)
+            if nested:
+                parts.append(f"{prelude}{{{nested}}}")
+            continue
+        selectors = [selector for selector in prelude if selector_may_match(selector, tags, classes, ids)]
+        if selectors:
+            parts.append(f"{','.join(selectors)}{{{body}}}")
+    return "".join(imports + parts)
+
+
+def node_signature(node) -> tuple[frozenset, frozenset, frozenset]:
+    """Return the tags, classes and ids used in an HTMLNode tree."""
+    tags, classes, ids = set(), set(), set()
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.tag:
+            tags.add(current.tag.lower())
+        if current.props:
+            classes.update((current.props.get("class") or "").split())
+            if current.props.get("id"):
+                ids.add(current.props["id"])
+        if current.children:
+            stack.extend(current.children)
+    return frozenset(tags), frozenset(classes), frozenset(ids)
+
+
+def stylesheet_links(template: str) -> list[tuple[str, str]]:
+    """Return (link tag, href) for every local rel="stylesheet" link in template HTML."""
+    links = []
+    for match in STYLESHEET_LINK.finditer(template):
+        attributes = dict(ATTRIBUTE.findall(match.group(0)))
+        href = attributes.get("href", "")
+        if attributes.get("rel", "").lower() != "stylesheet" or not href or "{{" in href:
+            continue
+        parts = urlsplit(href)
+        if parts.scheme or parts.netloc:
+            continue
+        links.append((match.group(0), href))
+    return links
+
+
+class CriticalCSS:
+    """Per-page critical CSS for the stylesheets a template links.
+
+    The stylesheets are parsed once (and the parsed rules kept in
+    cache_dir, keyed by the hash of the CSS); the rules selected for a set
+    of tags, classes and ids are kept in memory, so a site whose pages
+    use a handful of distinct sets selects rules a handful of times.
+
+    Attributes:
+        paths: The stylesheet files
+        hits: Pages whose critical CSS came from the in-memory cache
+        misses: Distinct tag sets rules were selected for
+    """
+
+    def __init__(self, stylesheet_paths: list[str], template_html: str = "", cache_dir: str | None = None,
+                 stylesheet_urls: list[str] | None = None):
+        """
+        Args:
+            stylesheet_paths: Stylesheet files, in the order the template links them
+            template_html: The template's own markup, whose tags every page has
+            cache_dir: Directory to keep parsed stylesheets in
+            stylesheet_urls: The URL each stylesheet is served at, to rebase
+                its relative URLs against; None leaves them as written
+        """
+        self.paths = list(stylesheet_paths)
+        self.rules = []
+        for path, url in zip(stylesheet_paths, stylesheet_urls or [None] * len(self.paths)):
+            self.rules.extend(self.load(path, cache_dir, url))
+        self.tags = {tag.lower() for tag in TEMPLATE_TAG.findall(template_html)}
+        self.classes = {name for value in TEMPLATE_CLASS.findall(template_html) for name in value.split()}
+        self.ids = set(TEMPLATE_ID.findall(template_html))
+        self.selected = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def load(path: str, cache_dir: str | None, url: str | None = None) -> list:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not cache_dir:
+            return parse_rules(data.decode("utf-8"), url)
+        key = hashlib.sha256(f"{PARSER_VERSION}\0{url}\0".encode("utf-8") + data).hexdigest()
+        cache_path = os.path.join(cache_dir, f"{key}.css.json")
+        rules = load_state(cache_path)
+        if rules is None:
+            rules = parse_rules(data.decode("utf-8"), url)
+            save_state(cache_path, rules)
+        return rules
+
+    def style_for(self, node=None) -> str:
+        """Return the <style> element for a page's HTMLNode tree.
+
+        Without a tree (pages streamed from disk) every rule is included.
+        """
+        if node is None:
+            signature = None
+        else:
+            tags, classes, ids = node_signature(node)
+            signature = (tags | self.tags, classes | self.classes, ids | self.ids)
+        with self.lock:
+            style = self.selected.get(signature)
+            if style is not None:
+                self.hits += 1
+                return style
+        if signature is None:
+            css = select_rules(self.rules, AllNames(), AllNames(), AllNames())
+        else:
+            css = select_rules(self.rules, *signature)
+        style = f"<style>{css}</style>" if css else ""
+        with self.lock:
+            self.selected[signature] = style
+            self.misses += 1
+        return style
+
+
+class AllNames:
+    """Contains every name; selects all rules when a page's tags are unknown."""
+
+    def __contains__(self, name) -> bool:
+        return True
+
+
+def linked_stylesheets(template_paths, static_dir: str) -> list[str]:
+    """Return the files in static_dir that the template files link as stylesheets."""
+    paths = []
+    for template_path in template_paths:
+        with open(template_path, 'r') as f:
+            for _, href in stylesheet_links(f.read()):
+                path = static_path(href, static_dir)
+                if os.path.isfile(path):
+                    paths.append(path)
+    return paths
+
+
+def static_path(href: str, static_dir: str) -> str:
+    return os.path.join(static_dir, *urlsplit(href).path.lstrip("/").split("/"))
+
+
+def inline_stylesheets(template: str, static_dir: str, cache_dir: str | None = None):
+    """Rewrite a template to inline critical CSS and load its stylesheets asynchronously.
+
+    Local stylesheet links found in static_dir are replaced by
+    {{ CriticalCSS }} (once, at the first link) and a non-blocking load of
+    the full stylesheet. Relative URLs in the inlined rules are rebased
+    against the stylesheet's URL.
+
+    Returns:
+        tuple[str, CriticalCSS | None]: The rewritten template, and the
+            CriticalCSS for its stylesheets (None when it links none)
+    """
+    paths = []
+    urls = []
+    for tag, href in stylesheet_links(template):
+        path = static_path(href, static_dir)
+        if not os.path.isfile(path):
+            continue
+        urls.append("/" + urlsplit(href).path.lstrip("/"))
+        replacement = ASYNC_STYLESHEET.format(href=href)
+        if not paths:
+            replacement = "{{ CriticalCSS }}" + replacement
+        template = template.replace(tag, replacement, 1)
+        paths.append(path)
+    if not paths:
+        return template, None
+    return template, CriticalCSS(paths, template, cache_dir, urls)
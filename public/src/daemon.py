@@ -0,0 +1,375 @@
+import json
+import logging
+import os
+import shutil
+import socketserver
+import threading
+import time
+from compress import PRECOMPRESS_SKIPS_FILE, SIBLING_EXTENSIONS, precompress_tree
+from fingerprint import (
+    FingerprintCache,
+    build_manifest,
+    write_headers_file,
+    write_manifest,
+)
+from images import IMAGE_SIZES_FILE, ImageSizes
+from largefile import load_page, output_page
+from metrics import REGISTRY
+from navigation import NAVIGATION_SCRIPT_FILE, PAGE_DATA_FILE, format_navigation_script
+from outputs import OutputWriter
+from prefetch import (
+    PRECACHE_MANIFEST_FILE,
+    SERVICE_WORKER_FILE,
+    format_precache_manifest,
+    format_service_worker,
+    precache_manifest,
+)
+from pages import (
+    TEMPLATE_CACHE_DIR,
+    compile_template,
+    output_path_for,
+    site_pages,
+    url_for,
+)
+from template import latest_mtime_ns
+
+SOCKET_NAME = "daemon.sock"
+
+
+def copy_replacing(src_path: str, dest_path: str):
+    """Copy src_path to a new inode at dest_path.
+
+    The old file may be hardlinked into retained generations (see
+    publish.link_unchanged); writing through it would change them too.
+    """
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    tmp_path = f"{dest_path}.tmp"
+    shutil.copy2(src_path, tmp_path)
+    os.replace(tmp_path, dest_path)
+
+
+class Builder:
+    """Incremental site builds that keep their state in memory between runs.
+
+    The compiled template, asset fingerprints and the size/mtime of every
+    source seen by the previous build stay warm, so a rebuild only re-renders
+    pages whose source changed (or every page, when the template or the
+    asset manifest changed) and only copies changed static files.
+    """
+
+    def __init__(self, content_dir, template_path, static_dir, public_dir, state_dir,
+                 minify=False, fingerprint=False, precompress=False, critical_css=False, prefetch=0,
+                 service_worker=False, page_data=False):
+        self.content_dir = os.path.abspath(content_dir)
+        self.template_path = template_path
+        self.static_dir = os.path.abspath(static_dir)
+        self.public_dir = public_dir
+        self.minify = minify
+        self.fingerprint = fingerprint
+        self.precompress = precompress
+        self.critical_css = critical_css
+        self.prefetch = prefetch
+        self.service_worker = service_worker
+        self.page_data = page_data
+        self.fingerprints = FingerprintCache(os.path.join(state_dir, "fingerprints.json"))
+        self.image_sizes = ImageSizes(os.path.join(state_dir, IMAGE_SIZES_FILE))
+        self.images = None
+        # Re-rendered pages whose bytes did not change are left untouched
+        self.outputs = OutputWriter(public_dir, previous_dir=public_dir)
+        self.template_cache = os.path.join(state_dir, TEMPLATE_CACHE_DIR)
+        self.precompress_skips = os.path.join(state_dir, PRECOMPRESS_SKIPS_FILE)
+        self.template = None
+        self.template_mtime_ns = None
+        self.manifest = None
+        # rel_source -> (mtime_ns, size) of the source the output was built from
+        self.pages = {}
+        # rel_path -> (mtime_ns, size) of the copied static file
+        self.assets = {}
+        self.builds = 0
+        self.last_build = None
+        self.lock = threading.Lock()
+
+    def refresh_template(self, force: bool = False) -> bool:
+        """Recompile the template if it, a partial or an inlined stylesheet changed; return True when it did.
+
+        A template that lists the site's pages also counts as changed when
+        pages were added, removed or retitled.
+
+        Args:
+            force: Recompile regardless, e.g. because the asset manifest the
+                template's URLs were rewritten through has changed
+        """
+        mtime_ns = latest_mtime_ns(self.template_dependencies())
+        if not force and mtime_ns == self.template_mtime_ns and self.template is not None:
+            if "Pages" not in self.template.names:
+                return False
+            listing = site_pages(self.content_dir)
+            if listing == self.template.globals["Pages"]:
+                return False
+            self.template.bind("Pages", listing)
+            return True
+        critical_css = self.static_dir if self.critical_css and os.path.exists(self.static_dir) else None
+        self.template = compile_template(self.template_path, self.manifest, self.minify, self.template_cache,
+                                         self.content_dir, critical_css, self.images, self.prefetch,
+                                         self.service_worker, self.page_data)
+        self.template_mtime_ns = latest_mtime_ns(self.template_dependencies())
+        return True
+
+    def template_dependencies(self) -> list[str]:
+        if self.template is None:
+            return [self.template_path]
+        if self.template.critical:
+            return self.template.files + self.template.critical.paths
+        return self.template.files
+
+    def refresh_images(self) -> bool:
+        """Re-read the dimensions of changed images; return True when any changed."""
+        if not os.path.exists(self.static_dir):
+            return False
+        images = self.image_sizes.scan(self.static_dir, self.fingerprints)
+        if images == self.images:
+            return False
+        self.images = images
+        self.image_sizes.save()
+        self.fingerprints.save()
+        if self.template:
+            self.template.images = images
+        return True
+
+    def refresh_manifest(self) -> bool:
+        """Re-fingerprint static assets; return True when the manifest changed."""
+        if not self.fingerprint or not os.path.exists(self.static_dir):
+            return False
+        manifest = build_manifest(self.static_dir, self.fingerprints)
+        if manifest == self.manifest:
+            return False
+        self.manifest = manifest
+        self.fingerprints.save()
+        return True
+
+    def iter_sources(self):
+        for root, _, files in os.walk(self.content_dir):
+            for file_name in files:
+                if file_name.endswith(".md"):
+                    path = os.path.join(root, file_name)
+                    yield os.path.relpath(path, self.content_dir).replace(os.sep, "/"), path
+
+    def build_page(self, rel_source: str, path: str):
+        rel_output = output_path_for(rel_source)
+        page = load_page(path, self.template, self.manifest, url_for(rel_output), self.minify)
+        output_page(page, os.path.join(self.public_dir, *rel_output.split("/")), self.outputs)
+
+    def remove_output(self, rel_source: str):
+        """Remove a page's index.html and page.json, with their precompressed siblings."""
+        dest_path = os.path.join(self.public_dir, *output_path_for(rel_source).split("/"))
+        dest_dir = os.path.dirname(dest_path)
+        for path in (dest_path, os.path.join(dest_dir, PAGE_DATA_FILE)):
+            for ext in ("", *SIBLING_EXTENSIONS):
+                if os.path.lexists(path + ext):
+                    os.remove(path + ext)
+        if os.path.normpath(dest_dir) != os.path.normpath(self.public_dir):
+            try:
+                os.rmdir(dest_dir)
+            except OSError:
+                pass  # Not empty: other pages or assets live below it
+
+    def copy_asset(self, rel_path: str, path: str, stat: os.stat_result):
+        copy_replacing(path, os.path.join(self.public_dir, *rel_path.split("/")))
+        if self.manifest and rel_path in self.manifest:
+            copy_replacing(path, os.path.join(self.public_dir, *self.manifest[rel_path].split("/")))
+        self.assets[rel_path] = (stat.st_mtime_ns, stat.st_size)
+
+    def build(self, only=None) -> dict:
+        """Bring the output up to date.
+
+        Args:
+            only: A path to a single source or static file (absolute, or
+                relative to the content or static directory). When None,
+                or when the asset manifest, image sizes or template changed
+                so that every page is stale, the whole site is checked.
+
+        Returns:
+            dict: Counts of pages rendered, skipped and removed, rendered
+                pages whose output was identical, assets copied, and the
+                build duration in milliseconds
+        """
+        with self.lock:
+            start = time.perf_counter()
+            summary = {"pages rendered": 0, "pages unchanged": 0, "pages removed": 0, "assets copied": 0}
+            identical = self.outputs.unchanged
+            target = self.resolve_target(only) if only is not None else None
+            os.makedirs(self.public_dir, exist_ok=True)
+            manifest_changed = self.refresh_manifest()
+            everything_dirty = self.refresh_images() or manifest_changed
+            everything_dirty = self.refresh_template(force=manifest_changed) or everything_dirty
+
+            if target is not None and not everything_dirty:
+                self.build_one(*target, summary)
+            else:
+                self.build_all(everything_dirty, summary)
+
+            summary["pages identical"] = self.outputs.unchanged - identical
+            self.write_scripts()
+            if self.precompress:
+                precompress_tree(self.public_dir, skips_path=self.precompress_skips)
+            self.builds += 1
+            summary["ms"] = round((time.perf_counter() - start) * 1000, 2)
+            self.last_build = summary
+            logging.info(f"Build finished: {summary}")
+            return summary
+
+    def write_scripts(self):
+        """Write the navigation and service worker scripts the pages load, as a full build does.
+
+        Files identical to the ones already written are kept.
+        """
+        files = {}
+        if self.page_data:
+            files[NAVIGATION_SCRIPT_FILE] = format_navigation_script()
+        if self.service_worker and os.path.exists(self.static_dir):
+            precache = precache_manifest(self.template.files, self.static_dir, self.fingerprints, self.manifest)
+            files[PRECACHE_MANIFEST_FILE] = format_precache_manifest(precache)
+            files[SERVICE_WORKER_FILE] = format_service_worker(precache)
+        for name, text in files.items():
+            self.outputs.write(os.path.join(self.public_dir, name), text.encode("utf-8"), page=False)
+
+    def build_all(self, everything_dirty: bool, summary: dict):
+        seen = set()
+        for rel_source, path in self.iter_sources():
+            seen.add(rel_source)
+            stat = os.stat(path)
+            key = (stat.st_mtime_ns, stat.st_size)
+            if not everything_dirty and self.pages.get(rel_source) == key:
+                summary["pages unchanged"] += 1
+                continue
+            self.build_page(rel_source, path)
+            self.pages[rel_source] = key
+            summary["pages rendered"] += 1
+        for rel_source in set(self.pages) - seen:
+            self.remove_output(rel_source)
+            del self.pages[rel_source]
+            summary["pages removed"] += 1
+
+        if os.path.exists(self.static_dir):
+            for root, _, files in os.walk(self.static_dir):
+                for file_name in files:
+                    path = os.path.join(root, file_name)
+                    rel_path = os.path.relpath(path, self.static_dir).replace(os.sep, "/")
+                    stat = os.stat(path)
+                    if self.assets.get(rel_path) != (stat.st_mtime_ns, stat.st_size):
+                        self.copy_asset(rel_path, path, stat)
+                        summary["assets copied"] += 1
+            if self.manifest:
+                write_manifest(os.path.join(self.public_dir, "asset-manifest.json"), self.manifest)
+                write_headers_file(os.path.join(self.public_dir, "_headers"), self.manifest.values())
+
+    def resolve_target(self, target: str) -> tuple[str, str, str]:
+        """Resolve a build target to ("page", rel_source, path) or ("asset", rel_path, path).
+
+        Relative targets are taken relative to the content directory for
+        .md files and to the static directory otherwise, never to the
+        daemon's working directory (the client sends absolute paths).
+
+        Raises:
+            ValueError: The target is neither a source the daemon builds (or
+                built and is now removed) nor a static file
+        """
+        if os.path.isabs(target):
+            path = os.path.normpath(target)
+        elif target.endswith(".md"):
+            path = os.path.abspath(os.path.join(self.content_dir, target))
+        else:
+            path = os.path.abspath(os.path.join(self.static_dir, target))
+        if path.startswith(self.content_dir + os.sep) and path.endswith(".md"):
+            rel_source = os.path.relpath(path, self.content_dir).replace(os.sep, "/")
+            if os.path.isfile(path) or rel_source in self.pages:
+                return "page", rel_source, path
+            raise ValueError(f"No such page: {target}")
+        if path.startswith(self.static_dir + os.sep) and os.path.isfile(path):
+            return "asset", os.path.relpath(path, self.static_dir).replace(os.sep, "/"), path
+        raise ValueError(f"Not a content or static file: {target}")
+
+    def build_one(self, kind: str, rel_path: str, path: str, summary: dict):
+        if kind == "asset":
+            self.copy_asset(rel_path, path, os.stat(path))
+            summary["assets copied"] += 1
+        elif not os.path.exists(path):
+            if rel_path in self.pages:
+                self.remove_output(rel_path)
+                del self.pages[rel_path]
+                summary["pages removed"] += 1
+        else:
+            stat = os.stat(path)
+            self.build_page(rel_path, path)
+            self.pages[rel_path] = (stat.st_mtime_ns, stat.st_size)
+            summary["pages rendered"] += 1
+
+    def status(self) -> dict:
+        return {
+            "builds": self.builds,
+            "pages tracked": len(self.pages),
+            "assets tracked": len(self.assets),
+            "last build": self.last_build,
+        }
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """Answer one line-based request per connection with one JSON line.
+
+    Requests: "build", "build <path>", "status", "metrics" and "stop".
+    """
+
+    def handle(self):
+        line = self.rfile.readline().decode("utf-8").strip()
+        command, _, argument = line.partition(" ")
+        try:
+            if command == "build":
+                result = {"ok": True, "result": self.server.builder.build(argument.strip() or None)}
+            elif command == "status":
+                status = self.server.builder.status()
+                status["uptime"] = round(time.monotonic() - self.server.started, 1)
+                result = {"ok": True, "result": status}
+            elif command == "metrics":
+                result = {"ok": True, "result": REGISTRY.render()}
+            elif command == "stop":
+                result = {"ok": True, "result": "stopping"}
+            else:
+                result = {"ok": False, "error": f"unknown command: {line!r}"}
+        except Exception as e:
+            logging.error(f"Daemon request {line!r} failed: {e}")
+            result = {"ok": False, "error": str(e)}
+        self.wfile.write((json.dumps(result) + "\n").encode("utf-8"))
+        if command == "stop":
+            # Reply first: shutdown() returns once serve_forever exits
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, builder: Builder):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, DaemonRequestHandler)
+        self.socket_path = socket_path
+        self.builder = builder
+        self.started = time.monotonic()
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def run_daemon(builder: Builder, socket_path: str):
+    """Warm up with a full build, then answer requests on socket_path until stopped."""
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    server = DaemonServer(socket_path, builder)
+    builder.build()
+    logging.info(f"Build daemon listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
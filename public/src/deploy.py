@@ -0,0 +1,350 @@
+import base64
+import datetime
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+from fingerprint import FingerprintCache
+from server import DEFAULT_CACHE_CONTROL, ENCODINGS, content_type_for, load_headers_file
+
+# Object describing what the last deploy uploaded, stored next to the site
+REMOTE_MANIFEST_KEY = ".deploy-manifest.json"
+
+DEPLOY_HASHES_FILE = "deploy-hashes.json"
+
+# Files at least this big are sent as a multipart upload, in parts of PART_SIZE
+# (S3 requires every part but the last to be at least 5 MiB)
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+PART_SIZE = 8 * 1024 * 1024
+
+DEFAULT_CONCURRENCY = 8
+
+# DeleteObjects accepts at most this many keys per request
+DELETE_BATCH = 1000
+
+ATTEMPTS = 3
+
+S3_NAMESPACE = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+
+# Files describing the build itself rather than the site
+SKIPPED_FILES = {"_shard.json"}
+
+
+class S3Error(RuntimeError):
+    def __init__(self, status: int, body: bytes, method: str, key: str):
+        self.status = status
+        self.code = error_code(body)
+        super().__init__(f"{method} {key or '/'} failed with {status} {self.code or ''}".rstrip())
+
+
+def error_code(body: bytes) -> str | None:
+    try:
+        return ET.fromstring(body).findtext("Code")
+    except ET.ParseError:
+        return None
+
+
+def find_text(root, name: str) -> str | None:
+    """Find a child element's text with or without the S3 XML namespace."""
+    value = root.findtext(name)
+    return value if value is not None else root.findtext(S3_NAMESPACE + name)
+
+
+def sign_request(method: str, host: str, path: str, query: dict, headers: dict, payload_sha256: str,
+                 access_key: str, secret_key: str, region: str, now: datetime.datetime | None = None,
+                 service: str = "s3") -> dict:
+    """Return headers with an AWS Signature Version 4 Authorization added.
+
+    Every header passed in is signed, along with host, x-amz-date and
+    x-amz-content-sha256, which are added when missing.
+
+    Args:
+        path: URI-encoded request path, e.g. "/bucket/a%20b.html"
+        query: Query parameters, unencoded ("uploads" is {"uploads": ""})
+        payload_sha256: Hex SHA-256 of the request body
+
+    Returns:
+        dict: The headers to send
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date = amz_date[:8]
+    headers = dict(headers)
+    headers.setdefault("x-amz-date", amz_date)
+    headers.setdefault("x-amz-content-sha256", payload_sha256)
+    signed = {"host": host}
+    signed.update((name.lower(), " ".join(str(value).split())) for name, value in headers.items())
+    names = sorted(signed)
+    canonical_query = "&".join(
+        f"{quote(name, safe='-_.~')}={quote(str(value), safe='-_.~')}" for name, value in sorted(query.items())
+    )
+    canonical_request = "\n".join([
+        method,
+        path,
+        canonical_query,
+        "".join(f"{name}:{signed[name]}\n" for name in names),
+        ";".join(names),
+        payload_sha256,
+    ])
+    scope = f"{date}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+    ])
+    key = f"AWS4{secret_key}".encode("utf-8")
+    for part in (date, region, service, "aws4_request"):
+        key = hmac.new(key, part.encode("utf-8"), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+    headers["Authorization"] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, SignedHeaders={';'.join(names)}, Signature={signature}"
+    )
+    return headers
+
+
+class S3Client:
+    """A minimal S3 client: path-style requests signed with SigV4, over http.client.
+
+    Each thread gets its own keep-alive connection, so one client can be
+    shared by a pool of uploader threads.
+    """
+
+    def __init__(self, endpoint: str, bucket: str, access_key: str, secret_key: str,
+                 region: str = "us-east-1", session_token: str | None = None, timeout: float = 60):
+        parts = urlsplit(endpoint)
+        self.scheme = parts.scheme or "https"
+        self.host = parts.netloc
+        self.base_path = parts.path.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.session_token = session_token
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            connection = self.local.connection = cls(self.host, timeout=self.timeout)
+        return connection
+
+    def request(self, method: str, key: str = "", query: dict | None = None, body: bytes = b"",
+                headers: dict | None = None, expected=(200,)) -> tuple[dict, bytes]:
+        """Send a signed request for key, retrying connection errors and 5xx responses.
+
+        Returns:
+            tuple[dict, bytes]: Response headers (lowercase names) and body
+
+        Raises:
+            S3Error: If the response status is not one of expected
+        """
+        query = query or {}
+        path = quote(f"{self.base_path}/{self.bucket}" + (f"/{key}" if key else ""), safe="/-_.~")
+        url = path
+        if query:
+            url += "?" + "&".join(
+                f"{quote(name, safe='-_.~')}={quote(str(value), safe='-_.~')}" if value != "" else quote(name)
+                for name, value in query.items()
+            )
+        headers = dict(headers or {})
+        if self.session_token:
+            headers["x-amz-security-token"] = self.session_token
+        for attempt in range(1, ATTEMPTS + 1):
+            signed = sign_request(method, self.host, path, query, headers, hashlib.sha256(body).hexdigest(),
+                                  self.access_key, self.secret_key, self.region)
+            try:
+                connection = self.connection()
+                connection.request(method, url, body=body, headers=signed)
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.local.connection = None
+                if attempt == ATTEMPTS:
+                    raise
+                logging.warning(f"{method} {key}: {e}, retrying")
+            else:
+                if response.status in expected:
+                    return {name.lower(): value for name, value in response.getheaders()}, data
+                if response.status < 500 or attempt == ATTEMPTS:
+                    raise S3Error(response.status, data, method, key)
+                logging.warning(f"{method} {key}: {response.status}, retrying")
+            time.sleep(0.2 * 2 ** attempt)
+
+    def get_object(self, key: str) -> bytes | None:
+        """Return an object's body, or None if it does not exist."""
+        try:
+            return self.request("GET", key)[1]
+        except S3Error as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def put_object(self, key: str, body: bytes, headers: dict | None = None):
+        self.request("PUT", key, body=body, headers=headers)
+
+    def upload_file(self, key: str, path: str, headers: dict | None = None, part_size: int = PART_SIZE):
+        """Upload a file as a multipart upload, reading one part at a time."""
+        _, body = self.request("POST", key, {"uploads": ""}, headers=headers)
+        upload_id = find_text(ET.fromstring(body), "UploadId")
+        try:
+            parts = []
+            with open(path, 'rb') as f:
+                for number, data in enumerate(iter(lambda: f.read(part_size), b""), start=1):
+                    response, _ = self.request("PUT", key, {"partNumber": number, "uploadId": upload_id}, data)
+                    parts.append((number, response["etag"]))
+            complete = "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>" for number, etag in parts
+            )
+            _, body = self.request("POST", key, {"uploadId": upload_id},
+                                   f"<CompleteMultipartUpload>{complete}</CompleteMultipartUpload>".encode("utf-8"))
+            # CompleteMultipartUpload can fail after a 200 status line
+            if error_code(body):
+                raise S3Error(200, body, "POST", key)
+        except BaseException:
+            self.request("DELETE", key, {"uploadId": upload_id}, expected=(204, 200, 404))
+            raise
+
+    def delete_objects(self, keys: list[str]):
+        """Delete keys with DeleteObjects, DELETE_BATCH at a time."""
+        for start in range(0, len(keys), DELETE_BATCH):
+            objects = "".join(
+                f"<Object><Key>{escape_xml(key)}</Key></Object>" for key in keys[start:start + DELETE_BATCH]
+            )
+            body = f"<Delete><Quiet>true</Quiet>{objects}</Delete>".encode("utf-8")
+            md5 = base64.b64encode(hashlib.md5(body).digest()).decode("ascii")
+            _, response = self.request("POST", "", {"delete": ""}, body, {"Content-MD5": md5})
+            root = ET.fromstring(response)
+            errors = root.findall("Error") + root.findall(f"{S3_NAMESPACE}Error")
+            if errors:
+                raise S3Error(200, ET.tostring(errors[0]), "DELETE", find_text(errors[0], "Key") or "")
+
+
+def escape_xml(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def local_manifest(public_dir: str, cache: FingerprintCache, prefix: str = "") -> dict[str, dict]:
+    """Describe every file under public_dir as the object it should become.
+
+    Cache-Control comes from the _headers file the fingerprint stage writes
+    (immutable for fingerprinted assets). A precompressed sibling such as
+    index.html.gz becomes its own object with the original's Content-Type
+    and Content-Encoding: gzip, for a CDN rule to pick.
+
+    Args:
+        cache: Content hashes of files, reused while size and mtime match
+        prefix: Key prefix inside the bucket, e.g. "site/"
+
+    Returns:
+        dict[str, dict]: Object key -> sha256, size, content_type,
+            cache_control and (for siblings) content_encoding
+    """
+    header_rules = load_headers_file(public_dir)
+    manifest = {}
+    for root, _, files in os.walk(public_dir, followlinks=True):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            rel_path = os.path.relpath(path, public_dir).replace(os.sep, "/")
+            if rel_path in SKIPPED_FILES:
+                continue
+            entry = {"sha256": cache.digest(path), "size": os.path.getsize(path)}
+            original = rel_path
+            for coding, ext in ENCODINGS:
+                if rel_path.endswith(ext) and os.path.exists(path[:-len(ext)]):
+                    original = rel_path[:-len(ext)]
+                    entry["content_encoding"] = coding
+                    break
+            entry["content_type"] = content_type_for(original)
+            entry["cache_control"] = header_rules.get(f"/{original}", {}).get("Cache-Control", DEFAULT_CACHE_CONTROL)
+            manifest[prefix + rel_path] = entry
+    return manifest
+
+
+def plan_deploy(local: dict[str, dict], remote: dict[str, dict]) -> tuple[list[str], list[str]]:
+    """Return (keys to upload, keys to delete).
+
+    A key is uploaded when it is new or its content or headers changed.
+    Pages come after everything else, so a page never goes live before
+    the assets it references.
+    """
+    uploads = [key for key, entry in local.items() if remote.get(key) != entry]
+    uploads.sort(key=lambda key: (local[key]["content_type"].startswith("text/html"), key))
+    deletes = sorted(set(remote) - set(local))
+    return uploads, deletes
+
+
+def load_remote_manifest(client: S3Client, prefix: str = "") -> dict[str, dict]:
+    body = client.get_object(prefix + REMOTE_MANIFEST_KEY)
+    if body is None:
+        return {}
+    return json.loads(body)["objects"]
+
+
+def object_headers(entry: dict) -> dict:
+    headers = {"Content-Type": entry["content_type"], "Cache-Control": entry["cache_control"]}
+    if "content_encoding" in entry:
+        headers["Content-Encoding"] = entry["content_encoding"]
+    return headers
+
+
+def deploy(client: S3Client, public_dir: str, prefix: str = "", concurrency: int = DEFAULT_CONCURRENCY,
+           cache: FingerprintCache | None = None, dry_run: bool = False,
+           multipart_threshold: int = MULTIPART_THRESHOLD, part_size: int = PART_SIZE) -> dict:
+    """Bring the bucket in line with public_dir, touching only what changed.
+
+    The remote manifest object records what the previous deploy uploaded,
+    so nothing needs to be listed or downloaded to find the differences.
+    Changed objects are uploaded by concurrency threads (large ones in
+    parts), removed ones are deleted, and the manifest is replaced last:
+    a deploy that fails part way is simply redone by the next one. Objects
+    the manifest does not know about are never deleted.
+
+    Returns:
+        dict: Counts of objects uploaded, deleted and unchanged, and bytes uploaded
+    """
+    cache = cache or FingerprintCache()
+    local = local_manifest(public_dir, cache, prefix)
+    remote = load_remote_manifest(client, prefix)
+    uploads, deletes = plan_deploy(local, remote)
+    summary = {
+        "uploaded": len(uploads),
+        "deleted": len(deletes),
+        "unchanged": len(local) - len(uploads),
+        "bytes": sum(local[key]["size"] for key in uploads),
+    }
+    if dry_run:
+        for key in uploads:
+            logging.info(f"Would upload {key}")
+        for key in deletes:
+            logging.info(f"Would delete {key}")
+        return summary
+
+    def upload(key: str):
+        entry = local[key]
+        path = os.path.join(public_dir, *key[len(prefix):].split("/"))
+        if entry["size"] >= multipart_threshold:
+            client.upload_file(key, path, object_headers(entry), part_size)
+        else:
+            with open(path, 'rb') as f:
+                client.put_object(key, f.read(), object_headers(entry))
+        logging.info(f"Uploaded {key}")
+
+    pages = [key for key in uploads if local[key]["content_type"].startswith("text/html")]
+    assets = uploads[:len(uploads) - len(pages)]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for batch in (assets, pages):
+            list(executor.map(upload, batch))
+    if deletes:
+        client.delete_objects(deletes)
+        logging.info(f"Deleted {len(deletes)} objects")
+    client.put_object(prefix + REMOTE_MANIFEST_KEY,
+                      json.dumps({"objects": local}, sort_keys=True).encode("utf-8"),
+                      {"Content-Type": "application/json", "Cache-Control": "no-store"})
+    return summary
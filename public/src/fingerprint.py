@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+from urllib.parse import quote, urlsplit, urlunsplit
+from assets import resolve_reference
+from metrics import CACHE_HITS, CACHE_MISSES
+from state import load_state, save_state
+
+# Number of hex digits of the content hash embedded in file names
+DIGEST_LENGTH = 8
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+TEMPLATE_URL_PATTERN = re.compile(r'(\b(?:src|href)\s*=\s*")([^"]*)(")')
+
+
+def hash_file(path: str) -> str:
+    """Return the hex SHA-256 digest of a file, reading it in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FingerprintCache:
+    """Content hashes of files, reused while their size and mtime are unchanged.
+
+    The cache is stored as JSON mapping a path to [size, mtime_ns, digest].
+    Entries for files that no longer exist are dropped when it is saved.
+    """
+
+    def __init__(self, cache_path: str | None = None):
+        self.cache_path = cache_path
+        self.entries = load_state(cache_path, {})
+        self.hashed = 0
+
+    def digest(self, path: str) -> str:
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        entry = self.entries.get(key)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            CACHE_HITS.inc(cache="fingerprint")
+            return entry[2]
+        CACHE_MISSES.inc(cache="fingerprint")
+        digest = hash_file(path)
+        self.hashed += 1
+        self.entries[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def save(self):
+        if not self.cache_path:
+            return
+        self.entries = {key: entry for key, entry in self.entries.items() if os.path.exists(key)}
+        save_state(self.cache_path, self.entries)
+
+
+def fingerprinted_name(rel_path: str, digest: str) -> str:
+    """Insert a content hash before the extension: "a/b.css" -> "a/b.1a2b3c4d.css"."""
+    root, ext = posixpath.splitext(rel_path)
+    return f"{root}.{digest[:DIGEST_LENGTH]}{ext}"
+
+
+def build_manifest(static_dir: str, cache: FingerprintCache) -> dict[str, str]:
+    """Map every file under static_dir to its fingerprinted relative path.
+
+    Args:
+        static_dir: Path to the static directory
+        cache: Cache used to skip hashing files whose size and mtime are unchanged
+
+    Returns:
+        dict[str, str]: Relative path ("images/a.png") -> fingerprinted path
+    """
+    manifest = {}
+    for root, _, files in os.walk(static_dir):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            rel_path = os.path.relpath(path, static_dir).replace(os.sep, "/")
+            manifest[rel_path] = fingerprinted_name(rel_path, cache.digest(path))
+    return manifest
+
+
+def rewrite_url(url: str, manifest: dict[str, str], base: str = "/") -> str:
+    """Return url pointing at the fingerprinted asset, or url unchanged.
+
+    Manifest paths are file names, so they are percent-encoded for the URL.
+    """
+    rel_path = resolve_reference(url, base)
+    if rel_path not in manifest:
+        return url
+    parts = urlsplit(url)
+    return urlunsplit(("", "", quote("/" + manifest[rel_path]), parts.query, parts.fragment))
+
+
+def rewrite_references(node, manifest: dict[str, str], base: str = "/"):
+    """Rewrite the src/href props of an HTMLNode tree in place through manifest."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.props:
+            for prop in ("src", "href"):
+                if current.props.get(prop):
+                    current.props[prop] = rewrite_url(current.props[prop], manifest, base)
+        if current.children:
+            stack.extend(current.children)
+
+
+def rewrite_template(template: str, manifest: dict[str, str]) -> str:
+    """Rewrite the src/href attributes of raw template HTML through manifest."""
+    return TEMPLATE_URL_PATTERN.sub(
+        lambda m: m.group(1) + rewrite_url(m.group(2), manifest) + m.group(3),
+        template,
+    )
+
+
+def format_manifest(manifest: dict[str, str]) -> str:
+    return json.dumps(manifest, indent=2, sort_keys=True)
+
+
+def write_manifest(path: str, manifest: dict[str, str]):
+    with open(path, 'w') as f:
+        f.write(format_manifest(manifest))
+
+
+def format_headers_file(fingerprinted_paths) -> str:
+    """Return a _headers file marking fingerprinted paths as immutable.
+
+    Uses the format understood by Netlify and Cloudflare Pages:
+    a URL path followed by indented "Header: value" lines.
+    """
+    lines = []
+    for rel_path in sorted(fingerprinted_paths):
+        lines.append(f"/{rel_path}")
+        lines.append(f"  Cache-Control: {IMMUTABLE_CACHE_CONTROL}")
+    return "\n".join(lines) + "\n"
+
+
+def write_headers_file(path: str, fingerprinted_paths):
+    with open(path, 'w') as f:
+        f.write(format_headers_file(fingerprinted_paths))
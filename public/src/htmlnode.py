@@ -19,6 +19,14 @@ class HTMLNode:
     def to_html(self) -> str:
         raise NotImplementedError("to_html method not implemented")
 
+    def iter_html(self):
+        """Yield the HTML of this node as chunks.
+
+        Tags and text are yielded as separate chunks, so "".join(node.iter_html())
+        equals node.to_html() and stream consumers can tell them apart.
+        """
+        raise NotImplementedError("iter_html method not implemented")
+
     def __repr__(self) -> str:
         return (
             f"HTMLNode(tag={self.tag}, value={self.value}, "
@@ -62,6 +70,16 @@ class LeafNode(HTMLNode):
             
         return f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
 
+    def iter_html(self):
+        if self.tag is None:
+            yield self.value
+            return
+        yield f"<{self.tag}{self.props_to_html()}>"
+        if self.tag in self.SELF_CLOSING_TAGS:
+            return
+        yield self.value
+        yield f"</{self.tag}>"
+
 
 class ParentNode(HTMLNode):
     """A node that can have children"""
@@ -88,3 +106,12 @@ class ParentNode(HTMLNode):
             
         children_html = "".join(child.to_html() for child in self.children)
         return f"<{self.tag}{self.props_to_html()}>{children_html}</{self.tag}>"
+
+    def iter_html(self):
+        if not self.tag:
+            raise ValueError("ParentNode must have a tag")
+
+        yield f"<{self.tag}{self.props_to_html()}>"
+        for child in self.children:
+            yield from child.iter_html()
+        yield f"</{self.tag}>"
@@ -0,0 +1,160 @@
+import os
+import struct
+from assets import resolve_reference
+from state import load_state, save_state
+
+IMAGE_SIZES_FILE = "image-sizes.json"
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+
+# JPEG start-of-frame markers, which carry the dimensions (C4, C8 and CC are not frames)
+JPEG_FRAME_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# JPEG markers without a length field
+JPEG_STANDALONE_MARKERS = set(range(0xD0, 0xDA)) | {0x01}
+
+
+def image_size(path: str) -> tuple[int, int] | None:
+    """Return (width, height) of a PNG, JPEG, GIF or WebP file from its header bytes.
+
+    Only the header is read (for JPEG, the segment headers up to the first
+    frame). Returns None for other formats and malformed files.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(32)
+        try:
+            if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+                return struct.unpack(">II", head[16:24])
+            if head[:6] in (b"GIF87a", b"GIF89a"):
+                return struct.unpack("<HH", head[6:10])
+            if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+                return webp_size(head)
+            if head[:2] == b"\xff\xd8":
+                f.seek(2)
+                return jpeg_size(f)
+        except struct.error:
+            return None
+    return None
+
+
+def webp_size(head: bytes) -> tuple[int, int] | None:
+    chunk = head[12:16]
+    if chunk == b"VP8 " and head[23:26] == b"\x9d\x01\x2a":
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and head[20:21] == b"\x2f":
+        bits = struct.unpack("<I", head[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def jpeg_size(f) -> tuple[int, int] | None:
+    """Walk JPEG segments from just after the SOI marker to the first frame header."""
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        # Any number of 0xFF fill bytes may precede a marker
+        while marker == b"\xff":
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code in JPEG_STANDALONE_MARKERS or code == 0x00:
+            continue
+        if code == 0xD9:
+            return None
+        length = struct.unpack(">H", f.read(2))[0]
+        if code in JPEG_FRAME_MARKERS:
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+class ImageSizes:
+    """Dimensions of the images under a static directory, cached by content hash.
+
+    The cache is stored as JSON mapping a file's SHA-256 to [width, height]
+    (or null for files whose header could not be read). Hashes come from a
+    FingerprintCache, so an unchanged image costs a stat and a dict lookup.
+    """
+
+    def __init__(self, cache_path: str | None = None):
+        self.cache_path = cache_path
+        self.entries = load_state(cache_path, {})
+        self.read = 0
+
+    def scan(self, static_dir: str, fingerprints) -> dict[str, tuple[int, int]]:
+        """Return the dimensions of every image under static_dir.
+
+        Args:
+            static_dir: Path to the static directory
+            fingerprints: FingerprintCache that supplies content hashes
+
+        Returns:
+            dict[str, tuple[int, int]]: Relative path ("images/a.png") -> (width, height)
+        """
+        sizes = {}
+        for root, _, files in os.walk(static_dir):
+            for file_name in files:
+                if not file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = os.path.join(root, file_name)
+                digest = fingerprints.digest(path)
+                if digest not in self.entries:
+                    self.entries[digest] = image_size(path)
+                    self.read += 1
+                if self.entries[digest]:
+                    rel_path = os.path.relpath(path, static_dir).replace(os.sep, "/")
+                    sizes[rel_path] = tuple(self.entries[digest])
+        return sizes
+
+    def save(self):
+        if not self.cache_path:
+            return
+        save_state(self.cache_path, self.entries)
+
+
+def size_images(node, sizes: dict[str, tuple[int, int]], base: str = "/", after_image: bool = False) -> bool:
+    """Give the <img> elements of an HTMLNode tree their dimensions and lazy loading.
+
+    Images found in sizes get width and height, so the browser reserves
+    their space before they load. Every image gets decoding="async", and
+    every image but the page's first gets loading="lazy": the first is
+    likely above the fold, where lazy loading would only delay it.
+    Attributes already set are kept.
+
+    Args:
+        node: Root of the tree, with src values as written (before
+            rewrite_references)
+        sizes: Dimensions by site-root relative path, from ImageSizes.scan
+        base: URL path of the directory the page is served from
+        after_image: Whether the page had an image before this tree, for
+            callers that size a page in parts
+
+    Returns:
+        bool: Whether the page has had an image, up to the end of this tree
+    """
+    found = after_image
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.tag == "img" and current.props is not None:
+            size = sizes.get(resolve_reference(current.props.get("src", ""), base))
+            if size:
+                current.props.setdefault("width", str(size[0]))
+                current.props.setdefault("height", str(size[1]))
+            if found:
+                current.props.setdefault("loading", "lazy")
+            current.props.setdefault("decoding", "async")
+            found = True
+        if current.children:
+            stack.extend(reversed(current.children))
+    return found
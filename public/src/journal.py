@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from fingerprint import hash_file
+
+JOURNAL_FILE = "build-journal.jsonl"
+
+
+def options_digest(template_paths, manifest: dict | None, minify: bool, images: dict | None = None,
+                   flags=()) -> str:
+    """Digest of everything besides its source that a page's output depends on.
+
+    Args:
+        template_paths: The template file and its partials
+        images: Image dimensions pages are sized with
+        flags: Other build options that change pages
+    """
+    options = {
+        "templates": [hash_file(path) for path in template_paths],
+        "manifest": manifest,
+        "minify": minify,
+        "images": images,
+        "flags": list(flags),
+    }
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def read_header(path: str) -> dict | None:
+    try:
+        with open(path, 'r') as f:
+            return json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+
+
+def resumable_generation(path: str, live: str | None) -> str | None:
+    """Return the unpublished generation the journal at path was building, if it still exists."""
+    header = read_header(path)
+    if not header or not os.path.isdir(header.get("generation", "")):
+        return None
+    if live and os.path.realpath(header["generation"]) == os.path.realpath(live):
+        return None
+    return header["generation"]
+
+
+class BuildJournal:
+    """Append-only record of the pages a build has finished, for --resume.
+
+    The first line names the generation being built and the digest of the
+    build options; every further line is one page whose output has been
+    written: its source and output SHA-256, the URLs it references and its
+    page record. Lines are flushed as they are written, so a build killed
+    at any point leaves every finished page in the journal.
+
+    A resumed build trusts an entry only if the source and the output on
+    disk still have the recorded hashes.
+    """
+
+    def __init__(self, path: str, generation: str, options: str, resume: bool = False):
+        """
+        Args:
+            path: Journal file
+            generation: Directory the build writes to
+            options: options_digest of the build
+            resume: Keep the entries of a journal for the same generation
+                and options instead of starting a new one
+        """
+        self.path = path
+        self.generation = generation
+        self.entries = {}
+        self.lock = threading.Lock()
+        header = {"generation": generation, "options": options}
+        if resume:
+            if read_header(path) == header:
+                self.entries = self.load()
+            else:
+                logging.info("Journal is for another generation or other build options; not resuming")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.entries:
+            self.file = open(path, 'a')
+        else:
+            self.file = open(path, 'w')
+            self.file.write(json.dumps(header) + "\n")
+            self.file.flush()
+
+    def load(self) -> dict[str, dict]:
+        entries = {}
+        with open(self.path, 'rb') as f:
+            end = len(f.readline())
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                entries[entry["source"]] = entry
+                end += len(line)
+        # The last line of a killed build may be cut short; drop it before appending
+        os.truncate(self.path, end)
+        return entries
+
+    def completed(self, tasks: dict) -> dict[str, tuple]:
+        """Return the tasks the journal shows as done, with their outputs intact.
+
+        Args:
+            tasks: rel_source -> (source_file, dest_file, base)
+
+        Returns:
+            dict[str, tuple]: rel_source -> (referenced URLs, page_record or
+                None, output SHA-256)
+        """
+        done = {}
+        for rel_source, (source_file, dest_file, _) in tasks.items():
+            entry = self.entries.get(rel_source)
+            if not entry:
+                continue
+            try:
+                if (hash_file(source_file) != entry["source_sha256"]
+                        or hash_file(dest_file) != entry["output_sha256"]):
+                    continue
+            except OSError:
+                continue
+            done[rel_source] = (entry["urls"], entry["record"], entry["output_sha256"])
+        return done
+
+    def record(self, rel_source: str, source_file: str, dest_file: str, urls, record: dict | None = None):
+        """Note that dest_file has been written from source_file."""
+        entry = {
+            "source": rel_source,
+            "source_sha256": hash_file(source_file),
+            "output_sha256": hash_file(dest_file),
+            "urls": list(urls),
+            "record": record,
+        }
+        line = json.dumps(entry) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
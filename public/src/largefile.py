@@ -0,0 +1,127 @@
+import mmap
+import os
+from assets import collect_references
+from fingerprint import rewrite_references
+from images import size_images
+from markdown import block_to_html_node, iter_blocks
+from minify import StreamMinifier
+from pages import render_page, stream_page, template_values, write_page
+from shard import plain_text
+
+# Sources at least this big are rendered block by block from a memory map
+LARGE_FILE_BYTES = 1024 * 1024
+
+# Characters of text kept for the search index of a large page
+TEXT_LIMIT = 64 * 1024
+
+
+def iter_lines(data):
+    """Yield the decoded lines of a bytes-like object (e.g. an mmap), without newlines."""
+    position = 0
+    size = len(data)
+    while position < size:
+        end = data.find(b"\n", position)
+        if end == -1:
+            end = size
+        yield data[position:end].decode("utf-8").removesuffix("\r")
+        position = end + 1
+
+
+def find_title(lines) -> str:
+    """Return the text of the first h1 line, like extract_title."""
+    for line in lines:
+        if line.strip().startswith('# '):
+            return line.strip().removeprefix('# ').strip()
+    raise ValueError("No h1 header found in markdown file")
+
+
+class LargePage:
+    """A page rendered block by block from a memory-mapped markdown source.
+
+    Offers the same iter_chunks/title/references/saved interface as
+    RenderedPage, but parses nothing up front: each block is read from the
+    map, converted and streamed out before the next one is looked at, so
+    memory use follows the largest block instead of the file. title,
+    references and text are filled in while iter_chunks runs.
+    """
+
+    def __init__(self, path, template, manifest=None, base="/", minify=False):
+        self.path = path
+        self.template = template
+        self.manifest = manifest
+        self.base = base
+        self.minifier = StreamMinifier() if minify else None
+        self.title = None
+        self.content = None
+        self.references = []
+        self.text = ""
+
+    def iter_content(self, data):
+        yield "<div>"
+        text = []
+        text_size = 0
+        has_image = False
+        for block in iter_blocks(iter_lines(data)):
+            node = block_to_html_node(block)
+            self.references.extend(collect_references(node))
+            if self.template.images is not None:
+                has_image = size_images(node, self.template.images, self.base, has_image)
+            if self.manifest:
+                rewrite_references(node, self.manifest, self.base)
+            if text_size < TEXT_LIMIT:
+                text.append(plain_text(node))
+                text_size += len(text[-1]) + 1
+            yield from node.iter_html()
+        yield "</div>"
+        self.text = " ".join(text)[:TEXT_LIMIT]
+
+    def iter_chunks(self):
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            self.title = find_title(iter_lines(data))
+            chunks = self.iter_content(data)
+            if self.minifier:
+                chunks = self.minifier.minify(chunks)
+            # Pages too large for a tree inline every rule rather than none
+            critical = self.template.critical.style_for() if self.template.critical else ""
+            yield from self.template.render(template_values(self.title, self.base, chunks, critical))
+
+    @property
+    def saved(self) -> int:
+        if not self.minifier:
+            return 0
+        return self.minifier.saved + self.template.saved
+
+
+def read_source(path: str) -> str | None:
+    """Return the markdown of a source, or None when it is large enough to be rendered from a memory map."""
+    if os.path.getsize(path) >= LARGE_FILE_BYTES:
+        return None
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def load_page(path: str, template, manifest=None, base="/", minify=False, markdown_content=None):
+    """Prepare a source for rendering: a LargePage when it has LARGE_FILE_BYTES or more, else a RenderedPage.
+
+    Args:
+        path: The markdown source
+        template: The compiled template
+        manifest: Fingerprint manifest for asset URLs
+        base: URL path of the directory the page is served from
+        minify: Collapse insignificant whitespace in the content
+        markdown_content: The source's text, when the caller has already
+            read it with read_source; None reads it (or maps it) here
+    """
+    if markdown_content is None:
+        markdown_content = read_source(path)
+    if markdown_content is None:
+        return LargePage(path, template, manifest, base, minify)
+    return render_page(markdown_content, template, manifest, base, minify)
+
+
+def output_page(page, dest_path: str, writer=None):
+    """Write a page from load_page: a LargePage streams to dest_path, other pages render whole."""
+    if isinstance(page, LargePage):
+        stream_page(page, dest_path, writer)
+    else:
+        write_page(page, dest_path, writer)
@@ -0,0 +1,240 @@
+import difflib
+import json
+import logging
+import queue
+import threading
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+from largefile import LargePage
+from metrics import PAGES_BUILT, STAGE_SECONDS
+from ondemand import (
+    DEFAULT_PAGE_CACHE_BYTES,
+    OnDemandRequestHandler,
+    OnDemandServer,
+    OnDemandSite,
+)
+from pages import output_path_for, url_for
+from server import run_server
+
+EVENTS_PATH = "/__live"
+
+# Attribute marking the content root; its value is the page version
+ROOT_ATTRIBUTE = "data-live-root"
+
+POLL_INTERVAL = 0.02
+HEARTBEAT_INTERVAL = 15.0
+
+CLIENT_SCRIPT = """<script>
+(function () {
+  var root = document.querySelector("[%(attr)s]");
+  if (!root || !window.EventSource) return;
+  var source = new EventSource("%(events)s?path=" + encodeURIComponent(location.pathname) +
+                               "&version=" + root.getAttribute("%(attr)s"));
+  source.onmessage = function (event) {
+    var patch = JSON.parse(event.data);
+    root = document.querySelector("[%(attr)s]");
+    if (patch.reload || !root || root.getAttribute("%(attr)s") !== String(patch.from)) {
+      location.reload();
+      return;
+    }
+    var blocks = Array.prototype.slice.call(root.children);
+    for (var i = patch.ops.length - 1; i >= 0; i--) {
+      var op = patch.ops[i];
+      var before = blocks[op.end] || null;
+      for (var j = op.start; j < op.end; j++) root.removeChild(blocks[j]);
+      var parsed = document.createElement("template");
+      parsed.innerHTML = op.html.join("");
+      root.insertBefore(parsed.content, before);
+    }
+    root.setAttribute("%(attr)s", patch.to);
+    if (patch.title !== undefined) document.title = patch.title;
+  };
+})();
+</script>""" % {"attr": ROOT_ATTRIBUTE, "events": EVENTS_PATH}
+
+
+def page_blocks(html_node) -> list[str]:
+    """Return the HTML of each top-level block of a rendered page."""
+    return [child.to_html() for child in html_node.children or []]
+
+
+def diff_blocks(old: list[str], new: list[str]) -> list[dict]:
+    """Compute the block-level edits that turn old into new.
+
+    Returns:
+        list[dict]: Operations {"start", "end", "html"} in ascending order,
+            each replacing old[start:end] with the blocks in html. Indices
+            refer to old, so a client applies them from last to first.
+    """
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    return [
+        {"start": i1, "end": i2, "html": new[j1:j2]}
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def inject_script(html: str, marker: str = "") -> str:
+    """Insert the live reload client, after marker, before </body> (or at the end)."""
+    index = html.rfind("</body>")
+    if index == -1:
+        return html + marker + CLIENT_SCRIPT
+    return html[:index] + marker + CLIENT_SCRIPT + html[index:]
+
+
+class LiveSite(OnDemandSite):
+    """An on-demand site that pushes block patches to open pages on every re-render.
+
+    Each render of a source gets a new version number, which the page carries
+    on its content root. Subscribers on the previous version receive the diff
+    between the previous and new block lists; anyone else is told to reload.
+    Large sources are streamed from a memory map without a tree to diff, so
+    their version sits on an empty marker element and every re-render of
+    them asks open pages to reload.
+    """
+
+    def __init__(self, content_dir, template_path, cache_bytes=DEFAULT_PAGE_CACHE_BYTES, minify=False):
+        super().__init__(content_dir, template_path, cache_bytes, minify)
+        # rel_source -> (version, blocks or None for large pages, title)
+        self.pages = {}
+        # rel_source -> list of subscriber queues
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def render(self, rel_source: str, template) -> bytes:
+        page = self.render_page(rel_source, template)
+        with self.lock:
+            previous = self.pages.get(rel_source)
+            version = previous[0] + 1 if previous else 1
+        if isinstance(page, LargePage):
+            blocks = None
+            marker = f'<template {ROOT_ATTRIBUTE}="{version}"></template>'
+        else:
+            page.html_node.props = dict(page.html_node.props or {}, **{ROOT_ATTRIBUTE: str(version)})
+            blocks = page_blocks(page.html_node)
+            marker = ""
+        with STAGE_SECONDS.time(stage="render"):
+            data = inject_script("".join(page.iter_chunks()), marker).encode("utf-8")
+        PAGES_BUILT.inc()
+        with self.lock:
+            self.pages[rel_source] = (version, blocks, page.title)
+            targets = list(self.subscribers.get(rel_source, ()))
+        if previous and targets:
+            if blocks is None or previous[1] is None:
+                self.publish(targets, {"reload": True})
+                return data
+            patch = {"from": previous[0], "to": version, "ops": diff_blocks(previous[1], blocks)}
+            if page.title != previous[2]:
+                patch["title"] = page.title
+            self.publish(targets, patch)
+        return data
+
+    def current_template(self):
+        previous = self.template_mtime_ns
+        result = super().current_template()
+        if previous is not None and result[1] != previous:
+            # Template edits change everything outside the blocks
+            with self.lock:
+                targets = [q for queues in self.subscribers.values() for q in queues]
+            self.publish(targets, {"reload": True})
+        return result
+
+    def publish(self, targets, patch: dict):
+        message = json.dumps(patch)
+        for target in targets:
+            target.put(message)
+
+    def subscribe(self, rel_source: str) -> queue.Queue:
+        events = queue.Queue()
+        with self.lock:
+            self.subscribers.setdefault(rel_source, []).append(events)
+        return events
+
+    def unsubscribe(self, rel_source: str, events: queue.Queue):
+        with self.lock:
+            queues = self.subscribers.get(rel_source, [])
+            if events in queues:
+                queues.remove(events)
+            if not queues:
+                self.subscribers.pop(rel_source, None)
+
+    def version(self, rel_source: str) -> int | None:
+        with self.lock:
+            page = self.pages.get(rel_source)
+        return page[0] if page else None
+
+    def watch(self, stop: threading.Event, interval: float = POLL_INTERVAL):
+        """Poll the sources that have open pages and re-render them when they change.
+
+        Only files someone is looking at are stat'ed, so polling stays cheap
+        however large the content tree is. A failed render is logged and
+        the source is polled again, so one bad edit cannot stop the watcher.
+        """
+        while not stop.wait(interval):
+            with self.lock:
+                watched = list(self.subscribers)
+            try:
+                self.current_template()
+            except Exception as e:
+                logging.warning(f"Live reload of the template failed: {e}")
+                continue
+            for rel_source in watched:
+                try:
+                    self.get(url_for(output_path_for(rel_source)))
+                except Exception as e:
+                    logging.warning(f"Live reload of {rel_source} failed: {e}")
+
+
+class LiveRequestHandler(OnDemandRequestHandler):
+    def handle_request(self, send_body: bool):
+        parts = urlsplit(self.path)
+        if parts.path == EVENTS_PATH:
+            self.stream_events(parse_qs(parts.query))
+            return
+        super().handle_request(send_body)
+
+    def stream_events(self, query: dict):
+        site = self.server.site
+        found = site.find_source(query.get("path", ["/"])[0])
+        if found is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        rel_source = found[0]
+        self.close_connection = True
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        events = site.subscribe(rel_source)
+        try:
+            client_version = query.get("version", [""])[0]
+            if str(site.version(rel_source)) != client_version:
+                # The page changed between loading and subscribing
+                events.put(json.dumps({"reload": True}))
+            while True:
+                try:
+                    message = events.get(timeout=HEARTBEAT_INTERVAL)
+                    self.wfile.write(f"data: {message}\n\n".encode("utf-8"))
+                except queue.Empty:
+                    self.wfile.write(b": heartbeat\n\n")
+        except OSError:
+            pass
+        finally:
+            site.unsubscribe(rel_source, events)
+
+
+def serve_live(content_dir, template_path, static_dir, host="127.0.0.1", port=8888,
+               cache_bytes=DEFAULT_PAGE_CACHE_BYTES, minify=False, metrics=False):
+    """Serve content_dir on demand with live block patching, until interrupted."""
+    site = LiveSite(content_dir, template_path, cache_bytes, minify)
+    server = OnDemandServer((host, port), site, static_dir, handler_class=LiveRequestHandler,
+                            metrics=metrics)
+    stop = threading.Event()
+    threading.Thread(target=site.watch, args=(stop,), daemon=True).start()
+    logging.info(f"Serving {content_dir} with live reload at http://{host}:{server.server_address[1]}/")
+    try:
+        run_server(server)
+    finally:
+        stop.set()
@@ -1,10 +1,101 @@
 from textnode import TextNode, TextType
+import argparse
 import os
 import shutil
+import sys
+import time
 import logging
-from markdown import markdown_to_html_node, extract_title
+from assets import (
+    DEFAULT_KEEP_GLOBS,
+    resolve_reference,
+    select_assets,
+    template_references,
+    write_asset_report,
+)
+from critical import linked_stylesheets
+from fingerprint import (
+    FingerprintCache,
+    build_manifest,
+    format_headers_file,
+    format_manifest,
+    write_headers_file,
+    write_manifest,
+)
+from images import IMAGE_SIZES_FILE, ImageSizes
+from navigation import NAVIGATION_SCRIPT_FILE, PAGE_DATA_FILE, format_navigation_script
+from prefetch import (
+    PRECACHE_MANIFEST_FILE,
+    SERVICE_WORKER_FILE,
+    format_precache_manifest,
+    format_service_worker,
+    precache_manifest,
+)
+from archive import ArchiveWriter, archive_format, serve_archive
+from compress import DEFAULT_MIN_SIZE, PRECOMPRESS_SKIPS_FILE, available_encoders, precompress_tree
+from costs import COSTS_FILE, PageCosts
+from pages import (
+    TEMPLATE_CACHE_DIR,
+    compile_template,
+    output_path_for,
+    render_html,
+    render_page_data,
+    stream_page,
+    url_for,
+    write_html,
+    write_page_data,
+)
+from largefile import LargePage, load_page, output_page, read_source
+from journal import JOURNAL_FILE, BuildJournal, options_digest, resumable_generation
+from outputs import OUTPUT_HASHES_FILE, OutputWriter
+from publish import (
+    current_generation,
+    discard,
+    link_unchanged,
+    new_generation,
+    publish,
+    remove_in_background,
+    stale_generations,
+)
+from pipeline import run_pipeline
+from report import BuildReport
+from schedule import critical_path, format_path, run_longest_first
+from daemon import SOCKET_NAME, Builder, run_daemon
+from deploy import DEFAULT_CONCURRENCY, DEPLOY_HASHES_FILE, S3Client, S3Error, deploy
+from livereload import serve_live
+from metrics import start_metrics_server
+from ondemand import serve_on_demand
+from server import serve
+from stream import DEFAULT_WINDOW, LINK_GRAPH_FILE, LinkGraph, generate_pages_streaming
+from shard import (
+    merge_shards,
+    page_record,
+    parse_shard,
+    plan_digest,
+    plan_shards,
+    write_shard_manifest,
+)
+from template import Template, template_files
 
-def copy_directory(src_dir, dest_dir):
+# Project layout: src/ lives next to the content, static files and template
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTENT_DIR = os.path.join(PROJECT_DIR, "content")
+TEMPLATE_PATH = os.path.join(PROJECT_DIR, "template.html")
+STATIC_DIR = os.path.join(PROJECT_DIR, "static")
+PUBLIC_DIR = os.path.join(PROJECT_DIR, "public")
+
+def copy_file(src_file, dest_file, previous_file=None):
+    """Copy a file, or hardlink its unchanged copy from the previous build."""
+    # A copy left by an interrupted build may be a hardlink into the previous
+    # generation; replace it rather than write through it
+    if os.path.lexists(dest_file):
+        os.remove(dest_file)
+    if previous_file and link_unchanged(src_file, dest_file, previous_file):
+        logging.info(f"Linking unchanged file: {previous_file} -> {dest_file}")
+        return
+    logging.info(f"Copying file: {src_file} -> {dest_file}")
+    shutil.copy2(src_file, dest_file)
+
+def copy_directory(src_dir, dest_dir, include=None, clean=True, rename=None, previous=None):
     """
     Recursively copy all contents from src_dir to dest_dir.
     First deletes all contents in dest_dir if it exists.
@@ -12,15 +103,23 @@ def copy_directory(src_dir, dest_dir):
     Args:
         src_dir (str): Source directory path
         dest_dir (str): Destination directory path
+        include (set[str] | None): If given, only copy files whose path
+            relative to src_dir (using "/" separators) is in this set
+        clean (bool): Delete dest_dir before copying
+        rename (dict[str, str] | None): Fingerprint manifest; files listed in
+            it are copied to their fingerprinted name and hardlinked under
+            the original name so unrewritten references (e.g. from CSS) work
+        previous (str | None): Output directory of the previous build;
+            files whose copy there is unchanged are hardlinked from it
     """
     # Delete destination directory if it exists
-    if os.path.exists(dest_dir):
+    if clean and os.path.exists(dest_dir):
         logging.info(f"Deleting existing directory: {dest_dir}")
         shutil.rmtree(dest_dir)
     
     # Create destination directory
     logging.info(f"Creating directory: {dest_dir}")
-    os.makedirs(dest_dir)
+    os.makedirs(dest_dir, exist_ok=True)
     
     # Walk through source directory
     for root, dirs, files in os.walk(src_dir):
@@ -29,106 +128,824 @@ def copy_directory(src_dir, dest_dir):
         dest_path = os.path.join(dest_dir, rel_path)
         
         # Create directories in destination
-        for dir_name in dirs:
-            dir_path = os.path.join(dest_path, dir_name)
-            logging.info(f"Creating directory: {dir_path}")
-            os.makedirs(dir_path, exist_ok=True)
+        if include is None:
+            for dir_name in dirs:
+                dir_path = os.path.join(dest_path, dir_name)
+                logging.info(f"Creating directory: {dir_path}")
+                os.makedirs(dir_path, exist_ok=True)
         
         # Copy files
         for file_name in files:
             src_file = os.path.join(root, file_name)
             dest_file = os.path.join(dest_path, file_name)
-            logging.info(f"Copying file: {src_file} -> {dest_file}")
-            shutil.copy2(src_file, dest_file)
+            rel_file = os.path.normpath(os.path.join(rel_path, file_name)).replace(os.sep, "/")
+            if include is not None:
+                if rel_file not in include:
+                    continue
+                os.makedirs(dest_path, exist_ok=True)
+            if rename and rel_file in rename:
+                original_file = dest_file
+                dest_file = os.path.join(dest_dir, rename[rel_file])
+                copy_file(src_file, dest_file, previous and os.path.join(previous, rename[rel_file]))
+                if os.path.lexists(original_file):
+                    os.remove(original_file)
+                try:
+                    os.link(dest_file, original_file)
+                except OSError:
+                    shutil.copy2(src_file, original_file)
+                continue
+            copy_file(src_file, dest_file, previous and os.path.join(previous, rel_file))
 
-def generate_page(from_path, template_path, dest_path):
+def generate_page(from_path, template_path, dest_path, manifest=None, base="/", minify=False, report=None,
+                  pages=None, writer=None):
     """
     Generate an HTML page from a markdown file using a template.
     
     Args:
         from_path (str): Path to the source markdown file
-        template_path (str): Path to the template HTML file
+        template_path (str | Template): Path to the template HTML file, or
+            a template already compiled by compile_template
         dest_path (str): Path where the generated HTML file should be written
+        manifest (dict[str, str] | None): Fingerprint manifest used to rewrite
+            asset references in the page and the template
+        base (str): URL path of the directory the page is served from
+        minify (bool): Collapse insignificant whitespace in the output
+        report (BuildReport | None): Report that build counters are added to
+        pages (list[dict] | None): If given, the page's page_record is appended
+        writer (OutputWriter | None): Writes the page unless it is unchanged
+
+    Returns:
+        list[str]: The src/href URLs referenced by the rendered page
     """
-    logging.info(f"Generating page from {from_path} to {dest_path} using {template_path}")
-    
-    # Read markdown content
-    with open(from_path, 'r') as f:
-        markdown_content = f.read()
-    
-    # Read template
-    with open(template_path, 'r') as f:
-        template = f.read()
-    
-    # Convert markdown to HTML
-    html_node = markdown_to_html_node(markdown_content)
-    html_content = html_node.to_html()
-    
-    # Extract title
-    title = extract_title(markdown_content)
-    
-    # Replace placeholders in template
-    final_html = template.replace("{{ Title }}", title).replace("{{ Content }}", html_content)
+    logging.info(f"Generating page from {from_path} to {dest_path}")
     
-    # Create destination directory if it doesn't exist
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    # Compile template unless the caller already did
+    if isinstance(template_path, Template):
+        template = template_path
+    else:
+        template = compile_template(template_path, manifest, minify)
     
-    # Write output file
-    with open(dest_path, 'w') as f:
-        f.write(final_html)
+    # Large sources are mapped and streamed block by block instead of read whole
+    page = load_page(from_path, template, manifest, base, minify)
+    output_page(page, dest_path, writer)
+    record = page_record(page, base) if pages is not None else None
 
-def generate_pages_recursive(content_dir, template_path, dest_dir):
-    """Generate HTML pages for all markdown files in content directory"""
+    if report:
+        report.add("pages built")
+        if minify:
+            report.add("bytes saved by minification", page.saved)
+    if pages is not None:
+        pages.append(record)
+
+    return page.references
+
+def generate_pages_recursive(content_dir, template_path, dest_dir, manifest=None, minify=False, report=None,
+                             only=None, costs=None, pages=None, jobs=1, pipeline=False, writer=None,
+                             journal=None, template_cache=None, critical_css=None, images=None, prefetch=0,
+                             service_worker=False, page_data=False):
+    """Generate HTML pages for all markdown files in content directory
+
+    Args:
+        manifest (dict[str, str] | None): Fingerprint manifest passed to generate_page
+        minify (bool): Minify the template and the rendered pages
+        report (BuildReport | None): Report that build counters are added to
+        only (set[str] | None): If given, only build these content-relative
+            sources (e.g. one shard's part of the site)
+        costs (PageCosts | None): Records how long each page took to build
+        pages (list[dict] | None): Collects the page_record of every page
+        jobs (int): Worker processes; with more than one, pages are
+            dispatched longest-expected-first using costs
+        pipeline (bool): Read and write files on I/O threads while pages
+            are rendered (ignored when jobs > 1)
+        writer (OutputWriter | None): Writes pages, skipping unchanged ones
+        journal (BuildJournal | None): Records every finished page; pages it
+            already shows as finished, with intact outputs, are not rebuilt
+        template_cache (str | None): Directory for compiled template code
+        critical_css (str | None): Static directory to inline each page's
+            critical CSS from (see compile_template)
+        images (dict | None): Image dimensions to size <img> elements with
+        prefetch (int): Pages each page prefetches (see compile_template)
+        service_worker (bool): Register the service worker in every page
+        page_data (bool): Write each page's page.json and load the
+            navigation script (see compile_template)
+
+    Returns:
+        set[str]: Site-root relative paths of every local file the pages reference
+    """
     # Walk through the content directory
+    tasks = {}
     for root, _, files in os.walk(content_dir):
         for file in files:
             if file.endswith('.md'):
                 # Get the source file path
                 source_file = os.path.join(root, file)
                 
-                # Calculate the destination path
-                rel_path = os.path.relpath(root, content_dir)
-                dest_path = os.path.join(dest_dir, rel_path)
-                
                 # Convert index.md to index.html, other.md to other/index.html
-                if file == 'index.md':
-                    dest_file = os.path.join(dest_path, 'index.html')
-                else:
-                    # Remove .md extension and create directory
-                    file_base = os.path.splitext(file)[0]
-                    dest_file = os.path.join(dest_path, file_base, 'index.html')
-                
-                # Generate the page
-                generate_page(source_file, template_path, dest_file)
+                rel_source = os.path.relpath(source_file, content_dir).replace(os.sep, "/")
+                if only is not None and rel_source not in only:
+                    continue
+                rel_output = output_path_for(rel_source)
+                dest_file = os.path.join(dest_dir, *rel_output.split("/"))
+                tasks[rel_source] = (source_file, dest_file, url_for(rel_output))
 
-def main():
-    # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s'
+    resumed = journal.completed(tasks) if journal else {}
+    if resumed:
+        logging.info(f"Resuming: {len(resumed)} of {len(tasks)} pages are already built")
+        if report:
+            report.add("pages resumed", len(resumed))
+    pending = {rel_source: task for rel_source, task in tasks.items() if rel_source not in resumed}
+
+    template = compile_template(template_path, manifest, minify, template_cache, content_dir, critical_css, images,
+                                prefetch, service_worker, page_data)
+    template.fragments.report = report
+    if jobs > 1 and len(pending) > 1:
+        built = generate_pages_parallel(pending, template_path, manifest, minify, report, costs, jobs, writer,
+                                        journal, template_cache, template.globals, critical_css, images,
+                                        prefetch, service_worker, page_data)
+    elif pipeline:
+        built = generate_pages_pipelined(pending, template, manifest, minify, report, pages is not None,
+                                         writer, journal)
+    else:
+        built = {}
+        for rel_source, (source_file, dest_file, base) in pending.items():
+            start = time.perf_counter()
+            urls = generate_page(source_file, template, dest_file, manifest, base, minify, report, pages, writer)
+            if journal:
+                journal.record(rel_source, source_file, dest_file, urls, pages[-1] if pages else None)
+            built[rel_source] = (urls, time.perf_counter() - start, None)
+    for rel_source, (urls, record, digest) in resumed.items():
+        built[rel_source] = (urls, None, record)
+        if writer:
+            # Kept pages are outputs of this build too; the next one compares against them
+            dest_file = tasks[rel_source][1]
+            writer.adopt(dest_file, digest)
+            data_path = os.path.join(os.path.dirname(dest_file), PAGE_DATA_FILE)
+            if os.path.exists(data_path):
+                writer.adopt(data_path)
+
+    # Resolve each page's references against its URL
+    references = set()
+    for rel_source, (urls, seconds, record) in built.items():
+        if costs and seconds is not None:
+            costs.record(rel_source, seconds)
+        if pages is not None and record is not None:
+            pages.append(record)
+        base = tasks[rel_source][2]
+        for url in urls:
+            resolved = resolve_reference(url, base)
+            if resolved:
+                references.add(resolved)
+
+    return references
+
+def generate_pages_pipelined(tasks, template, manifest, minify, report, records, writer=None, journal=None):
+    """Build pages with source reads and output writes overlapped with rendering.
+
+    Reader threads prefetch sources and writer threads write finished
+    pages while this thread parses and renders; bounded queues between
+    the stages keep memory flat (see run_pipeline).
+
+    Returns:
+        dict[str, tuple]: rel_source -> (referenced URLs, seconds, page_record or None)
+    """
+    built = {}
+
+    def read(rel_source):
+        return read_source(tasks[rel_source][0])
+
+    def process(rel_source, markdown_content):
+        source_file, dest_file, base = tasks[rel_source]
+        logging.info(f"Generating page from {source_file} to {dest_file}")
+        start = time.perf_counter()
+        page = load_page(source_file, template, manifest, base, minify, markdown_content)
+        if isinstance(page, LargePage):
+            # Too large to hand over as a string; it streams from here
+            stream_page(page, dest_file, writer)
+            html = data = None
+        else:
+            html = render_html(page)
+            data = render_page_data(page)
+        built[rel_source] = (page.references, time.perf_counter() - start,
+                             page_record(page, base) if records else None)
+        if report:
+            report.add("pages built")
+            if minify:
+                report.add("bytes saved by minification", page.saved)
+        return html, data
+
+    def write(rel_source, rendered):
+        html, data = rendered
+        if html is not None:
+            write_html(html, tasks[rel_source][1], writer)
+        write_page_data(data, tasks[rel_source][1], writer)
+        if journal:
+            urls, _, record = built[rel_source]
+            journal.record(rel_source, tasks[rel_source][0], tasks[rel_source][1], urls, record)
+
+    run_pipeline(tasks, read, process, write)
+    return built
+
+_worker_template = None
+_worker_writer = None
+
+def _init_page_worker(template_path, manifest, minify, writer_args, template_cache, template_globals, critical_css,
+                      images, prefetch, service_worker, page_data):
+    global _worker_template, _worker_writer
+    # Workers load the compiled code and parsed stylesheets from template_cache
+    _worker_template = compile_template(template_path, manifest, minify, template_cache, None, critical_css, images,
+                                        prefetch, service_worker, page_data)
+    for name, value in template_globals.items():
+        _worker_template.bind(name, value)
+    if writer_args:
+        _worker_writer = OutputWriter(*writer_args)
+
+def _generate_page_in_worker(source_file, dest_file, base, manifest, minify):
+    report = BuildReport()
+    pages = []
+    start = time.perf_counter()
+    if _worker_writer:
+        _worker_writer.report = report
+    _worker_template.fragments.report = report
+    urls = generate_page(source_file, _worker_template, dest_file, manifest, base, minify, report, pages,
+                         _worker_writer)
+    hashes = {}
+    if _worker_writer:
+        hashes, _worker_writer.hashes = _worker_writer.hashes, {}
+    return urls, time.perf_counter() - start, pages[0], report.counters, hashes
+
+def generate_pages_parallel(tasks, template_path, manifest, minify, report, costs, jobs, writer=None,
+                            journal=None, template_cache=None, template_globals=None, critical_css=None,
+                            images=None, prefetch=0, service_worker=False, page_data=False):
+    """Build pages across worker processes, longest expected first.
+
+    Expected costs come from the timings of previous builds (file size for
+    new pages). The predicted and the measured critical path, i.e. the
+    pages of the worker that finished last, are added to the report.
+
+    Returns:
+        dict[str, tuple]: rel_source -> (referenced URLs, seconds, page_record)
+    """
+    sizes = {rel_source: os.path.getsize(task[0]) for rel_source, task in tasks.items()}
+    expected = (costs or PageCosts()).estimate(sizes)
+    jobs_args = {rel_source: (source_file, dest_file, base, manifest, minify)
+                 for rel_source, (source_file, dest_file, base) in tasks.items()}
+    writer_args = writer and (writer.dest_dir, writer.previous_dir, writer.hashes_path)
+
+    def finished(rel_source, result):
+        if journal:
+            urls, _, record, _, _ = result
+            journal.record(rel_source, tasks[rel_source][0], tasks[rel_source][1], urls, record)
+
+    logging.info(f"Building {len(tasks)} pages with {jobs} workers, longest expected first")
+    results, predicted, actual = run_longest_first(
+        _generate_page_in_worker, jobs_args, expected, jobs,
+        initializer=_init_page_worker,
+        initargs=(template_path, manifest, minify, writer_args, template_cache, template_globals or {},
+                  critical_css, images, prefetch, service_worker, page_data),
+        on_result=finished,
     )
+
+    built = {}
+    for rel_source, (urls, seconds, record, counters, hashes) in results.items():
+        built[rel_source] = (urls, seconds, record)
+        if writer:
+            writer.hashes.update(hashes)
+            writer.written += counters.get("pages written", 0)
+            writer.unchanged += counters.get("pages unchanged", 0)
+        if report:
+            for name, amount in counters.items():
+                report.add(name, amount)
+    if report:
+        makespan, names = critical_path(predicted)
+        if costs and any(rel_source in costs.seconds for rel_source in tasks):
+            report.detail("predicted critical path", format_path(makespan, names))
+        else:
+            report.detail("predicted critical path", f"by size, no timings yet ({', '.join(names[:5])})")
+        report.detail("actual critical path", format_path(*critical_path(actual)))
+    return built
+
+def source_sizes(content_dir):
+    """Return the size in bytes of every markdown source, by content-relative path."""
+    sizes = {}
+    for root, _, files in os.walk(content_dir):
+        for file in files:
+            if file.endswith('.md'):
+                source_file = os.path.join(root, file)
+                rel_source = os.path.relpath(source_file, content_dir).replace(os.sep, "/")
+                sizes[rel_source] = os.path.getsize(source_file)
+    return sizes
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the static site")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    serve_parser = commands.add_parser("serve", help="serve the built site over HTTP")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8888)
+    serve_parser.add_argument(
+        "--dir",
+        default=PUBLIC_DIR,
+        help="directory to serve (default: the build output)",
+    )
+    serve_parser.add_argument(
+        "--on-demand",
+        action="store_true",
+        help="render pages from content/ on first request instead of serving a build",
+    )
+    serve_parser.add_argument(
+        "--live",
+        action="store_true",
+        help="like --on-demand, and patch open pages in place when their source changes",
+    )
+    serve_parser.add_argument(
+        "--from-archive",
+        metavar="PATH",
+        help="serve straight out of a .tar or .zip written by --archive",
+    )
+    serve_parser.add_argument(
+        "--page-cache-mb",
+        type=int,
+        default=64,
+        metavar="MB",
+        help="size of the rendered page cache used by --on-demand (default: 64)",
+    )
+    serve_parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="expose Prometheus metrics at /metrics",
+    )
+
+    parser.add_argument(
+        "--tree-shake",
+        action="store_true",
+        help="only copy static assets that pages reference or --keep matches",
+    )
+    parser.add_argument(
+        "--keep",
+        action="append",
+        metavar="GLOB",
+        help=f"static paths always copied with --tree-shake (default: {' '.join(DEFAULT_KEEP_GLOBS)})",
+    )
+    parser.add_argument(
+        "--asset-report",
+        metavar="PATH",
+        help="write the unused static assets found by --tree-shake to PATH",
+    )
+    parser.add_argument(
+        "--fingerprint",
+        action="store_true",
+        help="copy static assets to content-hashed names and rewrite references to them",
+    )
+    parser.add_argument(
+        "--state-dir",
+        metavar="DIR",
+        help="directory for caches kept between builds (default: .cache next to src/)",
+    )
+    parser.add_argument(
+        "--precompress",
+        action="store_true",
+        help="write .gz (and .zst/.br when available) siblings for compressible outputs",
+    )
+    parser.add_argument(
+        "--compress-min-size",
+        type=int,
+        default=DEFAULT_MIN_SIZE,
+        metavar="BYTES",
+        help=f"skip files smaller than this when precompressing (default: {DEFAULT_MIN_SIZE})",
+    )
+    parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="collapse insignificant whitespace in the template and rendered pages",
+    )
+    parser.add_argument(
+        "--critical-css",
+        action="store_true",
+        help="inline the CSS rules each page may use and load the template's stylesheets asynchronously",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=0,
+        metavar="N",
+        help="add <link rel=\"prefetch\"> for the first N pages each page links to (e.g. 3)",
+    )
+    parser.add_argument(
+        "--service-worker",
+        action="store_true",
+        help="write a service worker that precaches the template's static assets, and register it",
+    )
+    parser.add_argument(
+        "--page-data",
+        action="store_true",
+        help="write a page.json of each page's content, title and headings, for client-side navigation",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="render pages in N worker processes, longest expected first (default: 1)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="read sources and write pages on I/O threads while rendering (for slow filesystems)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="build with memory bounded by --stream-window rather than the number of pages",
+    )
+    parser.add_argument(
+        "--stream-window",
+        type=int,
+        default=DEFAULT_WINDOW,
+        metavar="N",
+        help=f"pages queued between stages with --stream (default: {DEFAULT_WINDOW})",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue an interrupted build, keeping the pages it had finished",
+    )
+    parser.add_argument(
+        "--archive",
+        metavar="PATH",
+        help="write the site into one archive (.tar, .tar.gz, .tar.xz or .zip) instead of public/",
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        help="build only part I of N of the pages (plus static files on shard 1); combine with merge",
+    )
+    parser.add_argument(
+        "--shard-costs",
+        metavar="PATH",
+        help="balance shards by the page timings in this page-costs.json, the same file on every runner "
+             "(default: by file size)",
+    )
+    daemon_parser = commands.add_parser(
+        "daemon",
+        help="keep a warm builder running behind a Unix socket (see src/client.py)",
+    )
+    daemon_parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="socket to listen on (default: daemon.sock in the state directory)",
+    )
+    daemon_parser.add_argument(
+        "--metrics-port",
+        type=int,
+        metavar="PORT",
+        help="also serve Prometheus metrics over HTTP on 127.0.0.1:PORT",
+    )
+    merge_parser = commands.add_parser(
+        "merge",
+        help="combine the outputs of a sharded build and write the sitemap and search index",
+    )
+    merge_parser.add_argument("shard_dirs", nargs="+", metavar="SHARD_DIR")
+    merge_parser.add_argument(
+        "--out",
+        default=PUBLIC_DIR,
+        help="directory to merge into (default: the build output)",
+    )
+    merge_parser.add_argument(
+        "--site-url",
+        default="",
+        metavar="URL",
+        help="scheme and host for sitemap URLs, e.g. https://example.com",
+    )
+    deploy_parser = commands.add_parser(
+        "deploy",
+        help="upload the changes since the last deploy to an S3-compatible bucket",
+    )
+    deploy_parser.add_argument("bucket")
+    deploy_parser.add_argument(
+        "--dir",
+        default=PUBLIC_DIR,
+        help="directory to deploy (default: the build output)",
+    )
+    deploy_parser.add_argument(
+        "--endpoint",
+        metavar="URL",
+        help="S3 endpoint, e.g. http://localhost:9000 for MinIO (default: AWS S3 in --region)",
+    )
+    deploy_parser.add_argument(
+        "--region",
+        default=os.environ.get("AWS_REGION", "us-east-1"),
+        help="region used for signing (default: $AWS_REGION or us-east-1)",
+    )
+    deploy_parser.add_argument(
+        "--prefix",
+        default="",
+        help="key prefix inside the bucket, e.g. site/",
+    )
+    deploy_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        metavar="N",
+        help=f"number of parallel uploads (default: {DEFAULT_CONCURRENCY})",
+    )
+    deploy_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="list what would be uploaded and deleted without changing the bucket",
+    )
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.command == "deploy" and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.stream and (args.shard or args.jobs > 1):
+        parser.error("--stream cannot be combined with --shard or --jobs")
+    if args.shard:
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.tree_shake:
+            parser.error("--tree-shake needs every page's references and cannot be used with --shard")
+    if args.shard_costs:
+        if not args.shard:
+            parser.error("--shard-costs only applies to --shard")
+        if not os.path.isfile(args.shard_costs):
+            parser.error(f"--shard-costs: no such file: {args.shard_costs}")
+    if args.archive:
+        try:
+            archive_format(args.archive)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.shard or args.jobs > 1:
+            parser.error("--archive is written by one process and cannot be combined with --shard or --jobs")
+    if args.resume and (args.stream or args.archive):
+        parser.error("--resume cannot be combined with --stream or --archive")
+    if args.command == "daemon" and args.tree_shake:
+        parser.error("--tree-shake needs every page's references and cannot be used with daemon")
+    return args
+
+def build(args):
+    """Build the site into a fresh generation, then swap it in as PUBLIC_DIR.
+
+    PUBLIC_DIR keeps serving the previous build until the new one is
+    complete, and is left untouched if the build fails. A failed build's
+    generation is kept, with a journal of its finished pages, so --resume
+    can complete it. With --archive, the site goes into the archive
+    instead and PUBLIC_DIR is not touched.
+    """
+    if args.archive:
+        encoders = available_encoders() if args.precompress else None
+        archive = ArchiveWriter(args.archive, PUBLIC_DIR, encoders, args.compress_min_size)
+        try:
+            build_into(args, PUBLIC_DIR, archive=archive)
+        except BaseException:
+            archive.abort()
+            raise
+        archive.close()
+        return
+    previous = current_generation(PUBLIC_DIR)
+    state_dir = args.state_dir or os.path.join(PROJECT_DIR, ".cache")
+    journal_path = None if args.stream else os.path.join(state_dir, JOURNAL_FILE)
+    staging = None
+    if args.resume:
+        staging = resumable_generation(journal_path, previous)
+        if staging:
+            logging.info(f"Resuming the build in {staging}")
+        else:
+            logging.info("No interrupted build to resume; starting a new one")
+    staging = staging or new_generation(PUBLIC_DIR)
+    try:
+        build_into(args, staging, previous, journal_path=journal_path)
+    except BaseException:
+        if journal_path:
+            logging.error(f"Build failed; run again with --resume to continue it in {staging}")
+        else:
+            discard(staging)
+        raise
+    publish(staging, PUBLIC_DIR)
+    if journal_path:
+        os.remove(journal_path)
+    remove_in_background(stale_generations(PUBLIC_DIR))
+
+def build_into(args, public_dir, previous=None, archive=None, journal_path=None):
+    """Build the whole site into public_dir using the parsed command line options.
+
+    Args:
+        public_dir (str): Empty directory to build into
+        previous (str | None): Output of the previous build, to hardlink
+            unchanged files from
+        archive (ArchiveWriter | None): Receives every output instead of
+            public_dir, which is then only used to name them
+        journal_path (str | None): Journal of finished pages; with
+            --resume, pages it lists for public_dir are not rebuilt
+    """
+    content_dir = CONTENT_DIR
+    template_path = TEMPLATE_PATH
+    static_dir = STATIC_DIR
+    state_dir = args.state_dir or os.path.join(PROJECT_DIR, ".cache")
     
-    # Define directories and files
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    parent_dir = os.path.dirname(current_dir)
-    content_dir = os.path.join(parent_dir, "content")
-    template_path = os.path.join(parent_dir, "template.html")
-    static_dir = os.path.join(parent_dir, "static")
-    public_dir = os.path.join(parent_dir, "public")
-    
-    # Delete and recreate public directory
-    if os.path.exists(public_dir):
-        logging.info(f"Deleting existing directory: {public_dir}")
-        shutil.rmtree(public_dir)
-    
-    # Copy static files
+    # Hash static assets up front so pages can link to their fingerprinted names
+    manifest = images = None
     if os.path.exists(static_dir):
-        logging.info("Copying static files...")
-        copy_directory(static_dir, os.path.join(public_dir, "static"))
+        cache = FingerprintCache(os.path.join(state_dir, "fingerprints.json"))
+        if args.fingerprint:
+            manifest = build_manifest(static_dir, cache)
+            logging.info(f"Fingerprinted {len(manifest)} assets ({cache.hashed} hashed, rest cached)")
+        # Image dimensions for <img width height>, read from headers once per distinct image
+        image_sizes = ImageSizes(os.path.join(state_dir, IMAGE_SIZES_FILE))
+        images = image_sizes.scan(static_dir, cache)
+        image_sizes.save()
+        cache.save()
     
+    # With --shard, split the pages by expected cost and keep this shard's part
+    costs = PageCosts(os.path.join(state_dir, COSTS_FILE))
+    only = pages = None
+    if args.shard:
+        index, count = args.shard
+        groups = plan_shards(source_sizes(content_dir), count, args.shard_costs)
+        only = set(groups[index - 1])
+        pages = []
+        logging.info(f"Building shard {index}/{count}: {len(only)} pages")
+
     # Generate all pages recursively
     logging.info("Generating pages...")
-    generate_pages_recursive(content_dir, template_path, public_dir)
+    report = BuildReport()
+    # Pages identical to the previous build's keep that file (and its mtime);
+    # streaming compares against the previous file instead of recorded hashes
+    hashes_path = None if args.stream else os.path.join(state_dir, OUTPUT_HASHES_FILE)
+    template_cache = os.path.join(state_dir, TEMPLATE_CACHE_DIR)
+    critical_css = static_dir if args.critical_css and os.path.exists(static_dir) else None
+    if archive:
+        archive.report = report
+        outputs = archive
+    else:
+        outputs = OutputWriter(public_dir, previous, hashes_path, report)
+    links = None
+    if args.stream:
+        # Keep memory flat: no per-page state in memory, references go to disk
+        links = LinkGraph(os.path.join(state_dir, LINK_GRAPH_FILE))
+        generate_pages_streaming(content_dir, template_path, public_dir, links, manifest,
+                                 args.minify, report, args.stream_window, outputs, template_cache, critical_css,
+                                 images, args.prefetch, args.service_worker, args.page_data)
+        references = links
+    else:
+        journal = None
+        if journal_path:
+            dependencies = template_files(template_path)
+            if critical_css:
+                dependencies += linked_stylesheets(dependencies, critical_css)
+            options = options_digest(dependencies, manifest, args.minify, images,
+                                     [args.critical_css, args.prefetch, args.service_worker, args.page_data])
+            journal = BuildJournal(journal_path, public_dir, options, args.resume)
+        try:
+            references = generate_pages_recursive(
+                content_dir, template_path, public_dir, manifest, args.minify, report,
+                only, costs, pages, args.jobs, args.pipeline, outputs, journal, template_cache, critical_css,
+                images, args.prefetch, args.service_worker, args.page_data
+            )
+        finally:
+            if journal:
+                journal.close()
+        costs.save()
+    outputs.save()
+    logging.info(f"Wrote {outputs.written} pages, kept {outputs.unchanged} identical ones")
+    
+    # Copy static files to the site root, where pages and the template expect them
+    # (only once when sharding, so shard outputs never overlap)
+    if os.path.exists(static_dir) and (not args.shard or args.shard[0] == 1):
+        include = None
+        if args.tree_shake:
+            references |= template_references(template_files(template_path))
+            include, unused = select_assets(static_dir, references, args.keep or DEFAULT_KEEP_GLOBS)
+            for rel_path in unused:
+                logging.warning(f"Skipping unused asset: {rel_path}")
+            logging.info(f"Tree-shaking kept {len(include)} assets and dropped {len(unused)}")
+            if args.asset_report:
+                write_asset_report(args.asset_report, unused, static_dir)
+        logging.info("Copying static files...")
+        if archive:
+            archive.add_tree(static_dir, include, manifest)
+        else:
+            copy_directory(static_dir, public_dir, include=include, clean=False, rename=manifest,
+                           previous=previous)
+        if manifest:
+            copied = manifest if include is None else {k: v for k, v in manifest.items() if k in include}
+            if archive:
+                archive.add("asset-manifest.json", format_manifest(copied).encode("utf-8"))
+                archive.add("_headers", format_headers_file(copied.values()).encode("utf-8"))
+            else:
+                write_manifest(os.path.join(public_dir, "asset-manifest.json"), copied)
+                write_headers_file(os.path.join(public_dir, "_headers"), copied.values())
+        if args.service_worker:
+            precache = precache_manifest(template_files(template_path), static_dir, cache, manifest)
+            service_worker_files = {
+                PRECACHE_MANIFEST_FILE: format_precache_manifest(precache),
+                SERVICE_WORKER_FILE: format_service_worker(precache),
+            }
+            for name, text in service_worker_files.items():
+                if archive:
+                    archive.add(name, text.encode("utf-8"))
+                else:
+                    with open(os.path.join(public_dir, name), 'w') as f:
+                        f.write(text)
+            logging.info(f"Service worker precaches {len(precache['assets'])} assets (version {precache['version']})")
+
+    # Pages load the navigation script from the site root, static files or not
+    if args.page_data and (not args.shard or args.shard[0] == 1):
+        script = format_navigation_script()
+        if archive:
+            archive.add(NAVIGATION_SCRIPT_FILE, script.encode("utf-8"))
+        else:
+            os.makedirs(public_dir, exist_ok=True)
+            with open(os.path.join(public_dir, NAVIGATION_SCRIPT_FILE), 'w') as f:
+                f.write(script)
+
+    # Archives precompress each member as it is added
+    if args.precompress and not archive:
+        logging.info("Precompressing outputs...")
+        precompress_tree(public_dir, args.compress_min_size,
+                         skips_path=os.path.join(state_dir, PRECOMPRESS_SKIPS_FILE))
+
+    if links is not None:
+        links.close()
+    if args.shard:
+        os.makedirs(public_dir, exist_ok=True)
+        write_shard_manifest(public_dir, index, count, plan_digest(groups),
+                             sum(len(group) for group in groups), pages)
+
+    report.log_summary()
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    if args.command == "serve":
+        if args.live:
+            serve_live(CONTENT_DIR, TEMPLATE_PATH, STATIC_DIR, args.host, args.port,
+                       args.page_cache_mb * 1024 * 1024, metrics=args.metrics)
+        elif args.on_demand:
+            serve_on_demand(CONTENT_DIR, TEMPLATE_PATH, STATIC_DIR, args.host, args.port,
+                            args.page_cache_mb * 1024 * 1024, metrics=args.metrics)
+        elif args.from_archive:
+            serve_archive(args.from_archive, args.host, args.port, metrics=args.metrics)
+        else:
+            serve(args.dir, args.host, args.port, metrics=args.metrics)
+        return
+
+    if args.command == "daemon":
+        state_dir = args.state_dir or os.path.join(PROJECT_DIR, ".cache")
+        builder = Builder(CONTENT_DIR, TEMPLATE_PATH, STATIC_DIR, PUBLIC_DIR, state_dir,
+                          args.minify, args.fingerprint, args.precompress, args.critical_css, args.prefetch,
+                          args.service_worker, args.page_data)
+        if args.metrics_port is not None:
+            start_metrics_server("127.0.0.1", args.metrics_port)
+        run_daemon(builder, args.socket or os.path.join(state_dir, SOCKET_NAME))
+        return
+
+    if args.command == "deploy":
+        access_key = os.environ.get("AWS_ACCESS_KEY_ID")
+        secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
+        if not access_key or not secret_key:
+            logging.error("Deploy needs AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY in the environment")
+            sys.exit(1)
+        client = S3Client(args.endpoint or f"https://s3.{args.region}.amazonaws.com", args.bucket,
+                          access_key, secret_key, args.region, os.environ.get("AWS_SESSION_TOKEN"))
+        state_dir = args.state_dir or os.path.join(PROJECT_DIR, ".cache")
+        cache = FingerprintCache(os.path.join(state_dir, DEPLOY_HASHES_FILE))
+        prefix = args.prefix.strip("/") + "/" if args.prefix.strip("/") else ""
+        try:
+            summary = deploy(client, args.dir, prefix, args.concurrency, cache, args.dry_run)
+        except (S3Error, OSError) as e:
+            logging.error(f"Deploy failed: {e}")
+            sys.exit(1)
+        finally:
+            cache.save()
+        logging.info(f"Deploy: {summary['uploaded']} uploaded ({summary['bytes']} bytes), "
+                     f"{summary['deleted']} deleted, {summary['unchanged']} unchanged")
+        return
+
+    if args.command == "merge":
+        staging = new_generation(args.out)
+        try:
+            summary = merge_shards(args.shard_dirs, staging, args.site_url)
+        except ValueError as e:
+            discard(staging)
+            logging.error(f"Merge failed: {e}")
+            sys.exit(1)
+        if args.precompress:
+            precompress_tree(staging, args.compress_min_size)
+        publish(staging, args.out)
+        remove_in_background(stale_generations(args.out))
+        logging.info(f"Merged {summary['shards']} shards: {summary['files']} files, {summary['pages']} pages indexed")
+        return
+
+    build(args)
 
     # Create a text node with a link type
     node = TextNode("Click me!", TextType.LINK, "https://www.boot.dev")
@@ -101,39 +101,64 @@ def ordered_list_to_html_node(block):
     children = [list_item_to_html_node(item) for item in items]
     return ParentNode("ol", children)
 
-def markdown_to_blocks(markdown):
-    """Split a markdown string into a list of block strings."""
-    blocks = []
+def _join_block(lines):
+    """Return [block] for the given lines, or [] if they are blank."""
+    block = "\n".join(lines)
+    return [block] if block.strip() else []
+
+def iter_blocks(lines):
+    """Group an iterable of lines (without newlines) into block strings, lazily.
+
+    Only the lines of the current block are held, so a source can be
+    streamed through without reading it whole.
+    """
     current_block = []
     in_code_block = False
     
-    for line in markdown.split("\n"):
+    for line in lines:
         if line.startswith("```"):
             if in_code_block:
                 # End of code block
                 current_block.append(line)
-                blocks.append("\n".join(current_block))
+                yield from _join_block(current_block)
                 current_block = []
                 in_code_block = False
             else:
                 # Start of code block
-                if current_block:
-                    blocks.append("\n".join(current_block))
+                yield from _join_block(current_block)
                 current_block = [line]
                 in_code_block = True
         elif in_code_block:
             current_block.append(line)
         elif line == "":
-            if current_block:
-                blocks.append("\n".join(current_block))
-                current_block = []
+            yield from _join_block(current_block)
+            current_block = []
         else:
             current_block.append(line)
     
-    if current_block:
-        blocks.append("\n".join(current_block))
-    
-    return [block for block in blocks if block.strip()]
+    yield from _join_block(current_block)
+
+def markdown_to_blocks(markdown):
+    """Split a markdown string into a list of block strings.
+
+    CRLF line endings are read like LF, as largefile.iter_lines does.
+    """
+    return list(iter_blocks(line.removesuffix("\r") for line in markdown.split("\n")))
+
+def block_to_html_node(block):
+    """Convert a single block string to an HTMLNode."""
+    if block.startswith("#"):
+        return heading_to_html_node(block)
+    elif block.startswith("```"):
+        return code_to_html_node(block)
+    elif block.startswith(">"):
+        return quote_to_html_node(block)
+    elif block.startswith("* "):
+        return unordered_list_to_html_node(block)
+    elif block.startswith("1. "):
+        return ordered_list_to_html_node(block)
+    else:
+        return paragraph_to_html_node(block)
 
 def markdown_to_html_node(markdown):
     """Convert a markdown string to an HTML node."""
@@ -141,20 +166,7 @@ def markdown_to_html_node(markdown):
         return HTMLNode(tag="div", value=None, children=[], props=None)
         
     blocks = markdown_to_blocks(markdown)
-    children = []
-    for block in blocks:
-        if block.startswith("#"):
-            children.append(heading_to_html_node(block))
-        elif block.startswith("```"):
-            children.append(code_to_html_node(block))
-        elif block.startswith(">"):
-            children.append(quote_to_html_node(block))
-        elif block.startswith("* "):
-            children.append(unordered_list_to_html_node(block))
-        elif block.startswith("1. "):
-            children.append(ordered_list_to_html_node(block))
-        else:
-            children.append(paragraph_to_html_node(block))
+    children = [block_to_html_node(block) for block in blocks]
     return ParentNode("div", children)
 
 def extract_title(markdown):
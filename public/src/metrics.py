@@ -0,0 +1,209 @@
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        if not items and not self.labels:
+            # An unlabeled series exists from the start, so rate() and absent() see it
+            items = [((), 0)]
+        for key, value in items:
+            yield self.name, _format_labels(self.labels, key), value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # label values -> [bucket counts..., sum, count]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, list(state)) for key, state in self.values.items())
+        for key, state in items:
+            for bound, count in zip(self.buckets, state):
+                labels = _format_labels(self.labels + ("le",), key + (_format_value(float(bound)),))
+                yield f"{self.name}_bucket", labels, count
+            yield f"{self.name}_sum", _format_labels(self.labels, key), state[-2]
+            yield f"{self.name}_count", _format_labels(self.labels, key), state[-1]
+
+
+class Gauge:
+    """A gauge whose value is read from a callback at scrape time."""
+
+    type = "gauge"
+
+    def __init__(self, name, help, callback):
+        self.name = name
+        self.help = help
+        self.callback = callback
+
+    def samples(self):
+        value = self.callback()
+        if value is not None:
+            yield self.name, "", value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, callback):
+        return self.register(Gauge(name, help, callback))
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def resident_memory_bytes() -> int | None:
+    """Current RSS, from /proc where available."""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def max_resident_memory_bytes() -> int:
+    """Peak RSS (high-water mark) of this process.
+
+    ru_maxrss is sampled by the kernel and can trail the current RSS, so
+    the peak is never reported below it.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    if sys.platform != "darwin":
+        peak *= 1024
+    return max(peak, resident_memory_bytes() or 0)
+
+
+REGISTRY = Registry()
+
+PAGES_BUILT = REGISTRY.counter("ssg_pages_built_total", "Pages rendered and written.")
+CACHE_HITS = REGISTRY.counter("ssg_cache_hits_total", "Cache lookups that found a valid entry.", ("cache",))
+CACHE_MISSES = REGISTRY.counter("ssg_cache_misses_total", "Cache lookups that did not.", ("cache",))
+STAGE_SECONDS = REGISTRY.histogram(
+    "ssg_stage_duration_seconds", "Time spent per page in each build stage.", ("stage",)
+)
+HTTP_REQUESTS = REGISTRY.counter("ssg_http_requests_total", "HTTP requests served.", ("method", "code"))
+HTTP_SECONDS = REGISTRY.histogram("ssg_http_request_duration_seconds", "HTTP request latency.", ("method",))
+REGISTRY.gauge("process_resident_memory_bytes", "Resident memory size in bytes.", resident_memory_bytes)
+REGISTRY.gauge(
+    "process_max_resident_memory_bytes", "Peak resident memory size in bytes.", max_resident_memory_bytes
+)
+_STARTED = time.time()
+REGISTRY.gauge("process_start_time_seconds", "Start time of the process since the epoch.", lambda: _STARTED)
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Answer every GET with the registry in the text exposition format."""
+
+    def do_GET(self):
+        data = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+
+def start_metrics_server(host: str, port: int) -> ThreadingHTTPServer:
+    """Serve the registry on a background thread, for processes without an HTTP server."""
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Metrics available at http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,85 @@
+import re
+
+# Elements whose text content must be kept byte-for-byte
+PRESERVE_TAGS = ("pre", "code", "textarea", "script", "style")
+
+# Block-level elements: whitespace next to their tags never renders
+BLOCK_TAGS = (
+    "html", "head", "body", "title", "meta", "link", "script", "style",
+    "article", "section", "header", "footer", "nav", "main", "aside", "div",
+    "p", "ul", "ol", "li", "dl", "dt", "dd", "blockquote", "pre", "hr",
+    "h1", "h2", "h3", "h4", "h5", "h6", "table", "thead", "tbody", "tr",
+    "th", "td", "figure", "figcaption", "form", "noscript",
+)
+
+WHITESPACE = re.compile(r"\s+")
+COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+PRESERVED_BLOCK = re.compile(
+    r"<(%s)\b[^>]*>.*?</\1\s*>" % "|".join(PRESERVE_TAGS), re.DOTALL | re.IGNORECASE
+)
+PRESERVED_STANDIN = re.compile(r"<\w+\0(\d+)>")
+_BLOCK = "|".join(BLOCK_TAGS)
+SPACE_BEFORE_BLOCK_TAG = re.compile(r" (?=<(?:/?(?:%s)\b|!))" % _BLOCK, re.IGNORECASE)
+SPACE_AFTER_BLOCK_TAG = re.compile(r"(<(?:/?(?:%s)\b[^>]*|![^>]*)>) " % _BLOCK, re.IGNORECASE)
+
+
+def _collapse(text: str) -> str:
+    text = WHITESPACE.sub(" ", text)
+    text = SPACE_AFTER_BLOCK_TAG.sub(r"\1", text)
+    return SPACE_BEFORE_BLOCK_TAG.sub("", text)
+
+
+def minify_template(html: str) -> str:
+    """Minify raw template HTML once, at template compile time.
+
+    Comments are removed, whitespace runs collapse to a single space and
+    whitespace next to block-level tags is dropped. The contents of
+    <pre>, <code>, <textarea>, <script> and <style> are left untouched.
+    """
+    html = COMMENT.sub("", html)
+    # Swap preserved elements for stand-in tags of the same name so the
+    # whitespace rules around them still apply, then swap them back
+    preserved = []
+
+    def stash(match):
+        preserved.append(match.group(0))
+        return f"<{match.group(1)}\0{len(preserved) - 1}>"
+
+    html = _collapse(PRESERVED_BLOCK.sub(stash, html)).strip()
+    return PRESERVED_STANDIN.sub(lambda m: preserved[int(m.group(1))], html)
+
+
+class StreamMinifier:
+    """Collapse insignificant whitespace in a stream of HTML chunks.
+
+    Works on the chunks yielded by HTMLNode.iter_html, where each tag is
+    its own chunk: tag chunks update the count of open preserved elements
+    and text chunks outside of them have whitespace runs collapsed. The
+    final HTML is never re-parsed.
+    """
+
+    def __init__(self):
+        self.preserve_depth = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @property
+    def saved(self) -> int:
+        return self.bytes_in - self.bytes_out
+
+    def feed(self, chunk: str) -> str:
+        self.bytes_in += len(chunk)
+        if chunk.startswith("<") and chunk.endswith(">"):
+            name = chunk[2:] if chunk.startswith("</") else chunk[1:]
+            name = name.split(None, 1)[0].rstrip(">").lower() if name else ""
+            if name in PRESERVE_TAGS:
+                self.preserve_depth += -1 if chunk.startswith("</") else 1
+        elif not self.preserve_depth:
+            chunk = WHITESPACE.sub(" ", chunk)
+        self.bytes_out += len(chunk)
+        return chunk
+
+    def minify(self, chunks):
+        """Yield the minified version of each chunk."""
+        for chunk in chunks:
+            yield self.feed(chunk)
@@ -0,0 +1,113 @@
+import json
+from shard import plain_text
+
+# Written next to every page's index.html
+PAGE_DATA_FILE = "page.json"
+
+NAVIGATION_SCRIPT_FILE = "nav.js"
+
+NAVIGATION_SCRIPT_TAG = f'<script src="/{NAVIGATION_SCRIPT_FILE}" defer></script>'
+
+# Marks the element that {{ Content }} rendered, which navigation replaces
+CONTENT_ATTRIBUTE = "data-page-content"
+
+HEADING_TAGS = ("h2", "h3", "h4", "h5", "h6")
+
+# Follows same-site links to other pages by fetching their page.json and
+# swapping the content in place. Anything unexpected (no page.json, another
+# section, whose template output may differ) falls back to a normal load.
+NAVIGATION_SCRIPT = """(function () {
+  "use strict";
+  var SELECTOR = "[%(attribute)s]";
+
+  function sectionOf(path) {
+    return path.split("/")[1] || "";
+  }
+
+  function pageUrl(link) {
+    var url = new URL(link.href, location.href);
+    if (url.origin !== location.origin || link.target || link.hasAttribute("download")) {
+      return null;
+    }
+    var last = url.pathname.split("/").pop();
+    if (last === "index.html") {
+      url.pathname = url.pathname.slice(0, -last.length);
+    } else if (last.indexOf(".") !== -1) {
+      return null;
+    } else if (last) {
+      url.pathname += "/";
+    }
+    return url;
+  }
+
+  function show(url, push) {
+    return fetch(url.pathname + "%(data_file)s").then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      return response.json();
+    }).then(function (data) {
+      var content = document.querySelector(SELECTOR);
+      if (!content || data.section !== sectionOf(location.pathname)) {
+        throw new Error("full load needed");
+      }
+      content.outerHTML = data.content;
+      document.title = data.title;
+      if (push) {
+        history.pushState(null, "", url.href);
+      }
+      var target = url.hash && document.getElementById(decodeURIComponent(url.hash.slice(1)));
+      if (target) {
+        target.scrollIntoView();
+      } else if (push) {
+        window.scrollTo(0, 0);
+      }
+    });
+  }
+
+  document.addEventListener("click", function (event) {
+    var link = event.target.closest && event.target.closest("a[href]");
+    if (!link || event.defaultPrevented || event.button !== 0 ||
+        event.metaKey || event.ctrlKey || event.shiftKey || event.altKey) {
+      return;
+    }
+    var url = pageUrl(link);
+    if (!url || (url.pathname === location.pathname && url.search === location.search)) {
+      return;
+    }
+    event.preventDefault();
+    show(url, true).catch(function () {
+      location.href = url.href;
+    });
+  });
+
+  window.addEventListener("popstate", function () {
+    show(new URL(location.href), false).catch(function () {
+      location.reload();
+    });
+  });
+})();
+"""
+
+
+def table_of_contents(node) -> list[dict]:
+    """List the h2-h6 headings of a page's HTMLNode tree as {"level", "text"}, in document order."""
+    toc = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.tag in HEADING_TAGS:
+            toc.append({"level": int(current.tag[1]), "text": plain_text(current)})
+        elif current.children:
+            stack.extend(reversed(current.children))
+    return toc
+
+
+def format_page_data(title: str, url: str, section: str, content: str, toc: list[dict]) -> bytes:
+    """Encode the JSON the navigation script loads for a page."""
+    data = {"title": title, "url": url, "section": section, "content": content, "toc": toc}
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def format_navigation_script() -> str:
+    return NAVIGATION_SCRIPT % {"attribute": CONTENT_ATTRIBUTE, "data_file": PAGE_DATA_FILE}
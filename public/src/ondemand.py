@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import unquote, urlsplit
+from metrics import CACHE_HITS, CACHE_MISSES, PAGES_BUILT, STAGE_SECONDS
+from largefile import load_page
+from pages import compile_template, source_candidates, url_for, output_path_for
+from server import StaticRequestHandler, StaticServer, run_server
+from template import latest_mtime_ns
+
+DEFAULT_PAGE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class PageCache:
+    """A byte-bounded LRU of rendered pages.
+
+    Each entry carries a validator (source mtime and size plus the template
+    version); a lookup with a different validator is a miss.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_PAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, validator):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == validator:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                CACHE_HITS.inc(cache="page")
+                return entry[1]
+            self.misses += 1
+            CACHE_MISSES.inc(cache="page")
+            return None
+
+    def put(self, key, validator, data: bytes):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.size -= len(old[1])
+            if len(data) > self.max_bytes:
+                return
+            self.entries[key] = (validator, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class OnDemandSite:
+    """Render pages from content_dir when they are first requested.
+
+    Nothing is discovered up front: a request path is mapped back to its
+    markdown source with the same rules the build uses, so the first page
+    is available immediately no matter how large the content tree is.
+    """
+
+    def __init__(self, content_dir: str, template_path: str,
+                 cache_bytes: int = DEFAULT_PAGE_CACHE_BYTES, minify: bool = False):
+        self.content_dir = os.path.abspath(content_dir)
+        self.template_path = template_path
+        self.minify = minify
+        self.cache = PageCache(cache_bytes)
+        self.template = None
+        self.template_mtime_ns = None
+        self.template_lock = threading.Lock()
+
+    def current_template(self):
+        """Return the compiled template, recompiling it when it or a partial changes."""
+        with self.template_lock:
+            mtime_ns = latest_mtime_ns(self.template.files if self.template else [self.template_path])
+            if mtime_ns != self.template_mtime_ns:
+                self.template = compile_template(self.template_path, minify=self.minify,
+                                                 content_dir=self.content_dir)
+                mtime_ns = self.template_mtime_ns = latest_mtime_ns(self.template.files)
+                self.cache.clear()
+            return self.template, mtime_ns
+
+    def find_source(self, url_path: str):
+        """Return (rel_source, stat) of the markdown file behind url_path, or None."""
+        for rel_source in source_candidates(url_path):
+            path = os.path.join(self.content_dir, *rel_source.split("/"))
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if os.path.isfile(path):
+                return rel_source, stat
+        return None
+
+    def get(self, url_path: str):
+        """Return (html bytes, source stat, validator) for url_path, or None."""
+        found = self.find_source(url_path)
+        if found is None:
+            return None
+        rel_source, stat = found
+        template, template_mtime_ns = self.current_template()
+        validator = (stat.st_mtime_ns, stat.st_size, template_mtime_ns)
+        data = self.cache.get(rel_source, validator)
+        if data is None:
+            logging.info(f"Rendering {rel_source} on demand")
+            data = self.render(rel_source, template)
+            self.cache.put(rel_source, validator, data)
+        return data, stat, validator
+
+    def render_page(self, rel_source: str, template):
+        path = os.path.join(self.content_dir, *rel_source.split("/"))
+        return load_page(path, template, base=url_for(output_path_for(rel_source)), minify=self.minify)
+
+    def render(self, rel_source: str, template) -> bytes:
+        """Render one source file to the bytes of its HTML page."""
+        page = self.render_page(rel_source, template)
+        with STAGE_SECONDS.time(stage="render"):
+            data = "".join(page.iter_chunks()).encode("utf-8")
+        PAGES_BUILT.inc()
+        return data
+
+
+class OnDemandRequestHandler(StaticRequestHandler):
+    """Render pages from markdown on request; serve everything else from the static dir."""
+
+    def handle_request(self, send_body: bool):
+        url_path = unquote(urlsplit(self.path).path)
+        site = self.server.site
+        if url_path.endswith(("/", ".html")):
+            page = site.get(url_path)
+            if page is not None:
+                data, stat, validator = page
+                etag = '"%x-%x-%x"' % validator
+                self.send_data(data, "text/html; charset=utf-8", etag, stat.st_mtime, send_body)
+                return
+        elif site.find_source(url_path + "/") is not None:
+            self.redirect_to_directory()
+            return
+        super().handle_request(send_body)
+
+
+class OnDemandServer(StaticServer):
+    def __init__(self, address, site: OnDemandSite, static_dir: str,
+                 handler_class=OnDemandRequestHandler, metrics: bool = False):
+        super().__init__(address, static_dir, handler_class=handler_class, metrics=metrics)
+        self.site = site
+
+
+def serve_on_demand(content_dir, template_path, static_dir, host="127.0.0.1", port=8888,
+                    cache_bytes=DEFAULT_PAGE_CACHE_BYTES, minify=False, metrics=False):
+    """Serve content_dir, rendering each page on first request, until interrupted."""
+    site = OnDemandSite(content_dir, template_path, cache_bytes, minify)
+    server = OnDemandServer((host, port), site, static_dir, metrics=metrics)
+    logging.info(f"Serving {content_dir} on demand at http://{host}:{server.server_address[1]}/")
+    run_server(server)
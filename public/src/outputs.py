@@ -0,0 +1,154 @@
+import hashlib
+import os
+import threading
+from publish import link_siblings
+from state import load_state, save_state
+
+OUTPUT_HASHES_FILE = "output-hashes.json"
+
+
+def hash_path(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OutputWriter:
+    """Writes rendered pages, leaving byte-identical outputs alone.
+
+    A page whose new bytes match the previous build's output keeps that
+    output: it is hardlinked from the previous generation (or, when
+    building in place, not touched), so its mtime and precompressed
+    siblings survive and downstream syncs see it as unchanged.
+
+    Previous outputs are matched by the hashes recorded in hashes_path,
+    trusted only while the file's size and mtime are still the recorded
+    ones; otherwise the previous file is hashed.
+
+    Attributes:
+        written: Number of outputs written
+        unchanged: Number of outputs kept from the previous build
+        hashes: rel_path -> [sha256, size, mtime_ns] of this build's outputs
+    """
+
+    def __init__(self, dest_dir: str, previous_dir: str | None = None, hashes_path: str | None = None,
+                 report=None):
+        self.dest_dir = dest_dir
+        self.previous_dir = previous_dir
+        self.hashes_path = hashes_path
+        self.report = report
+        self.previous_hashes = load_state(hashes_path, {})
+        self.hashes = {}
+        self.written = 0
+        self.unchanged = 0
+        self.lock = threading.Lock()
+
+    def matches_previous(self, rel_path: str, digest: str, size: int) -> str | None:
+        """Return the previous output of rel_path if it has exactly this content."""
+        if not self.previous_dir:
+            return None
+        previous = os.path.join(self.previous_dir, *rel_path.split("/"))
+        try:
+            stat = os.stat(previous)
+        except OSError:
+            return None
+        if stat.st_size != size:
+            return None
+        recorded = self.previous_hashes.get(rel_path)
+        if recorded and recorded[1:] == [stat.st_size, stat.st_mtime_ns]:
+            return previous if recorded[0] == digest else None
+        return previous if hash_path(previous) == digest else None
+
+    def keep_previous(self, previous: str, dest_path: str):
+        if not (os.path.exists(dest_path) and os.path.samefile(previous, dest_path)):
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            if os.path.lexists(dest_path):
+                os.remove(dest_path)
+            os.link(previous, dest_path)
+            link_siblings(previous, dest_path)
+
+    def finish(self, rel_path: str, digest: str, dest_path: str, changed: bool, page: bool = True):
+        stat = os.stat(dest_path)
+        with self.lock:
+            if self.hashes_path:
+                self.hashes[rel_path] = [digest, stat.st_size, stat.st_mtime_ns]
+            if not page:
+                return
+            if changed:
+                self.written += 1
+            else:
+                self.unchanged += 1
+            if self.report:
+                self.report.add("pages written" if changed else "pages unchanged")
+
+    def adopt(self, dest_path: str, digest: str | None = None):
+        """Record the hash of an output already in place, such as a page kept by a resumed build.
+
+        Args:
+            dest_path: The output
+            digest: Its SHA-256, if known; otherwise the file is hashed
+        """
+        if not self.hashes_path:
+            return
+        rel_path = os.path.relpath(dest_path, self.dest_dir).replace(os.sep, "/")
+        stat = os.stat(dest_path)
+        digest = digest or hash_path(dest_path)
+        with self.lock:
+            self.hashes[rel_path] = [digest, stat.st_size, stat.st_mtime_ns]
+
+    def write(self, dest_path: str, data: bytes, page: bool = True) -> bool:
+        """Write data to dest_path unless the previous output is identical.
+
+        Args:
+            dest_path: Path of the output
+            data: Its contents
+            page: Whether the output is a page, which the written and
+                unchanged counts include (page.json files are not)
+
+        Returns:
+            bool: True if the file was written
+        """
+        rel_path = os.path.relpath(dest_path, self.dest_dir).replace(os.sep, "/")
+        digest = hashlib.sha256(data).hexdigest()
+        previous = self.matches_previous(rel_path, digest, len(data))
+        if previous:
+            self.keep_previous(previous, dest_path)
+        else:
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            # A new inode: the old file may be hardlinked into other generations
+            tmp_path = f"{dest_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, dest_path)
+        self.finish(rel_path, digest, dest_path, previous is None, page)
+        return previous is None
+
+    def stream(self, dest_path: str, chunks) -> bool:
+        """Like write, for text chunks too large to hold: they go to a temporary file first."""
+        rel_path = os.path.relpath(dest_path, self.dest_dir).replace(os.sep, "/")
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tmp_path = f"{dest_path}.tmp"
+        digest = hashlib.sha256()
+        size = 0
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                digest.update(data)
+                size += len(data)
+                f.write(data)
+        digest = digest.hexdigest()
+        previous = self.matches_previous(rel_path, digest, size)
+        if previous:
+            os.remove(tmp_path)
+            self.keep_previous(previous, dest_path)
+        else:
+            os.replace(tmp_path, dest_path)
+        self.finish(rel_path, digest, dest_path, previous is None)
+        return previous is None
+
+    def save(self):
+        if not self.hashes_path:
+            return
+        save_state(self.hashes_path, self.hashes)
@@ -0,0 +1,275 @@
+import os
+import posixpath
+from assets import collect_references
+from critical import inline_stylesheets
+from fingerprint import rewrite_references, rewrite_template
+from images import size_images
+from navigation import CONTENT_ATTRIBUTE, NAVIGATION_SCRIPT_TAG, PAGE_DATA_FILE, format_page_data, table_of_contents
+from prefetch import REGISTER_SERVICE_WORKER, add_head_tags, prefetch_links, prefetch_urls
+from markdown import markdown_to_html_node, extract_title
+from metrics import PAGES_BUILT, STAGE_SECONDS
+from minify import StreamMinifier
+from template import load_template
+
+# Directory under the state directory that compiled templates are cached in
+TEMPLATE_CACHE_DIR = "templates"
+
+
+def output_path_for(rel_source: str) -> str:
+    """Map a content-relative markdown path to its output path.
+
+    index.md becomes index.html and any other foo.md becomes foo/index.html,
+    so every page is served from a directory URL.
+    """
+    directory, file_name = posixpath.split(rel_source.replace("\\", "/"))
+    if file_name == "index.md":
+        return posixpath.join(directory, "index.html")
+    return posixpath.join(directory, posixpath.splitext(file_name)[0], "index.html")
+
+
+def url_for(rel_output: str) -> str:
+    """Return the URL a page is served at: "a/b/index.html" -> "/a/b/"."""
+    directory = posixpath.dirname(rel_output)
+    return "/" if not directory else f"/{directory}/"
+
+
+def source_candidates(url_path: str) -> list[str]:
+    """Return the content-relative markdown paths that could produce url_path.
+
+    This is the inverse of output_path_for: "/a/b/" (or "/a/b/index.html")
+    may come from "a/b/index.md" or "a/b.md".
+    """
+    path = posixpath.normpath("/" + url_path).lstrip("/")
+    if path.endswith("index.html"):
+        path = posixpath.dirname(path)
+    elif path.endswith(".html"):
+        return []
+    if path in ("", "."):
+        return ["index.md"]
+    return [posixpath.join(path, "index.md"), f"{path}.md"]
+
+
+def section_for(url: str) -> str:
+    """Return the top-level section of a page URL: "/blog/post/" -> "blog", "/" -> ""."""
+    return url.strip("/").split("/", 1)[0]
+
+
+def template_values(title, url: str, content, critical: str = "", prefetch: str = "") -> dict:
+    """The values every page passes to the template."""
+    return {
+        "Title": title,
+        "Content": content,
+        "Url": url,
+        "Section": section_for(url),
+        "CriticalCSS": critical,
+        "Prefetch": prefetch,
+    }
+
+
+def read_title(path: str) -> str | None:
+    """Return the text of a markdown file's first h1, reading only up to it."""
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip().startswith('# '):
+                return line.strip().removeprefix('# ').strip()
+    return None
+
+
+def site_pages(content_dir: str) -> list[dict]:
+    """List every page as {"title", "url", "section"}, sorted by URL, for listings and navigation."""
+    pages = []
+    for root, _, files in os.walk(content_dir):
+        for file_name in files:
+            if file_name.endswith(".md"):
+                path = os.path.join(root, file_name)
+                url = url_for(output_path_for(os.path.relpath(path, content_dir).replace(os.sep, "/")))
+                pages.append({"title": read_title(path) or url, "url": url, "section": section_for(url)})
+    pages.sort(key=lambda page: page["url"])
+    return pages
+
+
+def compile_template(template_path, manifest=None, minify=False, cache_dir=None, content_dir=None,
+                     critical_css=None, images=None, prefetch=0, service_worker=False, page_data=False):
+    """Compile the template once per build, rewriting its asset references.
+
+    Args:
+        cache_dir (str | None): Directory for compiled template code and
+            parsed stylesheets
+        content_dir (str | None): When given and the template reads Pages,
+            the site_pages listing is bound to the template
+        critical_css (str | None): Static directory; when given, the
+            stylesheets the template links from it load asynchronously and
+            each page inlines the rules that may apply to it
+        images (dict | None): Image dimensions from ImageSizes.scan; when
+            given, pages' <img> elements get width, height and lazy loading
+        prefetch (int): Prefetch up to this many of the pages each page
+            links to, with <link rel="prefetch"> before </head>
+        service_worker (bool): Register the service worker (see
+            prefetch.format_service_worker) before </head>
+        page_data (bool): Load the navigation script before </head>, and
+            have pages keep their rendered content for write_page_data
+    """
+    critical = []
+
+    def transform(text):
+        if critical_css:
+            text, stylesheets = inline_stylesheets(text, critical_css, cache_dir)
+            critical.append(stylesheets)
+        tags = "{{ Prefetch }}" if prefetch else ""
+        if service_worker:
+            tags += REGISTER_SERVICE_WORKER
+        if page_data:
+            tags += NAVIGATION_SCRIPT_TAG
+        text = add_head_tags(text, tags)
+        if manifest:
+            text = rewrite_template(text, manifest)
+        return text
+
+    template = load_template(template_path, minify, transform, cache_dir)
+    template.critical = critical[0] if critical else None
+    template.images = images
+    template.prefetch = prefetch
+    template.page_data = page_data
+    if content_dir and "Pages" in template.names:
+        template.bind("Pages", site_pages(content_dir))
+    return template
+
+
+class RenderedPage:
+    """A page rendered from markdown, ready to be streamed through a template.
+
+    Attributes:
+        title: The text of the page's h1
+        html_node: The page's HTMLNode tree, with asset URLs rewritten
+        references: The src/href URLs the page referenced before rewriting
+        minifier: The StreamMinifier used while streaming, if any
+        content: The chunks {{ Content }} rendered to, once iter_chunks has
+            run, when the template has page_data set; otherwise None
+    """
+
+    def __init__(self, title, html_node, references, template, minify=False, url="/"):
+        self.title = title
+        self.url = url
+        self.html_node = html_node
+        self.references = references
+        self.template = template
+        self.minifier = StreamMinifier() if minify else None
+        self.content = None
+
+    def iter_chunks(self):
+        """Yield the full page: template segments with the content streamed in."""
+        chunks = self.html_node.iter_html()
+        if self.minifier:
+            chunks = self.minifier.minify(chunks)
+        if self.template.page_data:
+            self.content = []
+            chunks = self.keep_content(chunks)
+        critical = self.template.critical.style_for(self.html_node) if self.template.critical else ""
+        prefetch = ""
+        if self.template.prefetch:
+            prefetch = prefetch_links(prefetch_urls(self.references, self.url, self.template.prefetch))
+        return self.template.render(template_values(self.title, self.url, chunks, critical, prefetch))
+
+    def keep_content(self, chunks):
+        for chunk in chunks:
+            self.content.append(chunk)
+            yield chunk
+
+    @property
+    def saved(self) -> int:
+        """Bytes saved by minification of the template and the content."""
+        if not self.minifier:
+            return 0
+        return self.minifier.saved + self.template.saved
+
+
+def render_page(markdown_content, template, manifest=None, base="/", minify=False) -> RenderedPage:
+    """Parse markdown and prepare it for rendering through a compiled template.
+
+    Args:
+        markdown_content (str): The page's markdown source
+        template (Template): The compiled template
+        manifest (dict[str, str] | None): Fingerprint manifest for asset URLs
+        base (str): URL path of the directory the page is served from
+        minify (bool): Collapse insignificant whitespace in the content
+    """
+    with STAGE_SECONDS.time(stage="parse"):
+        html_node = markdown_to_html_node(markdown_content)
+        if template.page_data:
+            html_node.props = {**(html_node.props or {}), CONTENT_ATTRIBUTE: ""}
+        references = collect_references(html_node)
+        if template.images is not None:
+            size_images(html_node, template.images, base)
+        if manifest:
+            rewrite_references(html_node, manifest, base)
+        title = extract_title(markdown_content)
+    return RenderedPage(title, html_node, references, template, minify, base)
+
+
+def render_html(page: RenderedPage) -> str:
+    """Render a page to the full text of its HTML file."""
+    with STAGE_SECONDS.time(stage="render"):
+        return "".join(page.iter_chunks())
+
+
+def write_html(html: str, dest_path: str, writer=None):
+    """Write a rendered page to dest_path, creating its directory.
+
+    With an OutputWriter, the write is skipped when the previous build's
+    output is byte-identical.
+    """
+    with STAGE_SECONDS.time(stage="write"):
+        if writer:
+            writer.write(dest_path, html.encode("utf-8"))
+        else:
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            with open(dest_path, 'w') as f:
+                f.write(html)
+    PAGES_BUILT.inc()
+
+
+def stream_page(page, dest_path: str, writer=None):
+    """Write a page's chunks to dest_path as they are produced.
+
+    Used for pages too large to render into one string; parsing, rendering
+    and writing interleave, so they are timed together as one stage.
+    """
+    with STAGE_SECONDS.time(stage="stream"):
+        if writer:
+            writer.stream(dest_path, page.iter_chunks())
+        else:
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            with open(dest_path, 'w') as f:
+                for chunk in page.iter_chunks():
+                    f.write(chunk)
+    PAGES_BUILT.inc()
+
+
+def write_page(page: RenderedPage, dest_path: str, writer=None):
+    """Render a page and write it to dest_path (through writer, if given)."""
+    write_html(render_html(page), dest_path, writer)
+    write_page_data(render_page_data(page), dest_path, writer)
+
+
+def render_page_data(page) -> bytes | None:
+    """Return the page.json of a page that has been rendered, or None when it kept no content.
+
+    The content is the HTML the render pass already produced for
+    {{ Content }}, so nothing is parsed or rendered twice.
+    """
+    if page.content is None:
+        return None
+    return format_page_data(page.title, page.url, section_for(page.url), "".join(page.content),
+                            table_of_contents(page.html_node))
+
+
+def write_page_data(data: bytes | None, dest_path: str, writer=None):
+    """Write page data next to the page at dest_path; None writes nothing."""
+    if data is None:
+        return
+    data_path = os.path.join(os.path.dirname(dest_path), PAGE_DATA_FILE)
+    if writer:
+        writer.write(data_path, data, page=False)
+    else:
+        with open(data_path, 'wb') as f:
+            f.write(data)
@@ -0,0 +1,125 @@
+import queue
+import threading
+
+DEFAULT_DEPTH = 16
+DEFAULT_READERS = 4
+DEFAULT_WRITERS = 4
+
+# Poll interval for blocked stages to notice that another stage failed
+STOP_CHECK_INTERVAL = 0.1
+
+_DONE = object()
+
+
+def run_pipeline(items, read, process, write, depth: int = DEFAULT_DEPTH,
+                 readers: int = DEFAULT_READERS, writers: int = DEFAULT_WRITERS) -> int:
+    """Run read -> process -> write over items, overlapping I/O with CPU work.
+
+    read(item) runs on reader threads and write(item, result) on writer
+    threads, so slow storage is waited on concurrently while
+    process(item, data) runs on the calling thread. The queues between the
+    stages hold at most depth entries each: when the writers fall behind,
+    processing blocks, and then reading does, so no more than about
+    2 * depth + readers + writers + 1 items are ever in memory.
+
+    Args:
+        items: Iterable of work items; it is consumed lazily
+        read: Called with an item, returns its input data
+        process: Called with an item and its data, returns what to write
+        write: Called with an item and the result of process
+        depth: Capacity of each queue between stages
+        readers: Number of reader threads
+        writers: Number of writer threads
+
+    Returns:
+        int: Number of items written
+
+    Raises:
+        Exception: The first exception raised by any stage, after all
+            threads have stopped. A KeyboardInterrupt or other
+            BaseException from process stops the threads too, and is
+            raised as is.
+    """
+    iterator = iter(items)
+    iterator_lock = threading.Lock()
+    read_queue = queue.Queue(depth)
+    write_queue = queue.Queue(depth)
+    stop = threading.Event()
+    errors = []
+    written = [0]
+    written_lock = threading.Lock()
+
+    def fail(error):
+        errors.append(error)
+        stop.set()
+
+    def put(target, entry):
+        while not stop.is_set():
+            try:
+                target.put(entry, timeout=STOP_CHECK_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def reader():
+        try:
+            while not stop.is_set():
+                with iterator_lock:
+                    item = next(iterator, _DONE)
+                if item is _DONE:
+                    break
+                put(read_queue, (item, read(item)))
+        except Exception as e:
+            fail(e)
+        finally:
+            put(read_queue, _DONE)
+
+    def writer():
+        while True:
+            entry = write_queue.get()
+            if entry is _DONE:
+                return
+            if stop.is_set():
+                continue
+            try:
+                write(*entry)
+                with written_lock:
+                    written[0] += 1
+            except Exception as e:
+                fail(e)
+
+    reader_threads = [threading.Thread(target=reader, daemon=True) for _ in range(max(1, readers))]
+    writer_threads = [threading.Thread(target=writer, daemon=True) for _ in range(max(1, writers))]
+    for thread in reader_threads + writer_threads:
+        thread.start()
+
+    completed = False
+    try:
+        finished = 0
+        while finished < len(reader_threads) and not stop.is_set():
+            try:
+                entry = read_queue.get(timeout=STOP_CHECK_INTERVAL)
+            except queue.Empty:
+                continue
+            if entry is _DONE:
+                finished += 1
+                continue
+            item, data = entry
+            result = process(item, data)
+            write_queue.put((item, result))
+        completed = True
+    except Exception as e:
+        fail(e)
+    finally:
+        if not completed:
+            # Readers blocked in put() only give up once stop is set
+            stop.set()
+        # Writers drain (or discard, after a failure) what is queued, then exit
+        for _ in writer_threads:
+            write_queue.put(_DONE)
+        for thread in writer_threads + reader_threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return written[0]
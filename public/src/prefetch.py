@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+from html import escape
+from urllib.parse import unquote, urlsplit
+from assets import extract_template_references, resolve_reference
+from fingerprint import rewrite_url
+
+PRECACHE_MANIFEST_FILE = "precache-manifest.json"
+SERVICE_WORKER_FILE = "sw.js"
+
+HEAD_END = re.compile(r"</head\s*>", re.IGNORECASE)
+
+REGISTER_SERVICE_WORKER = (
+    '<script>if ("serviceWorker" in navigator) navigator.serviceWorker.register("/' + SERVICE_WORKER_FILE
+    + '");</script>'
+)
+
+# The version changes whenever a precached asset does, which makes browsers
+# install the new worker; it then caches the new assets and drops old caches.
+SERVICE_WORKER = """const VERSION = %(version)s;
+const CACHE = "precache-" + VERSION;
+
+self.addEventListener("install", (event) => {
+  event.waitUntil(
+    fetch("/%(manifest)s?v=" + VERSION)
+      .then((response) => response.json())
+      .then((manifest) => caches.open(CACHE).then((cache) => cache.addAll(manifest.assets.map((asset) => asset.url))))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then((names) => Promise.all(names.filter((name) => name.startsWith("precache-") && name !== CACHE)
+        .map((name) => caches.delete(name))))
+      .then(() => self.clients.claim())
+  );
+});
+
+// Precached assets are served from the cache; everything else goes to the network.
+self.addEventListener("fetch", (event) => {
+  if (event.request.method !== "GET") {
+    return;
+  }
+  event.respondWith(
+    caches.open(CACHE)
+      .then((cache) => cache.match(event.request, { ignoreSearch: true }))
+      .then((cached) => cached || fetch(event.request))
+  );
+});
+"""
+
+
+def page_url(url: str, base: str = "/") -> str | None:
+    """Return the directory URL of the page url points at, or None for assets and other sites.
+
+    Pages are served from directory URLs, so "/blog/post", "post/" and
+    "/blog/post/index.html" all become "/blog/post/".
+    """
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    path = unquote(parts.path)
+    if not path.startswith("/"):
+        path = posixpath.join(base, path)
+    path = posixpath.normpath(path)
+    if posixpath.basename(path) == "index.html":
+        path = posixpath.dirname(path)
+    elif posixpath.splitext(path)[1]:
+        return None
+    return path.rstrip("/") + "/"
+
+
+def prefetch_urls(references, base: str, limit: int) -> list[str]:
+    """Pick the pages a page is most likely to be left for: its first distinct internal page links.
+
+    Args:
+        references: src/href values of the page, in document order, as
+            written (see collect_references)
+        base: URL of the page itself, which is never prefetched
+        limit: Most URLs to return
+    """
+    urls = []
+    for reference in references:
+        if len(urls) >= limit:
+            break
+        url = page_url(reference, base)
+        if url and url != base and url not in urls:
+            urls.append(url)
+    return urls
+
+
+def prefetch_links(urls) -> str:
+    return "".join(f'<link rel="prefetch" href="{escape(url)}">' for url in urls)
+
+
+def add_head_tags(template: str, tags: str) -> str:
+    """Insert tags (e.g. {{ Prefetch }} or REGISTER_SERVICE_WORKER) before </head>."""
+    if not tags:
+        return template
+    match = HEAD_END.search(template)
+    if not match:
+        return template
+    return template[:match.start()] + tags + template[match.start():]
+
+
+def precache_manifest(template_paths, static_dir: str, fingerprints, manifest: dict | None = None) -> dict:
+    """List the static files the template references (the shell every page loads) with their hashes.
+
+    Args:
+        template_paths: The template file and its partials
+        static_dir: Path to the static directory
+        fingerprints: FingerprintCache that supplies content hashes
+        manifest: Fingerprint manifest; listed assets are precached under
+            their fingerprinted URL
+
+    Returns:
+        dict: {"version": hash of the asset list, "assets": [{"url", "revision"}]}
+    """
+    assets = []
+    seen = set()
+    for template_path in template_paths:
+        with open(template_path, 'r') as f:
+            references = extract_template_references(f.read())
+        for reference in references:
+            rel_path = resolve_reference(reference)
+            path = rel_path and os.path.join(static_dir, *rel_path.split("/"))
+            if not path or rel_path in seen or not os.path.isfile(path):
+                continue
+            seen.add(rel_path)
+            url = rewrite_url("/" + rel_path, manifest) if manifest else "/" + rel_path
+            assets.append({"url": url, "revision": fingerprints.digest(path)[:16]})
+    assets.sort(key=lambda asset: asset["url"])
+    version = hashlib.sha256(json.dumps(assets, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return {"version": version, "assets": assets}
+
+
+def format_precache_manifest(precache: dict) -> str:
+    return json.dumps(precache, indent=2)
+
+
+def format_service_worker(precache: dict) -> str:
+    return SERVICE_WORKER % {"version": json.dumps(precache["version"]), "manifest": PRECACHE_MANIFEST_FILE}
@@ -0,0 +1,130 @@
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+from compress import SIBLING_EXTENSIONS
+
+# Generations kept after a publish: the live one and the one before it,
+# which requests that started before the swap may still be reading
+KEEP_GENERATIONS = 2
+
+
+def generations_dir(public_dir: str) -> str:
+    """Directory holding every generation of public_dir, next to it: .public-generations."""
+    parent, name = os.path.split(os.path.abspath(public_dir))
+    return os.path.join(parent, f".{name}-generations")
+
+
+def current_generation(public_dir: str) -> str | None:
+    """Return the directory public_dir currently serves from, or None if there is none."""
+    if not os.path.exists(public_dir):
+        return None
+    return os.path.realpath(public_dir)
+
+
+def new_generation(public_dir: str) -> str:
+    """Create an empty staging directory for the next build of public_dir."""
+    root = generations_dir(public_dir)
+    os.makedirs(root, exist_ok=True)
+    # Names sort by creation time: 20250101-120000.123456789-<pid>
+    name = time.strftime("%Y%m%d-%H%M%S") + f".{time.time_ns() % 1_000_000_000:09d}-{os.getpid()}"
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    return path
+
+
+def publish(staging_dir: str, public_dir: str):
+    """Make public_dir point at staging_dir in one atomic step.
+
+    public_dir is a symlink into the generations directory, replaced with
+    os.replace, so readers see either the old site or the new one and
+    never a missing or partial one. A public_dir left over from before
+    staged builds (a real directory) is first moved into the generations
+    directory; that first switch has a brief gap.
+    """
+    public_dir = os.path.abspath(public_dir)
+    parent = os.path.dirname(public_dir)
+    if os.path.isdir(public_dir) and not os.path.islink(public_dir):
+        legacy = os.path.join(generations_dir(public_dir), time.strftime("%Y%m%d-%H%M%S") + "-legacy")
+        logging.info(f"Moving existing directory {public_dir} to {legacy}")
+        os.rename(public_dir, legacy)
+    link = f"{public_dir}.swap"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.relpath(staging_dir, parent), link)
+    os.replace(link, public_dir)
+    logging.info(f"Published {staging_dir}")
+
+
+def stale_generations(public_dir: str, keep: int = KEEP_GENERATIONS) -> list[str]:
+    """Return generations other than the live one and the newest ones kept for in-flight readers.
+
+    The live generation is compared by real path, so it is never returned,
+    even when it is not among the newest (e.g. behind a failed build kept
+    for --resume) or the project is reached through a symlink.
+    """
+    root = generations_dir(public_dir)
+    if not os.path.isdir(root):
+        return []
+    live = current_generation(public_dir)
+    paths = [os.path.join(root, name) for name in sorted(os.listdir(root))]
+    kept = set(paths[-keep:]) if keep else set()
+    return [path for path in paths if os.path.realpath(path) != live and path not in kept]
+
+
+def link_unchanged(src_path: str, dest_path: str, previous_path: str) -> bool:
+    """Hardlink previous_path to dest_path if it is an unchanged copy of src_path.
+
+    Copies made with shutil.copy2 keep the source mtime, so a previous copy
+    with the same size and mtime is taken as unchanged. Precompressed
+    siblings of the previous copy that are still up to date are linked too.
+
+    Returns:
+        bool: True if dest_path was linked, False if it still needs copying
+    """
+    try:
+        source = os.stat(src_path)
+        previous = os.stat(previous_path)
+    except OSError:
+        return False
+    if (source.st_size, source.st_mtime_ns) != (previous.st_size, previous.st_mtime_ns):
+        return False
+    try:
+        os.link(previous_path, dest_path)
+    except OSError:
+        return False
+    link_siblings(previous_path, dest_path)
+    return True
+
+
+def link_siblings(previous_path: str, dest_path: str):
+    """Hardlink the precompressed siblings of previous_path that are still up to date."""
+    mtime_ns = os.stat(previous_path).st_mtime_ns
+    for ext in SIBLING_EXTENSIONS:
+        try:
+            if os.stat(previous_path + ext).st_mtime_ns == mtime_ns:
+                if os.path.lexists(dest_path + ext):
+                    os.remove(dest_path + ext)
+                os.link(previous_path + ext, dest_path + ext)
+        except OSError:
+            pass
+
+
+def remove_in_background(paths: list[str]):
+    """Delete directories from a detached process so the build can exit right away."""
+    if not paths:
+        return
+    logging.info(f"Removing {len(paths)} old generations in the background")
+    subprocess.Popen(
+        [sys.executable, "-c", "import shutil, sys\nfor p in sys.argv[1:]: shutil.rmtree(p, ignore_errors=True)",
+         *paths],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def discard(staging_dir: str):
+    """Remove a staging directory whose build failed."""
+    shutil.rmtree(staging_dir, ignore_errors=True)
@@ -0,0 +1,25 @@
+import logging
+
+
+class BuildReport:
+    """Counters collected while building, logged as a summary at the end."""
+
+    def __init__(self):
+        self.counters = {}
+        self.details = {}
+
+    def add(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def get(self, name: str) -> int:
+        return self.counters.get(name, 0)
+
+    def detail(self, name: str, text: str):
+        """Record a line of text (e.g. timings) to log with the summary."""
+        self.details[name] = text
+
+    def log_summary(self):
+        for name in sorted(self.counters):
+            logging.info(f"{name}: {self.counters[name]}")
+        for name, text in self.details.items():
+            logging.info(f"{name}: {text}")
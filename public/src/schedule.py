@@ -0,0 +1,83 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def longest_first(costs: dict[str, float]) -> list[str]:
+    """Order jobs by descending expected cost (ties by name).
+
+    Handing jobs to whichever worker is free next in this order is the
+    longest-processing-time rule: a big page started last cannot end up
+    running alone while the other workers sit idle.
+    """
+    return sorted(costs, key=lambda name: (-costs[name], name))
+
+
+def simulate(order: list[str], costs: dict[str, float], workers: int) -> list[list[tuple[str, float, float]]]:
+    """Predict which worker runs each job and when, if jobs start in order.
+
+    Returns:
+        list[list[tuple[str, float, float]]]: Per worker, its jobs as
+            (name, start, end) with times relative to the start of the run
+    """
+    lanes = [[] for _ in range(max(1, workers))]
+    free_at = [0.0] * len(lanes)
+    for name in order:
+        lane = min(range(len(lanes)), key=lambda i: (free_at[i], i))
+        start = free_at[lane]
+        free_at[lane] = start + costs[name]
+        lanes[lane].append((name, start, free_at[lane]))
+    return lanes
+
+
+def critical_path(lanes) -> tuple[float, list[str]]:
+    """Return the makespan and the jobs of the worker that finishes last."""
+    finishes = [lane[-1][2] if lane else 0.0 for lane in lanes]
+    if not finishes:
+        return 0.0, []
+    last = max(range(len(lanes)), key=lambda i: finishes[i])
+    return finishes[last], [name for name, _, _ in lanes[last]]
+
+
+def format_path(makespan: float, names: list[str], limit: int = 5) -> str:
+    shown = ", ".join(names[:limit]) + (f" and {len(names) - limit} more" if len(names) > limit else "")
+    return f"{makespan:.3f}s ({shown})"
+
+
+def _timed(function, name, args):
+    start = time.time()
+    result = function(*args)
+    return name, os.getpid(), start, time.time(), result
+
+
+def run_longest_first(function, jobs: dict[str, tuple], costs: dict[str, float], workers: int,
+                      initializer=None, initargs=(), on_result=None):
+    """Run function(*jobs[name]) for every job across a process pool, longest first.
+
+    Args:
+        function: Picklable module-level function
+        jobs: Job name -> argument tuple
+        costs: Job name -> expected cost, used for the order and the prediction
+        workers: Number of worker processes
+        initializer, initargs: Passed to the pool, e.g. to compile shared state once per worker
+        on_result: Called with (name, result) as each job finishes
+
+    Returns:
+        tuple[dict, list, list]: Results by job name, the predicted lanes
+            and the measured lanes (in the shape simulate returns)
+    """
+    order = longest_first({name: costs[name] for name in jobs})
+    predicted = simulate(order, costs, workers)
+    results = {}
+    by_worker = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer, initargs=initargs) as pool:
+        begin = time.time()
+        futures = [pool.submit(_timed, function, name, jobs[name]) for name in order]
+        for future in as_completed(futures):
+            name, pid, start, end, result = future.result()
+            results[name] = result
+            if on_result:
+                on_result(name, result)
+            by_worker.setdefault(pid, []).append((name, start - begin, end - begin))
+    actual = [sorted(lane, key=lambda job: job[1]) for lane in by_worker.values()]
+    return results, predicted, actual
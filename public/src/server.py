@@ -0,0 +1,390 @@
+import email.utils
+import logging
+import mimetypes
+import os
+import posixpath
+import socket
+import threading
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+from metrics import (
+    CACHE_HITS,
+    CACHE_MISSES,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    HTTP_REQUESTS,
+    HTTP_SECONDS,
+    REGISTRY,
+)
+
+DEFAULT_CACHE_CONTROL = "no-cache"
+
+METRICS_PATH = "/metrics"
+
+# Content-Encoding -> sibling extension, in order of preference
+ENCODINGS = (("br", ".br"), ("zstd", ".zst"), ("gzip", ".gz"))
+
+# Files up to this size are kept in memory; larger ones go through sendfile
+HOT_FILE_MAX_SIZE = 64 * 1024
+HOT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Seconds a connection may sit idle (e.g. kept alive between requests)
+# before it is closed and its thread returns to the pool
+REQUEST_TIMEOUT = 30
+
+
+def parse_accept_encoding(header: str | None) -> set[str]:
+    """Return the content codings a client accepts (q > 0)."""
+    accepted = set()
+    if not header:
+        return accepted
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding)
+    if "*" in accepted:
+        accepted.update(coding for coding, _ in ENCODINGS)
+    return accepted
+
+
+def content_type_for(path: str) -> str:
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def load_headers_file(root_dir: str) -> dict[str, dict[str, str]]:
+    """Parse the _headers file written by the fingerprint stage, if any."""
+    path = os.path.join(root_dir, "_headers")
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return parse_headers_file(f)
+
+
+def parse_headers_file(lines) -> dict[str, dict[str, str]]:
+    """Parse _headers lines into URL path -> {header: value}."""
+    rules = {}
+    current = None
+    for line in lines:
+        if not line.strip():
+            continue
+        if not line[0].isspace():
+            current = rules.setdefault(line.strip(), {})
+        elif current is not None and ":" in line:
+            name, value = line.strip().split(":", 1)
+            current[name.strip()] = value.strip()
+    return rules
+
+
+class HotFileCache:
+    """A byte-bounded LRU of small file bodies, validated by size and mtime."""
+
+    def __init__(self, max_bytes: int = HOT_CACHE_MAX_BYTES, max_file_size: int = HOT_FILE_MAX_SIZE):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, path: str, stat: os.stat_result) -> bytes | None:
+        if stat.st_size > self.max_file_size:
+            return None
+        key = (stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry and entry[0] == key:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                CACHE_HITS.inc(cache="hot_file")
+                return entry[1]
+            self.misses += 1
+        CACHE_MISSES.inc(cache="hot_file")
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) != stat.st_size:
+            return data
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old:
+                self.size -= len(old[1])
+            self.entries[path] = (key, data)
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+        return data
+
+
+class StaticRequestHandler(BaseHTTPRequestHandler):
+    """Serve files from server.root_dir with validators and precompressed variants."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "StaticSiteServer/1.0"
+    timeout = REQUEST_TIMEOUT
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; don't let Nagle hold the body back
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+    def do_HEAD(self):
+        self.timed_request(send_body=False)
+
+    def do_GET(self):
+        self.timed_request(send_body=True)
+
+    def send_response(self, code, message=None):
+        self.status = int(code)
+        super().send_response(code, message)
+
+    def timed_request(self, send_body: bool):
+        self.status = None
+        start = time.perf_counter()
+        try:
+            if self.server.metrics and urlsplit(self.path).path == METRICS_PATH:
+                self.send_metrics(send_body)
+            else:
+                self.handle_request(send_body)
+        finally:
+            HTTP_SECONDS.observe(time.perf_counter() - start, method=self.command)
+            HTTP_REQUESTS.inc(method=self.command, code=self.status or 0)
+
+    def send_metrics(self, send_body: bool):
+        data = REGISTRY.render().encode("utf-8")
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def handle_request(self, send_body: bool):
+        url_path = unquote(urlsplit(self.path).path)
+        path = self.resolve(url_path)
+        if path is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        if os.path.isdir(path):
+            self.redirect_to_directory()
+            return
+        self.send_file(url_path, path, send_body)
+
+    def redirect_to_directory(self):
+        """Redirect to the request path with a trailing slash, keeping its query string.
+
+        The Location is built from the path as the client sent it, still
+        percent-encoded, so names outside latin-1 survive the header.
+        """
+        parts = urlsplit(self.path)
+        location = quote(parts.path, safe="/%:@!$&'()*+,;=~") + "/"
+        if parts.query:
+            location += "?" + parts.query
+        self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def resolve(self, url_path: str) -> str | None:
+        """Map a URL path to a file under the root, or None if there is none."""
+        rel_path = posixpath.normpath(url_path).lstrip("/")
+        if rel_path == ".":
+            rel_path = ""
+        path = os.path.join(self.server.root_dir, *rel_path.split("/"))
+        if os.path.isdir(path):
+            if not url_path.endswith("/"):
+                return path
+            path = os.path.join(path, "index.html")
+        return path if os.path.isfile(path) else None
+
+    def choose_variant(self, path: str, stat: os.stat_result):
+        """Pick the best precompressed sibling the client accepts.
+
+        Returns:
+            tuple: (path, stat, content coding or None)
+        """
+        accepted = parse_accept_encoding(self.headers.get("Accept-Encoding"))
+        for coding, ext in ENCODINGS:
+            if coding not in accepted:
+                continue
+            try:
+                sibling_stat = os.stat(path + ext)
+            except OSError:
+                continue
+            # Siblings older than the source are stale
+            if sibling_stat.st_mtime_ns >= stat.st_mtime_ns:
+                return path + ext, sibling_stat, coding
+        return path, stat, None
+
+    def has_variants(self, path: str) -> bool:
+        return any(os.path.exists(path + ext) for _, ext in ENCODINGS)
+
+    def not_modified(self, etag: str, mtime: float) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since.timestamp()
+        return False
+
+    def send_file(self, url_path: str, path: str, send_body: bool):
+        stat = os.stat(path)
+        body_path, body_stat, coding = self.choose_variant(path, stat)
+        etag = f'"{body_stat.st_size:x}-{body_stat.st_mtime_ns:x}{"-" + coding if coding else ""}"'
+        content_type = content_type_for(path)
+
+        extra_headers = self.server.current_header_rules().get(url_path, {})
+        headers = {
+            "ETag": etag,
+            "Last-Modified": email.utils.formatdate(stat.st_mtime, usegmt=True),
+            "Cache-Control": extra_headers.get("Cache-Control", self.server.cache_control),
+        }
+        if coding or self.has_variants(path):
+            headers["Vary"] = "Accept-Encoding"
+
+        if self.not_modified(etag, stat.st_mtime):
+            self.send_not_modified(headers)
+            return
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(body_stat.st_size))
+        if coding:
+            self.send_header("Content-Encoding", coding)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        for name, value in extra_headers.items():
+            if name not in headers:
+                self.send_header(name, value)
+        self.end_headers()
+        if not send_body:
+            return
+
+        data = self.server.hot_cache.get(body_path, body_stat)
+        if data is not None:
+            self.wfile.write(data)
+            return
+        with open(body_path, 'rb') as f:
+            self.send_body(f, body_stat.st_size)
+
+    def send_not_modified(self, headers: dict):
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def send_data(self, data: bytes, content_type: str, etag: str, mtime: float, send_body: bool):
+        """Send an in-memory body, answering conditional requests with 304."""
+        headers = {
+            "ETag": etag,
+            "Last-Modified": email.utils.formatdate(mtime, usegmt=True),
+            "Cache-Control": self.server.cache_control,
+        }
+        if self.not_modified(etag, mtime):
+            self.send_not_modified(headers)
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def send_body(self, f, size: int, start: int = 0):
+        """Send size bytes of a file from start with os.sendfile, falling back to a buffered copy."""
+        if hasattr(os, "sendfile"):
+            offset = 0
+            try:
+                while offset < size:
+                    sent = os.sendfile(self.connection.fileno(), f.fileno(), start + offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                return
+            except OSError:
+                if offset:
+                    raise
+        f.seek(start)
+        remaining = size
+        while remaining > 0:
+            chunk = f.read(min(remaining, 1 << 16))
+            if not chunk:
+                break
+            self.wfile.write(chunk)
+            remaining -= len(chunk)
+
+
+class StaticServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, root_dir: str, cache_control: str = DEFAULT_CACHE_CONTROL,
+                 handler_class=StaticRequestHandler, metrics: bool = False):
+        super().__init__(address, handler_class)
+        self.root_dir = os.path.abspath(root_dir)
+        self.metrics = metrics
+        self.cache_control = cache_control
+        self.header_rules = {}
+        self.header_rules_key = None
+        self.header_rules_lock = threading.Lock()
+        self.hot_cache = HotFileCache()
+
+    def current_header_rules(self) -> dict[str, dict[str, str]]:
+        """Return the rules of <root>/_headers, re-read whenever the file changes.
+
+        A rebuild publishes a new generation by repointing the root symlink,
+        so the file is identified by its real path as well as its mtime.
+        """
+        path = os.path.join(self.root_dir, "_headers")
+        try:
+            stat = os.stat(path)
+            key = (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            key = None
+        with self.header_rules_lock:
+            if key != self.header_rules_key:
+                self.header_rules = load_headers_file(self.root_dir) if key else {}
+                self.header_rules_key = key
+            return self.header_rules
+
+
+def serve(root_dir: str, host: str = "127.0.0.1", port: int = 8888, metrics: bool = False):
+    """Serve root_dir until interrupted."""
+    server = StaticServer((host, port), root_dir, metrics=metrics)
+    logging.info(f"Serving {root_dir} at http://{host}:{server.server_address[1]}/")
+    run_server(server)
+
+
+def run_server(server):
+    """Run a server until interrupted, then close its socket."""
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
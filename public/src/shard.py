@@ -0,0 +1,204 @@
+import hashlib
+import heapq
+import json
+import logging
+import os
+import re
+import shutil
+from xml.sax.saxutils import escape
+from costs import PageCosts
+
+# Partial manifest each shard writes at the root of its output
+SHARD_MANIFEST = "_shard.json"
+
+SITEMAP_FILE = "sitemap.xml"
+SEARCH_INDEX_FILE = "search-index.json"
+
+SHARD_PATTERN = re.compile(r"^\s*(\d+)\s*/\s*(\d+)\s*$")
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """Parse "i/N" (1 <= i <= N) into (i, N)."""
+    match = SHARD_PATTERN.match(spec)
+    if not match:
+        raise ValueError(f"Shard must look like i/N, got {spec!r}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 1 <= index <= count:
+        raise ValueError(f"Shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+def partition(costs: dict[str, float], count: int) -> list[list[str]]:
+    """Split sources into count groups of roughly equal total cost.
+
+    Sources are handed out most expensive first, each to the group with
+    the least cost so far. Ties are broken by path and group number, so
+    the same costs always give the same partition on every machine.
+
+    Args:
+        costs: Content-relative source path -> expected cost
+        count: Number of groups
+
+    Returns:
+        list[list[str]]: The sources of each group, sorted
+    """
+    groups = [[] for _ in range(count)]
+    loads = [(0.0, index) for index in range(count)]
+    for rel_source in sorted(costs, key=lambda rel_source: (-costs[rel_source], rel_source)):
+        load, index = heapq.heappop(loads)
+        groups[index].append(rel_source)
+        heapq.heappush(loads, (load + costs[rel_source], index))
+    return [sorted(group) for group in groups]
+
+
+def plan_shards(sizes: dict[str, int], count: int, costs_path: str | None = None) -> list[list[str]]:
+    """Partition the sources for --shard from inputs every runner shares.
+
+    Each runner's own page-costs.json depends on the machine and is
+    rewritten by its shard's build, so runners would disagree on the plan.
+    Sources are costed by their size, or by the timings in costs_path, a
+    costs file handed to every runner alike and only read here.
+
+    Args:
+        sizes: Content-relative source path -> file size in bytes
+        count: Number of shards
+        costs_path: Shared page-costs.json to balance by, if any
+    """
+    return partition(PageCosts(costs_path).estimate(sizes), count)
+
+
+def plan_digest(groups: list[list[str]]) -> str:
+    """Identify a partition, so shards built from different plans are caught at merge time."""
+    return hashlib.sha256(json.dumps(groups).encode("utf-8")).hexdigest()
+
+
+def plain_text(node) -> str:
+    """Return the text content of an HTMLNode tree with whitespace collapsed."""
+    parts = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.children:
+            stack.extend(reversed(current.children))
+        elif current.value:
+            parts.append(current.value)
+    return " ".join(" ".join(parts).split())
+
+
+def page_record(page, url: str) -> dict:
+    """Describe a rendered page for the sitemap and search index.
+
+    A largefile.LargePage has no tree; it collects its text while it streams.
+    """
+    text = plain_text(page.html_node) if hasattr(page, "html_node") else page.text
+    return {"url": url, "title": page.title, "text": text}
+
+
+def write_shard_manifest(dest_dir: str, index: int, count: int, digest: str, total: int, pages: list[dict]):
+    """Write the partial manifest merge_shards reads back.
+
+    Args:
+        dest_dir: The shard's output directory
+        index: 1-based shard number
+        count: Number of shards
+        digest: plan_digest of the partition the shard was built from
+        total: Number of sources across all shards
+        pages: page_record of every page the shard built
+    """
+    manifest = {"shard": index, "count": count, "plan": digest, "total": total, "pages": pages}
+    with open(os.path.join(dest_dir, SHARD_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_shard_manifests(shard_dirs) -> list[dict]:
+    """Read and cross-check the partial manifests of a complete set of shards."""
+    manifests = []
+    for shard_dir in shard_dirs:
+        path = os.path.join(shard_dir, SHARD_MANIFEST)
+        try:
+            with open(path, 'r') as f:
+                manifests.append(json.load(f))
+        except (OSError, ValueError) as e:
+            raise ValueError(f"Cannot read shard manifest {path}: {e}")
+
+    count = manifests[0]["count"]
+    indices = sorted(manifest["shard"] for manifest in manifests)
+    if any(manifest["count"] != count for manifest in manifests) or indices != list(range(1, count + 1)):
+        raise ValueError(f"Expected shards 1..{count} exactly once each, got {indices}")
+    if len({manifest["plan"] for manifest in manifests}) != 1:
+        raise ValueError("Shards were built from different partitions; "
+                         "were they given the same sources and cost history?")
+    built = sum(len(manifest["pages"]) for manifest in manifests)
+    if built != manifests[0]["total"]:
+        raise ValueError(f"Shards built {built} pages but the plan has {manifests[0]['total']}")
+    return manifests
+
+
+def find_overlaps(shard_dirs) -> dict[str, list[str]]:
+    """Return every output path written by more than one shard, with the shards that wrote it."""
+    owners = {}
+    for shard_dir in shard_dirs:
+        for root, _, files in os.walk(shard_dir):
+            for file_name in files:
+                rel_path = os.path.relpath(os.path.join(root, file_name), shard_dir).replace(os.sep, "/")
+                if rel_path != SHARD_MANIFEST:
+                    owners.setdefault(rel_path, []).append(shard_dir)
+    return {rel_path: dirs for rel_path, dirs in owners.items() if len(dirs) > 1}
+
+
+def write_sitemap(path: str, urls, site_url: str = ""):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    for url in urls:
+        lines.append(f"  <url><loc>{escape(site_url.rstrip('/') + url)}</loc></url>")
+    lines.append("</urlset>")
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def write_search_index(path: str, pages: list[dict]):
+    with open(path, 'w') as f:
+        json.dump(pages, f, separators=(",", ":"))
+
+
+def merge_shards(shard_dirs, out_dir: str, site_url: str = "") -> dict:
+    """Combine shard outputs into out_dir and build the site-wide artifacts.
+
+    Args:
+        shard_dirs: Output directories of every shard of one build
+        out_dir: Directory to merge into; it is replaced
+        site_url: Scheme and host prepended to sitemap URLs
+
+    Returns:
+        dict: Counts of shards, files copied and pages indexed
+
+    Raises:
+        ValueError: If shards are missing or from different plans, or if
+            two shards wrote the same output path
+    """
+    manifests = load_shard_manifests(shard_dirs)
+    overlaps = find_overlaps(shard_dirs)
+    if overlaps:
+        listed = ", ".join(f"{rel_path} ({' and '.join(dirs)})" for rel_path, dirs in sorted(overlaps.items())[:10])
+        raise ValueError(f"{len(overlaps)} outputs were written by more than one shard: {listed}")
+
+    if os.path.exists(out_dir):
+        logging.info(f"Deleting existing directory: {out_dir}")
+        shutil.rmtree(out_dir)
+    copied = 0
+    for shard_dir in shard_dirs:
+        for root, _, files in os.walk(shard_dir):
+            dest_root = os.path.join(out_dir, os.path.relpath(root, shard_dir))
+            os.makedirs(dest_root, exist_ok=True)
+            for file_name in files:
+                if root == shard_dir and file_name == SHARD_MANIFEST:
+                    continue
+                shutil.copy2(os.path.join(root, file_name), os.path.join(dest_root, file_name))
+                copied += 1
+
+    pages = sorted((page for manifest in manifests for page in manifest["pages"]), key=lambda page: page["url"])
+    if not site_url:
+        logging.warning("No site URL given; sitemap.xml will contain relative URLs")
+    write_sitemap(os.path.join(out_dir, SITEMAP_FILE), [page["url"] for page in pages], site_url)
+    write_search_index(os.path.join(out_dir, SEARCH_INDEX_FILE), pages)
+    return {"shards": len(manifests), "files": copied, "pages": len(pages)}
@@ -0,0 +1,41 @@
+import json
+import os
+
+
+def load_state(path: str | None, default=None):
+    """Read a JSON state file.
+
+    Args:
+        path: Path to the file, or None when the caller keeps no state
+        default: Returned when the file is missing, unreadable or not JSON
+
+    Returns:
+        The decoded JSON value, or default
+    """
+    if not path:
+        return default
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_state(path: str, data, **dump_options):
+    """Write data to path as JSON, atomically.
+
+    The JSON goes to a temporary file next to path that then replaces it,
+    so readers, and builds that are killed halfway, never see a partial
+    file. The temporary name includes the process ID, so processes that
+    save the same path concurrently do not write into each other's file.
+
+    Args:
+        path: Path to the file; missing parent directories are created
+        data: JSON-serializable value
+        **dump_options: Passed on to json.dump
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **dump_options)
+    os.replace(tmp_path, path)
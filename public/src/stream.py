@@ -0,0 +1,159 @@
+import logging
+import os
+import sqlite3
+import time
+from assets import resolve_reference
+from largefile import LargePage, load_page, read_source
+from pages import (
+    compile_template,
+    output_path_for,
+    render_html,
+    render_page_data,
+    stream_page,
+    url_for,
+    write_html,
+    write_page_data,
+)
+from pipeline import run_pipeline
+
+LINK_GRAPH_FILE = "links.sqlite"
+
+DEFAULT_WINDOW = 64
+
+# Rows buffered before they are flushed to the database
+BATCH_SIZE = 1000
+
+
+def scan_sources(content_dir: str):
+    """Yield (rel_source, path) for every markdown file under content_dir.
+
+    Directories are read with os.scandir one at a time and nothing is
+    sorted, so memory use does not depend on how many files there are.
+    """
+    pending = [""]
+    while pending:
+        rel_dir = pending.pop()
+        with os.scandir(os.path.join(content_dir, rel_dir)) as entries:
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(rel_path)
+                elif entry.name.endswith(".md") and entry.is_file():
+                    yield rel_path, entry.path
+
+
+class LinkGraph:
+    """Which page references which site-root relative path, kept on disk.
+
+    Supports `path in graph` so it can stand in for the in-memory set of
+    references that tree-shaking checks assets against.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode = OFF")
+        self.db.execute("PRAGMA synchronous = OFF")
+        self.db.execute("CREATE TABLE links (page TEXT NOT NULL, target TEXT NOT NULL)")
+        self.pending = []
+        self.indexed = False
+
+    def add_links(self, page: str, targets):
+        self.pending.extend((page, target) for target in targets)
+        if len(self.pending) >= BATCH_SIZE:
+            self.flush()
+
+    def add(self, target: str):
+        """Record a reference that does not come from a page (e.g. the template)."""
+        self.add_links("", [target])
+
+    def flush(self):
+        if self.pending:
+            self.db.executemany("INSERT INTO links VALUES (?, ?)", self.pending)
+            self.db.commit()
+            self.pending = []
+
+    def __contains__(self, target: str) -> bool:
+        self.flush()
+        if not self.indexed:
+            self.db.execute("CREATE INDEX IF NOT EXISTS links_target ON links (target)")
+            self.indexed = True
+        return self.db.execute("SELECT 1 FROM links WHERE target = ? LIMIT 1", (target,)).fetchone() is not None
+
+    def pages_linking_to(self, target: str) -> list[str]:
+        self.flush()
+        return [row[0] for row in self.db.execute("SELECT page FROM links WHERE target = ? AND page != ''",
+                                                  (target,))]
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+def generate_pages_streaming(content_dir, template_path, dest_dir, links: LinkGraph, manifest=None,
+                             minify=False, report=None, window=DEFAULT_WINDOW, writer=None, template_cache=None,
+                             critical_css=None, images=None, prefetch=0, service_worker=False, page_data=False):
+    """Build every page with memory bounded by window, not by the number of pages.
+
+    Sources are discovered lazily with scan_sources and pushed through
+    run_pipeline, whose queues hold at most window pages per stage. Each
+    page's resolved references go to the on-disk link graph instead of an
+    in-memory set.
+
+    Args:
+        links: Receives (page URL, referenced path) for every page
+        window: Queue capacity between the read, render and write stages
+        writer: OutputWriter that skips unchanged pages; it should not
+            record hashes, which would grow with the number of pages
+        template_cache: Directory for compiled template code (a template
+            that lists Pages keeps that listing in memory)
+        critical_css: Static directory to inline critical CSS from (see
+            compile_template)
+        images: Image dimensions to size <img> elements with
+        prefetch: Pages each page prefetches (see compile_template)
+        service_worker: Register the service worker in every page
+        page_data: Write each page's page.json (see compile_template)
+
+    Returns:
+        int: Number of pages written
+    """
+    template = compile_template(template_path, manifest, minify, template_cache, content_dir, critical_css,
+                                images, prefetch, service_worker, page_data)
+    template.fragments.report = report
+
+    def read(source):
+        return read_source(source[1])
+
+    def process(source, markdown_content):
+        base = url_for(output_path_for(source[0]))
+        page = load_page(source[1], template, manifest, base, minify, markdown_content)
+        if isinstance(page, LargePage):
+            # Streamed from its memory map here rather than held for the write stage
+            stream_page(page, os.path.join(dest_dir, *output_path_for(source[0]).split("/")), writer)
+            html = data = None
+        else:
+            html = render_html(page)
+            data = render_page_data(page)
+        resolved = (resolve_reference(url, base) for url in page.references)
+        links.add_links(base, [path for path in resolved if path])
+        if report:
+            report.add("pages built")
+            if minify:
+                report.add("bytes saved by minification", page.saved)
+        return html, data
+
+    def write(source, rendered):
+        html, data = rendered
+        dest_path = os.path.join(dest_dir, *output_path_for(source[0]).split("/"))
+        if html is not None:
+            write_html(html, dest_path, writer)
+        write_page_data(data, dest_path, writer)
+
+    start = time.perf_counter()
+    written = run_pipeline(scan_sources(content_dir), read, process, write, depth=window)
+    links.flush()
+    logging.info(f"Streamed {written} pages in {time.perf_counter() - start:.2f}s")
+    return written
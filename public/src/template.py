@@ -0,0 +1,370 @@
+import hashlib
+import marshal
+import os
+import re
+import sys
+import threading
+from minify import minify_template
+
+# {{ expression }} or {% statement %}
+TAG = re.compile(r"\{\{\s*(.*?)\s*\}\}|\{%\s*(.*?)\s*%\}", re.DOTALL)
+
+INCLUDE = re.compile(r"""\{%\s*include\s+["']([^"']+)["']\s*%\}""")
+
+PATH = re.compile(r"[A-Za-z_]\w*(?:\.\w+)*$")
+
+# Bump when the generated code changes, so cached code objects are not reused
+ENGINE_VERSION = 2
+
+MAX_INCLUDE_DEPTH = 16
+
+
+def lookup(value, name: str):
+    """Resolve one step of a dotted path: a dict key or an attribute."""
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+
+def emit(value, original: str):
+    """Turn an expression's value into output chunks; missing values keep their tag."""
+    if value is None:
+        return (original,)
+    if isinstance(value, str):
+        return (value,)
+    if isinstance(value, (int, float)):
+        return (str(value),)
+    return value
+
+
+class FragmentCache:
+    """Rendered {% cache %} fragments, shared by every page rendered with one template.
+
+    A fragment is rendered the first time its key is seen and reused as a
+    string afterwards. Template.bind clears the cache, so fragments built
+    from site metadata such as Pages never outlive it.
+
+    Attributes:
+        rendered: Fragments rendered so far
+        reused: Fragments served from the cache
+        report: Optional BuildReport that gets the same counts
+    """
+
+    def __init__(self):
+        self.fragments = {}
+        self.rendered = 0
+        self.reused = 0
+        self.report = None
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple) -> str | None:
+        fragment = self.fragments.get(key)
+        if fragment is not None:
+            with self.lock:
+                self.reused += 1
+            if self.report:
+                self.report.add("fragments reused")
+        return fragment
+
+    def put(self, key: tuple, fragment: str) -> str:
+        with self.lock:
+            self.fragments[key] = fragment
+            self.rendered += 1
+        if self.report:
+            self.report.add("fragments rendered")
+        return fragment
+
+    def clear(self):
+        with self.lock:
+            self.fragments.clear()
+
+
+class Template:
+    """A template compiled once into a Python generator function.
+
+    The language is small: {{ Name }} or {{ item.field }} outputs a value,
+    {% for item in Items %}...{% endfor %} loops, {% if ... %}, {% elif ... %},
+    {% else %} and {% endif %} choose a branch, {% include "file" %}
+    (resolved by load_template, at compile time) pulls in a partial, and
+    {% cache "name" Key ... %}...{% endcache %} renders its body once per
+    distinct value of the listed keys and reuses the string (see
+    FragmentCache).
+    Conditions are a value, "not value" or "a == b" / "a != b", where a
+    and b are dotted names or quoted strings.
+
+    The whole template becomes straight-line code: literal text is yielded
+    as constants and values are looked up directly, so rendering a page
+    never parses or scans the template.
+
+    Attributes:
+        names: Top-level names the template reads (e.g. {"Title", "Content"})
+        files: Template files it was built from, the main one first
+        globals: Values every render sees unless the page sets them; set
+            them with bind
+        fragments: FragmentCache of the template's {% cache %} blocks
+        critical: CriticalCSS that pages fill {{ CriticalCSS }} from, if
+            pages.compile_template was asked to inline critical CSS
+        images: Image dimensions by site-root relative path that pages
+            size their <img> elements with, or None (see images.size_images)
+        prefetch: Most pages each page fills {{ Prefetch }} with
+        page_data: Whether pages keep their rendered content for
+            pages.write_page_data
+    """
+
+    def __init__(self, text: str, minify: bool = False, name: str = "<template>", cache_dir: str | None = None,
+                 files=()):
+        self.source_size = len(text)
+        if minify:
+            text = minify_template(text)
+        self.text = text
+        self.name = name
+        self.files = list(files)
+        self.globals = {}
+        self.fragments = FragmentCache()
+        self.critical = None
+        self.images = None
+        self.prefetch = 0
+        self.page_data = False
+        self.names = set()
+        self.code = self.compile(cache_dir)
+        namespace = {}
+        exec(self.code, {"lookup": lookup, "emit": emit, "fragments": self.fragments}, namespace)
+        self.function = namespace["render"]
+
+    @property
+    def saved(self) -> int:
+        """Bytes removed from the literal segments by minification."""
+        return self.source_size - len(self.text)
+
+    def compile(self, cache_dir: str | None):
+        """Return the code object for self.text, from cache_dir when it has one.
+
+        Cached code is keyed by the hash of the template text, so a hit
+        skips parsing as well as compiling.
+        """
+        if cache_dir:
+            key = hashlib.sha256(
+                f"{ENGINE_VERSION}\0{sys.implementation.cache_tag}\0{self.name}\0{self.text}".encode("utf-8")
+            ).hexdigest()
+            path = os.path.join(cache_dir, f"{key}.marshal")
+            try:
+                with open(path, 'rb') as f:
+                    code, names = marshal.load(f)
+                self.names = set(names)
+                return code
+            except (OSError, ValueError, EOFError, TypeError):
+                pass
+        source, self.names = generate_source(self.text, self.name)
+        code = compile(source, self.name, "exec")
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                marshal.dump((code, sorted(self.names)), f)
+            os.replace(tmp_path, path)
+        return code
+
+    def bind(self, name: str, value):
+        """Set a global value, dropping cached fragments that may have used the old one."""
+        self.globals[name] = value
+        self.fragments.clear()
+
+    def render(self, values: dict):
+        """Yield the output chunks for the given values.
+
+        Args:
+            values: Name -> str, an iterable of str chunks (streamed as
+                is), a list/dict for loops and dotted names, or a number.
+                Names without a value are emitted unchanged.
+        """
+        if self.globals:
+            values = {**self.globals, **values}
+        return self.function(values)
+
+
+def generate_source(text: str, name: str = "<template>") -> tuple[str, set[str]]:
+    """Translate template text into the source of a `render(values)` generator.
+
+    Returns:
+        tuple[str, set[str]]: Python source and the top-level names it reads
+
+    Raises:
+        ValueError: On unknown tags, bad expressions or unbalanced blocks
+    """
+    lines = ["def render(values):", "    if False:", "        yield ''"]
+    # Open blocks: (kind, offset, loop variable or cache block number, local it shadows), innermost last
+    blocks = []
+    # Loop variables in scope, mapped to their Python local names
+    scope = {}
+    names = set()
+    indent = 1
+    position = 0
+
+    def line_of(offset: int) -> int:
+        return text.count("\n", 0, offset) + 1
+
+    def fail(message: str, offset: int):
+        raise ValueError(f"{name}:{line_of(offset)}: {message}")
+
+    def operand(expression: str, offset: int) -> str:
+        expression = expression.strip()
+        if len(expression) >= 2 and expression[0] == expression[-1] and expression[0] in "\"'":
+            return repr(expression[1:-1])
+        if re.fullmatch(r"-?\d+", expression):
+            return expression
+        if not PATH.match(expression):
+            fail(f"cannot understand {expression!r}", offset)
+        first, *rest = expression.split(".")
+        if first in scope:
+            code = scope[first]
+        else:
+            names.add(first)
+            code = f"values.get({first!r})"
+        for part in rest:
+            code = f"lookup({code}, {part!r})"
+        return code
+
+    def condition(expression: str, offset: int) -> str:
+        for operator in ("==", "!="):
+            if operator in expression:
+                left, right = expression.split(operator, 1)
+                return f"({operand(left, offset)} {operator} {operand(right, offset)})"
+        if expression.startswith("not "):
+            return f"(not {operand(expression[4:], offset)})"
+        return f"({operand(expression, offset)})"
+
+    def add(code: str):
+        lines.append("    " * indent + code)
+
+    for match in TAG.finditer(text):
+        if match.start() > position:
+            add(f"yield {text[position:match.start()]!r}")
+        position = match.end()
+        offset = match.start()
+        if match.group(1) is not None:
+            add(f"yield from emit({operand(match.group(1), offset)}, {match.group(0)!r})")
+            continue
+        statement = match.group(2)
+        keyword = statement.split(None, 1)[0] if statement else ""
+        if keyword == "for":
+            parts = re.fullmatch(r"for\s+([A-Za-z_]\w*)\s+in\s+(.+)", statement)
+            if not parts:
+                fail(f"expected 'for NAME in VALUE', got {statement!r}", offset)
+            variable = f"_{parts.group(1)}_{len(blocks)}"
+            add(f"for {variable} in ({operand(parts.group(2), offset)} or ()):")
+            blocks.append(("for", offset, parts.group(1), scope.get(parts.group(1))))
+            scope[parts.group(1)] = variable
+            indent += 1
+        elif keyword == "endfor":
+            if not blocks or blocks[-1][0] != "for":
+                fail("endfor without for", offset)
+            _, _, loop_name, shadowed = blocks.pop()
+            if shadowed is None:
+                del scope[loop_name]
+            else:
+                scope[loop_name] = shadowed
+            add("pass")
+            indent -= 1
+        elif keyword == "if":
+            add(f"if {condition(statement[2:].strip(), offset)}:")
+            blocks.append(("if", offset, None, None))
+            indent += 1
+        elif keyword in ("elif", "else"):
+            if not blocks or blocks[-1][0] != "if":
+                fail(f"{keyword} without if", offset)
+            add("pass")
+            indent -= 1
+            if keyword == "elif":
+                add(f"elif {condition(statement[4:].strip(), offset)}:")
+            else:
+                add("else:")
+            indent += 1
+        elif keyword == "endif":
+            if not blocks or blocks[-1][0] != "if":
+                fail("endif without if", offset)
+            blocks.pop()
+            add("pass")
+            indent -= 1
+        elif keyword == "cache":
+            parts = re.fullmatch(r"cache\s+(\"[^\"]*\"|'[^']*')((?:\s+\S+)*)", statement)
+            if not parts:
+                fail(f"expected 'cache \"name\" KEY ...', got {statement!r}", offset)
+            number = len(lines)
+            keys = [operand(key, offset) for key in parts.group(2).split()]
+            add(f"_key_{number} = ({', '.join([operand(parts.group(1), offset), *keys])},)")
+            add(f"_fragment_{number} = fragments.get(_key_{number})")
+            add(f"if _fragment_{number} is None:")
+            add(f"    def _render_{number}():")
+            add("        if False:")
+            add("            yield ''")
+            blocks.append(("cache", offset, number, None))
+            indent += 2
+        elif keyword == "endcache":
+            if not blocks or blocks[-1][0] != "cache":
+                fail("endcache without cache", offset)
+            number = blocks.pop()[2]
+            indent -= 1
+            add(f"_fragment_{number} = fragments.put(_key_{number}, ''.join(_render_{number}()))")
+            indent -= 1
+            add(f"yield _fragment_{number}")
+        elif keyword == "include":
+            fail("include is only available in templates loaded from a file", offset)
+        else:
+            fail(f"unknown tag {match.group(0)!r}", offset)
+    if position < len(text):
+        add(f"yield {text[position:]!r}")
+    if blocks:
+        fail(f"{blocks[-1][0]} is never closed", blocks[-1][1])
+    return "\n".join(lines) + "\n", names
+
+
+def expand_includes(text: str, directory: str, files: list, depth: int = 0) -> str:
+    """Replace {% include "path" %} tags with the included files, recursively.
+
+    Paths are relative to directory (the main template's directory).
+    Every included file is appended to files.
+    """
+    if depth > MAX_INCLUDE_DEPTH:
+        raise ValueError(f"Includes nested more than {MAX_INCLUDE_DEPTH} deep (is there a cycle?)")
+
+    def include(match):
+        path = os.path.join(directory, *match.group(1).split("/"))
+        files.append(path)
+        with open(path, 'r') as f:
+            return expand_includes(f.read(), directory, files, depth + 1)
+
+    return INCLUDE.sub(include, text)
+
+
+def template_files(template_path: str) -> list[str]:
+    """Return a template file followed by every partial it includes."""
+    with open(template_path, 'r') as f:
+        text = f.read()
+    files = [template_path]
+    expand_includes(text, os.path.dirname(os.path.abspath(template_path)), files)
+    return files
+
+
+def latest_mtime_ns(paths) -> int:
+    """Newest mtime among a template's files, to tell when it must be recompiled."""
+    return max(os.stat(path).st_mtime_ns for path in paths)
+
+
+def load_template(template_path: str, minify: bool = False, transform=None, cache_dir: str | None = None) -> Template:
+    """Read and compile a template file, with its partials.
+
+    Args:
+        template_path: Path to the template HTML file
+        minify: Minify the template's literal segments
+        transform: Optional function applied to the raw text (partials
+            included) before compiling
+        cache_dir: Directory to keep compiled code objects in, keyed by
+            the hash of the generated code
+    """
+    with open(template_path, 'r') as f:
+        text = f.read()
+    files = [template_path]
+    text = expand_includes(text, os.path.dirname(os.path.abspath(template_path)), files)
+    if transform:
+        text = transform(text)
+    return Template(text, minify, os.path.basename(template_path), cache_dir, files)
@@ -0,0 +1,146 @@
+import gzip
+import http.client
+import os
+import tarfile
+import tempfile
+import threading
+import unittest
+import zipfile
+from archive import ArchiveServer, ArchiveSite, ArchiveWriter, archive_format
+from compress import available_encoders
+
+PAGE = "<html><body>" + "<p>hello archive</p>" * 100 + "</body></html>"
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "public")
+        self.static_dir = os.path.join(self.tmp.name, "static")
+        os.makedirs(os.path.join(self.static_dir, "images"))
+        with open(os.path.join(self.static_dir, "index.css"), "w") as f:
+            f.write("body { color: red; }\n" * 100)
+        with open(os.path.join(self.static_dir, "images", "a.png"), "wb") as f:
+            f.write(b"\x89PNG" + bytes(range(256)) * 10)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, name, encoders=None):
+        path = os.path.join(self.tmp.name, name)
+        writer = ArchiveWriter(path, self.root, encoders)
+        writer.write(os.path.join(self.root, "index.html"), PAGE.encode())
+        writer.stream(os.path.join(self.root, "blog", "index.html"), iter(["<p>", "blog", "</p>"]))
+        writer.add_tree(self.static_dir, rename={"index.css": "index.1a2b3c4d.css"})
+        writer.add("_headers", b"/index.1a2b3c4d.css\n  Cache-Control: immutable\n")
+        writer.close()
+        return path
+
+    def test_archive_format(self):
+        self.assertEqual(archive_format("out/site.tgz"), "tar.gz")
+        self.assertEqual(archive_format("site.zip"), "zip")
+        with self.assertRaises(ValueError):
+            archive_format("site.rar")
+
+    def test_tar_is_extractable_and_indexed(self):
+        path = self.build("site.tar")
+        self.assertFalse(os.path.exists(self.root))
+        with tarfile.open(path) as tar:
+            self.assertEqual(tar.extractfile("blog/index.html").read(), b"<p>blog</p>")
+            self.assertTrue(tar.getmember("index.css").islnk())
+        site = ArchiveSite(path)
+        self.assertEqual(site.read("index.html"), PAGE.encode())
+        self.assertEqual(site.read("index.css"), site.read("index.1a2b3c4d.css"))
+        self.assertEqual(site.read("images/a.png")[:4], b"\x89PNG")
+
+    def test_zip_members_are_indexed(self):
+        path = self.build("site.zip")
+        with zipfile.ZipFile(path) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.getinfo("index.html").compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(archive.getinfo("images/a.png").compress_type, zipfile.ZIP_STORED)
+        site = ArchiveSite(path)
+        self.assertEqual(site.members["index.html"][3], "deflated")
+        self.assertEqual(site.read("index.html"), PAGE.encode())
+        self.assertEqual(site.read("images/a.png")[:4], b"\x89PNG")
+
+    def test_precompressed_siblings(self):
+        site = ArchiveSite(self.build("site.tar", {".gz": available_encoders()[".gz"]}))
+        self.assertEqual(gzip.decompress(site.read("index.html.gz")), PAGE.encode())
+        self.assertNotIn("blog/index.html.gz", site.members)
+        self.assertIn("index.css.gz", site.members)
+
+    def test_compressed_tar_cannot_be_served(self):
+        path = self.build("site.tar.gz")
+        with tarfile.open(path) as tar:
+            self.assertEqual(tar.extractfile("index.html").read(), PAGE.encode())
+        with self.assertRaises(ValueError):
+            ArchiveSite(path)
+
+    def test_failed_build_leaves_nothing(self):
+        path = os.path.join(self.tmp.name, "site.tar")
+        writer = ArchiveWriter(path, self.root)
+        writer.add("index.html", b"x")
+        writer.abort()
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["static"])
+
+class TestArchiveServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "public")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def serve(self, name):
+        path = os.path.join(self.tmp.name, name)
+        writer = ArchiveWriter(path, self.root, {".gz": available_encoders()[".gz"]})
+        writer.write(os.path.join(self.root, "index.html"), PAGE.encode())
+        writer.write(os.path.join(self.root, "blog", "index.html"), b"<p>blog</p>")
+        writer.write(os.path.join(self.root, "日本", "index.html"), b"<p>ja</p>")
+        writer.add("_headers", b"/index.html\n  X-Test: yes\n")
+        writer.close()
+        server = ArchiveServer(("127.0.0.1", 0), ArchiveSite(path))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server.server_address[1]
+
+    def get(self, port, path, headers=None):
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        connection.request("GET", path, headers=headers or {})
+        response = connection.getresponse()
+        body = response.read()
+        connection.close()
+        return response, body
+
+    def test_serves_tar_and_zip(self):
+        for name in ("site.tar", "site.zip"):
+            port = self.serve(name)
+            response, body = self.get(port, "/")
+            self.assertEqual((response.status, body), (200, PAGE.encode()))
+            self.assertEqual(response.getheader("Content-Type"), "text/html; charset=utf-8")
+            response, body = self.get(port, "/blog/")
+            self.assertEqual(body, b"<p>blog</p>")
+
+    def test_precompressed_variant_and_validators(self):
+        port = self.serve("site.tar")
+        response, body = self.get(port, "/index.html", {"Accept-Encoding": "gzip"})
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(response.getheader("X-Test"), "yes")
+        self.assertEqual(gzip.decompress(body), PAGE.encode())
+        etag = response.getheader("ETag")
+        response, _ = self.get(port, "/index.html", {"Accept-Encoding": "gzip", "If-None-Match": etag})
+        self.assertEqual(response.status, 304)
+
+    def test_redirect_and_missing(self):
+        port = self.serve("site.zip")
+        response, _ = self.get(port, "/blog")
+        self.assertEqual((response.status, response.getheader("Location")), (301, "/blog/"))
+        response, _ = self.get(port, "/%E6%97%A5%E6%9C%AC?lang=ja")
+        self.assertEqual((response.status, response.getheader("Location")), (301, "/%E6%97%A5%E6%9C%AC/?lang=ja"))
+        response, _ = self.get(port, "/missing.html")
+        self.assertEqual(response.status, 404)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import tempfile
+import unittest
+from assets import (
+    collect_references,
+    extract_template_references,
+    resolve_reference,
+    select_assets,
+    template_references,
+    write_asset_report,
+)
+from markdown import markdown_to_html_node
+from template import template_files
+
+class TestCollectReferences(unittest.TestCase):
+    def test_collects_images_and_links_in_order(self):
+        node = markdown_to_html_node(
+            "[Back Home](/)\n\n![alt](/images/a.png)\n\nSee [docs](https://example.com)"
+        )
+        self.assertEqual(
+            collect_references(node),
+            ["/", "/images/a.png", "https://example.com"],
+        )
+
+    def test_template_references(self):
+        template = '<link href="/index.css" rel="stylesheet"><script src="app.js"></script>'
+        self.assertEqual(extract_template_references(template), ["/index.css", "app.js"])
+
+    def test_references_in_partials(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "partials"))
+            template_path = os.path.join(tmp, "template.html")
+            with open(template_path, "w") as f:
+                f.write('<link href="/index.css" rel="stylesheet">{% include "partials/header.html" %}')
+            with open(os.path.join(tmp, "partials", "header.html"), "w") as f:
+                f.write('<img src="/images/logo.png">')
+            self.assertEqual(template_references(template_files(template_path)),
+                             {"index.css", "images/logo.png"})
+
+class TestResolveReference(unittest.TestCase):
+    def test_absolute_path(self):
+        self.assertEqual(resolve_reference("/images/a.png"), "images/a.png")
+
+    def test_relative_to_page(self):
+        self.assertEqual(resolve_reference("../img/b.png", "/blog/post/"), "blog/img/b.png")
+
+    def test_strips_query_and_fragment(self):
+        self.assertEqual(resolve_reference("/a%20b.png?v=1#top"), "a b.png")
+
+    def test_external_and_root(self):
+        self.assertIsNone(resolve_reference("https://example.com/a.png"))
+        self.assertIsNone(resolve_reference("//cdn.example.com/a.png"))
+        self.assertIsNone(resolve_reference("#section"))
+        self.assertIsNone(resolve_reference("/"))
+        # Browsers clamp ".." at the site root
+        self.assertEqual(resolve_reference("../../escape.png"), "escape.png")
+
+class TestSelectAssets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static_dir = self.tmp.name
+        for rel_path in ("index.css", "images/used.png", "images/old.png", "fonts/a.woff2"):
+            path = os.path.join(self.static_dir, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("x" * 10)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_keeps_referenced_and_globbed(self):
+        reachable, unused = select_assets(self.static_dir, {"images/used.png"})
+        self.assertEqual(reachable, {"index.css", "images/used.png", "fonts/a.woff2"})
+        self.assertEqual(unused, ["images/old.png"])
+
+    def test_custom_keep_globs(self):
+        reachable, unused = select_assets(self.static_dir, set(), ["images/*"])
+        self.assertEqual(reachable, {"images/used.png", "images/old.png"})
+        self.assertEqual(unused, ["fonts/a.woff2", "index.css"])
+
+    def test_keeps_what_stylesheets_reference(self):
+        files = {
+            "css/site.css": "@import 'parts/more.css';\nbody { background: url(\"../images/bg.png\") }",
+            "css/parts/more.css": "h1 { background: url( icons/h.svg ) } p { background: url(data:image/png;base64,x) }",
+            "css/parts/icons/h.svg": "<svg/>",
+            "images/bg.png": "x",
+        }
+        for rel_path, text in files.items():
+            path = os.path.join(self.static_dir, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(text)
+        reachable, unused = select_assets(self.static_dir, set(), ["css/site.css"])
+        self.assertEqual(reachable, set(files))
+        self.assertEqual(unused, ["fonts/a.woff2", "images/old.png", "images/used.png", "index.css"])
+
+    def test_report(self):
+        report_path = os.path.join(self.static_dir, "report.txt")
+        write_asset_report(report_path, ["images/old.png"], self.static_dir)
+        with open(report_path) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0].split(), ["10", "images/old.png"])
+        self.assertIn("1 unused files", lines[-1])
+
+if __name__ == "__main__":
+    unittest.main()
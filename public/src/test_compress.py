@@ -0,0 +1,105 @@
+import gzip
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import compress
+from compress import QUEUED_PER_WORKER, available_encoders, compress_file, is_compressible, precompress_tree
+
+class TestPrecompress(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.html = self.write("index.html", "<p>hello</p>\n" * 500)
+        self.small = self.write("small.css", "a{}")
+        self.png = self.write("img.png", "x" * 5000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, content):
+        path = os.path.join(self.root, rel_path)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_gzip_always_available(self):
+        self.assertIn(".gz", available_encoders())
+
+    def test_is_compressible(self):
+        self.assertTrue(is_compressible(self.html))
+        self.assertFalse(is_compressible(self.small))
+        self.assertFalse(is_compressible(self.png))
+        self.assertTrue(is_compressible(self.small, min_size=0))
+
+    def test_precompress_tree(self):
+        written, skipped = precompress_tree(self.root, workers=2)
+        self.assertEqual(written, len(available_encoders()))
+        self.assertEqual(skipped, 0)
+        with gzip.open(self.html + ".gz", "rt") as f:
+            self.assertEqual(f.read(), "<p>hello</p>\n" * 500)
+        self.assertFalse(os.path.exists(self.small + ".gz"))
+        self.assertFalse(os.path.exists(self.png + ".gz"))
+
+    def test_skips_up_to_date_siblings(self):
+        precompress_tree(self.root)
+        written, skipped = precompress_tree(self.root)
+        self.assertEqual(written, 0)
+        self.assertEqual(skipped, len(available_encoders()))
+
+        # Touching the source makes its siblings stale
+        stat = os.stat(self.html)
+        os.utime(self.html, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(precompress_tree(self.root)[0], len(available_encoders()))
+
+    def test_queues_a_bounded_number_of_files(self):
+        for i in range(40):
+            self.write(f"page{i}.html", f"<p>{i}</p>\n" * 500)
+        lock = threading.Lock()
+        counts = {"yielded": 0, "done": 0, "gap": 0}
+        walk = compress.iter_compressible
+
+        def counted_walk(*args):
+            for path in walk(*args):
+                with lock:
+                    counts["yielded"] += 1
+                    counts["gap"] = max(counts["gap"], counts["yielded"] - counts["done"])
+                yield path
+
+        def counted_compress(*args):
+            result = compress_file(*args)
+            with lock:
+                counts["done"] += 1
+            return result
+
+        with mock.patch.object(compress, "iter_compressible", counted_walk), \
+                mock.patch.object(compress, "compress_file", counted_compress):
+            written, _ = precompress_tree(self.root, workers=2)
+        self.assertEqual(written, 41 * len(available_encoders()))
+        self.assertLessEqual(counts["gap"], 2 * QUEUED_PER_WORKER)
+
+    def test_incompressible_data_not_kept(self):
+        path = self.write("random.txt", "")
+        with open(path, "wb") as f:
+            f.write(os.urandom(4096))
+        written, _ = compress_file(path, {".gz": available_encoders()[".gz"]})
+        self.assertEqual(written, 0)
+        self.assertFalse(os.path.exists(path + ".gz"))
+
+    def test_incompressible_data_is_not_compressed_again(self):
+        path = self.write("random.txt", "")
+        with open(path, "wb") as f:
+            f.write(os.urandom(4096))
+        skips_path = os.path.join(self.root, "state", "precompress-skips.json")
+        count = len(available_encoders())
+        precompress_tree(self.root, skips_path=skips_path)
+        self.assertEqual(precompress_tree(self.root, skips_path=skips_path), (0, 2 * count))
+        # Without the record it has no sibling to go by and is compressed again
+        self.assertEqual(precompress_tree(self.root), (0, count))
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(precompress_tree(self.root, skips_path=skips_path), (0, count))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+import os
+import tempfile
+import unittest
+from costs import PageCosts
+
+class TestPageCosts(unittest.TestCase):
+    def test_estimate_without_history_uses_sizes(self):
+        self.assertEqual(PageCosts().estimate({"a.md": 10, "b.md": 30}), {"a.md": 10, "b.md": 30})
+
+    def test_estimate_scales_sizes_by_history(self):
+        costs = PageCosts()
+        costs.record("a.md", 2.0)
+        costs.record("gone.md", 50.0)
+        self.assertEqual(costs.estimate({"a.md": 100, "b.md": 300}), {"a.md": 2.0, "b.md": 6.0})
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "state", "costs.json")
+            costs = PageCosts(path)
+            costs.record("a.md", 0.5)
+            costs.save()
+            self.assertEqual(PageCosts(path).seconds, {"a.md": 0.5})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+from critical import CriticalCSS, parse_rules, selector_may_match, select_rules
+from htmlnode import LeafNode, ParentNode
+from pages import compile_template, render_page
+
+CSS = """
+@import url("fonts.css");
+/* comment { with braces } */
+body { margin: 0; }
+pre code, code.language-python { padding : 0 ; }
+blockquote:hover::before { content: ""; }
+@keyframes spin { from { opacity: 0; } to { opacity: 1; } }
+@media (max-width: 600px) { pre { overflow: auto; } nav a { display: block; } }
+table td { border: 1px solid; }
+"""
+
+class TestParseRules(unittest.TestCase):
+    def test_rules_and_at_rules(self):
+        self.assertEqual(parse_rules(CSS), [
+            ['@import url("fonts.css")', None],
+            [["body"], "margin:0"],
+            [["pre code", "code.language-python"], "padding:0"],
+            [["blockquote:hover::before"], 'content:""'],
+            ["@media (max-width: 600px)", [[["pre"], "overflow:auto"], [["nav a"], "display:block"]]],
+            [["table td"], "border:1px solid"],
+        ])
+
+    def test_selector_may_match(self):
+        tags, classes = {"pre", "code", "blockquote"}, {"language-python"}
+        self.assertTrue(selector_may_match("pre > code", tags, classes, set()))
+        self.assertTrue(selector_may_match("code.language-python", tags, classes, set()))
+        self.assertTrue(selector_may_match("blockquote:not(.x)::after", tags, classes, set()))
+        self.assertTrue(selector_may_match("*[lang]", tags, classes, set()))
+        self.assertFalse(selector_may_match("code.language-go", tags, classes, set()))
+        self.assertFalse(selector_may_match("table td", tags, classes, set()))
+        self.assertFalse(selector_may_match("#top", tags, classes, set()))
+
+    def test_select_rules_keeps_matching_selectors(self):
+        css = select_rules(parse_rules(CSS), {"body", "pre", "code"}, set(), set())
+        self.assertEqual(css, '@import url("fonts.css");body{margin:0}pre code{padding:0}'
+                              '@media (max-width: 600px){pre{overflow:auto}}')
+
+    def test_relative_urls_are_rebased_against_the_stylesheet(self):
+        css = """
+        @import "parts/more.css" screen;
+        body { background: url(bg.png) }
+        h1 { background: url( '../img/h.svg' ) }
+        a { background: url(/abs.png), url(data:image/png;base64,x), url(#icon) }
+        """
+        self.assertEqual(parse_rules(css, "/css/site.css"), [
+            ['@import "/css/parts/more.css" screen', None],
+            [["body"], "background:url(/css/bg.png)"],
+            [["h1"], "background:url('/img/h.svg')"],
+            [["a"], "background:url(/abs.png), url(data:image/png;base64,x), url(#icon)"],
+        ])
+        # @import must come first even after rules of an earlier stylesheet
+        rules = parse_rules("p { color: red }") + parse_rules(css, "/css/site.css")
+        self.assertTrue(select_rules(rules, {"p"}, set(), set()).startswith(
+            '@import "/css/parts/more.css" screen;p{color:red}'))
+
+class TestCriticalCSS(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static_dir = os.path.join(self.tmp.name, "static")
+        os.makedirs(self.static_dir)
+        with open(os.path.join(self.static_dir, "index.css"), "w") as f:
+            f.write(CSS)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_selected_once_per_tag_set(self):
+        critical = CriticalCSS([os.path.join(self.static_dir, "index.css")], "<body></body>")
+        first = critical.style_for(ParentNode("div", [LeafNode("pre", "x")]))
+        second = critical.style_for(ParentNode("div", [LeafNode("pre", "y"), LeafNode("pre", "z")]))
+        self.assertEqual(first, '<style>@import url("fonts.css");body{margin:0}'
+                                '@media (max-width: 600px){pre{overflow:auto}}</style>')
+        self.assertIs(first, second)
+        self.assertEqual((critical.misses, critical.hits), (1, 1))
+        self.assertIn("table td", critical.style_for())
+
+    def test_parsed_stylesheet_is_cached(self):
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        path = os.path.join(self.static_dir, "index.css")
+        rules = CriticalCSS([path], cache_dir=cache_dir).rules
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        self.assertEqual(CriticalCSS([path], cache_dir=cache_dir).rules, rules)
+
+    def test_template_inlines_and_loads_stylesheet_async(self):
+        template_path = os.path.join(self.tmp.name, "template.html")
+        with open(template_path, "w") as f:
+            f.write('<head><link href="/index.css" rel="stylesheet"></head><body>{{ Content }}</body>')
+        template = compile_template(template_path, {"index.css": "index.1a2b.css"}, critical_css=self.static_dir)
+        html = "".join(render_page("# Hi\n\n```\ncode\n```", template).iter_chunks())
+        self.assertIn('<head><style>@import url("/fonts.css");body{margin:0}pre code{padding:0}', html)
+        self.assertIn('<link rel="preload" href="/index.1a2b.css" as="style"', html)
+        self.assertIn('<noscript><link rel="stylesheet" href="/index.1a2b.css"></noscript>', html)
+        self.assertNotIn('href="/index.css"', html)
+
+    def test_without_critical_css_the_template_is_unchanged(self):
+        template_path = os.path.join(self.tmp.name, "template.html")
+        with open(template_path, "w") as f:
+            f.write('<link href="/index.css" rel="stylesheet">{{ CriticalCSS }}')
+        template = compile_template(template_path)
+        self.assertIsNone(template.critical)
+        self.assertEqual("".join(render_page("# Hi", template).iter_chunks()), '<link href="/index.css" rel="stylesheet">')
+
+if __name__ == "__main__":
+    unittest.main()
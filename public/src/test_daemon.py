@@ -0,0 +1,173 @@
+import contextlib
+import io
+import os
+import re
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from client import main as client_main, request
+from daemon import Builder, DaemonServer
+
+class TestBuilder(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content_dir = os.path.join(root, "content")
+        self.static_dir = os.path.join(root, "static")
+        self.public_dir = os.path.join(root, "public")
+        os.makedirs(os.path.join(self.content_dir, "blog"))
+        os.makedirs(self.static_dir)
+        self.template_path = os.path.join(root, "template.html")
+        self.write(self.template_path, "<title>{{ Title }}</title>{{ Content }}")
+        self.write(os.path.join(self.content_dir, "index.md"), "# Home")
+        self.write(os.path.join(self.content_dir, "blog", "post.md"), "# Post")
+        self.write(os.path.join(self.static_dir, "index.css"), "body{}")
+        self.builder = Builder(self.content_dir, self.template_path, self.static_dir,
+                               self.public_dir, os.path.join(root, "state"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, content):
+        existed = os.path.exists(path)
+        with open(path, "w") as f:
+            f.write(content)
+        if existed:
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def read(self, rel_path):
+        with open(os.path.join(self.public_dir, rel_path)) as f:
+            return f.read()
+
+    def test_incremental_rebuilds(self):
+        summary = self.builder.build()
+        self.assertEqual((summary["pages rendered"], summary["assets copied"]), (2, 1))
+        self.assertEqual(self.read("blog/post/index.html"), "<title>Post</title><div><h1>Post</h1></div>")
+
+        summary = self.builder.build()
+        self.assertEqual((summary["pages rendered"], summary["pages unchanged"], summary["assets copied"]), (0, 2, 0))
+
+        self.write(os.path.join(self.content_dir, "blog", "post.md"), "# Edited")
+        summary = self.builder.build()
+        self.assertEqual((summary["pages rendered"], summary["pages unchanged"]), (1, 1))
+        self.assertIn("Edited", self.read("blog/post/index.html"))
+
+    def test_template_change_rebuilds_everything(self):
+        self.builder.build()
+        self.write(self.template_path, "<h>{{ Title }}</h>{{ Content }}")
+        self.assertEqual(self.builder.build()["pages rendered"], 2)
+
+    def test_removed_source_removes_output(self):
+        self.builder.build()
+        os.remove(os.path.join(self.content_dir, "blog", "post.md"))
+        self.assertEqual(self.builder.build()["pages removed"], 1)
+        self.assertFalse(os.path.exists(os.path.join(self.public_dir, "blog", "post")))
+
+    def test_removed_source_removes_page_data_and_siblings(self):
+        builder = Builder(self.content_dir, self.template_path, self.static_dir, self.public_dir,
+                          os.path.join(self.tmp.name, "state"), precompress=True, page_data=True)
+        self.write(os.path.join(self.content_dir, "blog", "post.md"), "# Post\n\n" + "Long text. " * 200)
+        builder.build()
+        post_dir = os.path.join(self.public_dir, "blog", "post")
+        self.assertTrue(os.path.exists(os.path.join(post_dir, "index.html.gz")))
+        os.remove(os.path.join(self.content_dir, "blog", "post.md"))
+        builder.build()
+        self.assertFalse(os.path.exists(post_dir))
+
+    def test_asset_copy_does_not_write_through_hardlinks(self):
+        self.builder.build()
+        asset = os.path.join(self.public_dir, "index.css")
+        retained = os.path.join(self.tmp.name, "retained.css")
+        os.link(asset, retained)
+        self.write(os.path.join(self.static_dir, "index.css"), "body{color:red}")
+        self.builder.build()
+        self.assertEqual(self.read("index.css"), "body{color:red}")
+        with open(retained) as f:
+            self.assertEqual(f.read(), "body{}")
+
+    def test_build_single_path(self):
+        self.builder.build()
+        self.write(os.path.join(self.content_dir, "index.md"), "# Changed")
+        summary = self.builder.build("index.md")
+        self.assertEqual(summary["pages rendered"], 1)
+        self.assertIn("Changed", self.read("index.html"))
+        self.assertEqual(self.builder.build("index.css")["assets copied"], 1)
+        with self.assertRaises(ValueError):
+            self.builder.build("missing.txt")
+        with self.assertRaises(ValueError):
+            self.builder.build("missing.md")
+        self.assertTrue(os.path.exists(os.path.join(self.public_dir, "index.html")))
+
+    def test_fingerprinted_asset_edit_rewrites_every_page(self):
+        self.write(self.template_path, '<link rel="stylesheet" href="/index.css">{{ Content }}')
+        builder = Builder(self.content_dir, self.template_path, self.static_dir, self.public_dir,
+                          os.path.join(self.tmp.name, "state"), fingerprint=True)
+        builder.build()
+        self.write(os.path.join(self.static_dir, "index.css"), "body{color:red}")
+        summary = builder.build(os.path.join(self.static_dir, "index.css"))
+        self.assertEqual(summary["pages rendered"], 2)
+        hashed = builder.manifest["index.css"]
+        for rel_path in ("index.html", "blog/post/index.html"):
+            self.assertEqual(re.findall(r'href="/([^"]*)"', self.read(rel_path)), [hashed])
+        self.assertTrue(os.path.exists(os.path.join(self.public_dir, hashed)))
+
+    def test_prefetch_and_service_worker(self):
+        self.write(self.template_path, '<head><link rel="stylesheet" href="/index.css"></head>{{ Content }}')
+        self.write(os.path.join(self.content_dir, "index.md"), "# Home\n\n[post](/blog/post/)")
+        builder = Builder(self.content_dir, self.template_path, self.static_dir, self.public_dir,
+                          os.path.join(self.tmp.name, "state"), prefetch=2, service_worker=True)
+        builder.build()
+        html = self.read("index.html")
+        self.assertIn('<link rel="prefetch" href="/blog/post/">', html)
+        self.assertIn('register("/sw.js")', html)
+        self.assertIn('"url": "/index.css"', self.read("precache-manifest.json"))
+        worker = self.read("sw.js")
+        self.write(os.path.join(self.static_dir, "index.css"), "body{color:red}")
+        builder.build()
+        self.assertNotEqual(self.read("sw.js"), worker)
+
+    def test_page_data(self):
+        builder = Builder(self.content_dir, self.template_path, self.static_dir, self.public_dir,
+                          os.path.join(self.tmp.name, "state"), page_data=True)
+        builder.build()
+        self.assertIn('"title":"Post"', self.read("blog/post/page.json"))
+        self.assertIn("page.json", self.read("nav.js"))
+
+    def test_socket_protocol(self):
+        socket_path = os.path.join(self.tmp.name, "d.sock")
+        server = DaemonServer(socket_path, self.builder)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            reply = request("build", socket_path)
+            self.assertTrue(reply["ok"])
+            self.assertEqual(reply["result"]["pages rendered"], 2)
+            reply = request("status", socket_path)
+            self.assertEqual(reply["result"]["builds"], 1)
+            self.assertFalse(request("build missing.txt", socket_path)["ok"])
+            self.assertFalse(request("frobnicate", socket_path)["ok"])
+            # The client resolves paths against its own working directory
+            self.write(os.path.join(self.content_dir, "blog", "post.md"), "# Edited")
+            out = io.StringIO()
+            with mock.patch.dict(os.environ, {"SSG_DAEMON_SOCKET": socket_path}), \
+                    contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+                cwd = os.getcwd()
+                os.chdir(self.content_dir)
+                try:
+                    self.assertEqual(client_main(["build", os.path.join("blog", "post.md")]), 0)
+                    self.assertEqual(client_main(["build", "nothing.md"]), 1)
+                finally:
+                    os.chdir(cwd)
+            self.assertIn('"pages rendered": 1', out.getvalue())
+            self.assertIn("Edited", self.read("blog/post/index.html"))
+            self.assertEqual(request("stop", socket_path)["result"], "stopping")
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+        finally:
+            server.server_close()
+        self.assertFalse(os.path.exists(socket_path))
+
+if __name__ == "__main__":
+    unittest.main()
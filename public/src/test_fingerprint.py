@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from fingerprint import (
+    FingerprintCache,
+    build_manifest,
+    fingerprinted_name,
+    hash_file,
+    rewrite_references,
+    rewrite_template,
+    rewrite_url,
+    write_headers_file,
+)
+from markdown import markdown_to_html_node
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static_dir = os.path.join(self.tmp.name, "static")
+        os.makedirs(os.path.join(self.static_dir, "images"))
+        self.write("index.css", "body {}")
+        self.write("images/a.png", "png")
+        self.cache_path = os.path.join(self.tmp.name, "state", "fingerprints.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, content):
+        with open(os.path.join(self.static_dir, rel_path), "w") as f:
+            f.write(content)
+
+    def test_fingerprinted_name(self):
+        self.assertEqual(fingerprinted_name("a/b.css", "1a2b3c4d5e"), "a/b.1a2b3c4d.css")
+        self.assertEqual(fingerprinted_name("LICENSE", "1a2b3c4d5e"), "LICENSE.1a2b3c4d")
+
+    def test_manifest_uses_content_hash(self):
+        manifest = build_manifest(self.static_dir, FingerprintCache())
+        digest = hash_file(os.path.join(self.static_dir, "index.css"))
+        self.assertEqual(manifest["index.css"], f"index.{digest[:8]}.css")
+        self.assertTrue(manifest["images/a.png"].startswith("images/a."))
+
+    def test_cache_skips_unchanged_files(self):
+        cache = FingerprintCache(self.cache_path)
+        build_manifest(self.static_dir, cache)
+        cache.save()
+        self.assertEqual(cache.hashed, 2)
+
+        cache = FingerprintCache(self.cache_path)
+        build_manifest(self.static_dir, cache)
+        self.assertEqual(cache.hashed, 0)
+
+        self.write("index.css", "body { color: red }")
+        build_manifest(self.static_dir, cache)
+        self.assertEqual(cache.hashed, 1)
+
+    def test_save_drops_removed_files(self):
+        cache = FingerprintCache(self.cache_path)
+        build_manifest(self.static_dir, cache)
+        cache.save()
+        os.remove(os.path.join(self.static_dir, "images", "a.png"))
+        cache.save()
+        self.assertEqual(list(FingerprintCache(self.cache_path).entries),
+                         [os.path.abspath(os.path.join(self.static_dir, "index.css"))])
+
+    def test_rewrite_url(self):
+        manifest = {"images/a.png": "images/a.12345678.png"}
+        self.assertEqual(rewrite_url("/images/a.png?x=1#y", manifest), "/images/a.12345678.png?x=1#y")
+        self.assertEqual(rewrite_url("a.png", manifest, "/images/"), "/images/a.12345678.png")
+        self.assertEqual(rewrite_url("/other.png", manifest), "/other.png")
+        self.assertEqual(rewrite_url("https://x.com/images/a.png", manifest), "https://x.com/images/a.png")
+
+    def test_rewrite_url_encodes_the_path(self):
+        manifest = {"img dir/a b.png": "img dir/a b.72945f7e.png"}
+        self.assertEqual(rewrite_url("img%20dir/a%20b.png", manifest), "/img%20dir/a%20b.72945f7e.png")
+
+    def test_rewrite_references_and_template(self):
+        manifest = {"images/a.png": "images/a.12345678.png", "index.css": "index.87654321.css"}
+        node = markdown_to_html_node("![alt](/images/a.png) and [home](/)")
+        rewrite_references(node, manifest)
+        self.assertIn('src="/images/a.12345678.png"', node.to_html())
+        self.assertIn('href="/"', node.to_html())
+        template = '<link href="/index.css" rel="stylesheet">'
+        self.assertEqual(rewrite_template(template, manifest), '<link href="/index.87654321.css" rel="stylesheet">')
+
+    def test_headers_file(self):
+        path = os.path.join(self.tmp.name, "_headers")
+        write_headers_file(path, ["index.87654321.css"])
+        with open(path) as f:
+            self.assertEqual(
+                f.read(),
+                "/index.87654321.css\n  Cache-Control: public, max-age=31536000, immutable\n",
+            )
+
+if __name__ == "__main__":
+    unittest.main()
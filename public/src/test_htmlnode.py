@@ -156,5 +156,23 @@ class TestParentNode(unittest.TestCase):
             ParentNode("div", None)
         self.assertEqual(str(context.exception), "ParentNode must have children")
 
+    def test_iter_html_matches_to_html(self):
+        # Test that streamed chunks join to the same HTML, with tags and text split
+        node = ParentNode(
+            "p",
+            [
+                LeafNode("b", "Bold"),
+                LeafNode(None, " and "),
+                LeafNode("img", "", {"src": "a.png"}),
+            ],
+            {"class": "x"}
+        )
+        chunks = list(node.iter_html())
+        self.assertEqual("".join(chunks), node.to_html())
+        self.assertEqual(
+            chunks,
+            ['<p class="x">', "<b>", "Bold", "</b>", " and ", '<img src="a.png">', "</p>"]
+        )
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,92 @@
+import os
+import struct
+import tempfile
+import unittest
+from fingerprint import FingerprintCache
+from htmlnode import LeafNode, ParentNode
+from images import ImageSizes, image_size, size_images
+from pages import compile_template, render_page
+
+def png(width, height):
+    return b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + struct.pack(">II", width, height) + b"\x08\x06\x00\x00\x00"
+
+def jpeg(width, height):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + bytes(9)
+    frame = b"\xff\xc2" + struct.pack(">HBHHB", 11, 8, height, width, 1) + bytes(3)
+    return b"\xff\xd8" + app0 + b"\xff\xff" + frame + b"\xff\xd9"
+
+HEADERS = {
+    "a.png": (png(640, 480), (640, 480)),
+    "b.gif": (b"GIF89a" + struct.pack("<HH", 16, 9) + bytes(10), (16, 9)),
+    "c.jpg": (jpeg(1920, 1080), (1920, 1080)),
+    "d.webp": (b"RIFF\x00\x00\x00\x00WEBPVP8X\x0a\x00\x00\x00\x00\x00\x00\x00"
+               + (299).to_bytes(3, "little") + (199).to_bytes(3, "little"), (300, 200)),
+    "e.webp": (b"RIFF\x00\x00\x00\x00WEBPVP8L\x00\x00\x00\x00\x2f"
+               + struct.pack("<I", (100 - 1) | ((50 - 1) << 14)), (100, 50)),
+    "f.webp": (b"RIFF\x00\x00\x00\x00WEBPVP8 \x00\x00\x00\x00\x00\x00\x00\x9d\x01\x2a"
+               + struct.pack("<HH", 320, 240), (320, 240)),
+    "g.png": (b"not an image", None),
+}
+
+class TestImageSize(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static_dir = os.path.join(self.tmp.name, "static")
+        os.makedirs(os.path.join(self.static_dir, "images"))
+        for name, (data, _) in HEADERS.items():
+            with open(os.path.join(self.static_dir, "images", name), "wb") as f:
+                f.write(data)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_formats(self):
+        for name, (_, size) in HEADERS.items():
+            self.assertEqual(image_size(os.path.join(self.static_dir, "images", name)), size, name)
+
+    def test_scan_reads_each_distinct_image_once(self):
+        cache_path = os.path.join(self.tmp.name, "state", "image-sizes.json")
+        with open(os.path.join(self.static_dir, "copy.png"), "wb") as f:
+            f.write(HEADERS["a.png"][0])
+        image_sizes = ImageSizes(cache_path)
+        sizes = image_sizes.scan(self.static_dir, FingerprintCache())
+        self.assertEqual(sizes["images/a.png"], (640, 480))
+        self.assertEqual(sizes["copy.png"], (640, 480))
+        self.assertNotIn("images/g.png", sizes)
+        self.assertEqual(image_sizes.read, len(HEADERS))
+        image_sizes.save()
+        again = ImageSizes(cache_path)
+        self.assertEqual(again.scan(self.static_dir, FingerprintCache()), sizes)
+        self.assertEqual(again.read, 0)
+
+class TestSizeImages(unittest.TestCase):
+    def test_attributes(self):
+        first = LeafNode("img", "", {"src": "a.png", "alt": "a"})
+        second = LeafNode("img", "", {"src": "/images/b.gif", "alt": "b", "loading": "eager"})
+        external = LeafNode("img", "", {"src": "https://example.com/c.png", "alt": "c"})
+        tree = ParentNode("div", [ParentNode("p", [first]), ParentNode("p", [second, external])])
+        sizes = {"blog/a.png": (640, 480), "images/b.gif": (16, 9)}
+        self.assertTrue(size_images(tree, sizes, "/blog/"))
+        self.assertEqual(first.props, {"src": "a.png", "alt": "a", "width": "640", "height": "480",
+                                       "decoding": "async"})
+        self.assertEqual(second.props["loading"], "eager")
+        self.assertEqual((second.props["width"], second.props["height"]), ("16", "9"))
+        self.assertEqual(external.props, {"src": "https://example.com/c.png", "alt": "c", "loading": "lazy",
+                                          "decoding": "async"})
+        self.assertFalse(size_images(ParentNode("p", [LeafNode(None, "text")]), sizes))
+
+    def test_rendered_page(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            template_path = os.path.join(tmp, "template.html")
+            with open(template_path, "w") as f:
+                f.write("{{ Content }}")
+            manifest = {"images/a.png": "images/a.1a2b.png"}
+            template = compile_template(template_path, manifest, images={"images/a.png": (640, 480)})
+            page = render_page("# T\n\n![a](/images/a.png)\n\n![b](/images/a.png)", template, manifest)
+            html = "".join(page.iter_chunks())
+        self.assertIn('<img src="/images/a.1a2b.png" alt="a" width="640" height="480" decoding="async">', html)
+        self.assertIn('alt="b" width="640" height="480" loading="lazy" decoding="async">', html)
+        self.assertEqual(page.references, ["/images/a.png", "/images/a.png"])
+
+if __name__ == "__main__":
+    unittest.main()
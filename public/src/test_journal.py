@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+from journal import BuildJournal, options_digest, resumable_generation
+from main import generate_pages_recursive
+from outputs import OutputWriter
+from report import BuildReport
+
+class TestBuildJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content_dir = os.path.join(self.tmp.name, "content")
+        self.out_dir = os.path.join(self.tmp.name, "public")
+        self.journal_path = os.path.join(self.tmp.name, "state", "build-journal.jsonl")
+        self.template_path = os.path.join(self.tmp.name, "template.html")
+        with open(self.template_path, "w") as f:
+            f.write("<title>{{ Title }}</title>{{ Content }}")
+        self.options = options_digest([self.template_path], None, False)
+        for name in ("index", "a", "b"):
+            self.write(os.path.join(self.content_dir, f"{name}.md"), f"# {name}\n\n![logo](/images/logo.png)")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def build(self, resume, report=None, writer=None):
+        journal = BuildJournal(self.journal_path, self.out_dir, self.options, resume)
+        try:
+            return generate_pages_recursive(self.content_dir, self.template_path, self.out_dir, report=report,
+                                            writer=writer, journal=journal)
+        finally:
+            journal.close()
+
+    def output(self, name):
+        return os.path.join(self.out_dir, name, "index.html")
+
+    def test_resume_skips_finished_pages(self):
+        self.build(resume=False)
+        os.remove(self.output("a"))
+        self.write(os.path.join(self.content_dir, "b.md"), "# b changed")
+        report = BuildReport()
+        references = self.build(resume=True, report=report)
+        self.assertEqual(report.counters["pages resumed"], 1)
+        self.assertEqual(report.counters["pages built"], 2)
+        self.assertTrue(os.path.exists(self.output("a")))
+        with open(self.output("b")) as f:
+            self.assertIn("b changed", f.read())
+        self.assertEqual(references, {"images/logo.png"})
+
+    def test_resumed_pages_are_recorded_in_output_hashes(self):
+        self.build(resume=False)
+        writer = OutputWriter(self.out_dir, hashes_path=os.path.join(self.tmp.name, "state", "output-hashes.json"))
+        os.remove(self.output("a"))
+        self.build(resume=True, writer=writer)
+        self.assertEqual(sorted(writer.hashes), ["a/index.html", "b/index.html", "index.html"])
+        self.assertEqual(writer.written, 1)
+
+    def test_tampered_output_is_rebuilt(self):
+        self.build(resume=False)
+        self.write(self.output("a"), "truncated")
+        report = BuildReport()
+        self.build(resume=True, report=report)
+        self.assertEqual((report.counters["pages resumed"], report.counters["pages built"]), (2, 1))
+
+    def test_without_resume_everything_is_rebuilt(self):
+        self.build(resume=False)
+        report = BuildReport()
+        self.build(resume=False, report=report)
+        self.assertNotIn("pages resumed", report.counters)
+        self.assertEqual(report.counters["pages built"], 3)
+
+    def test_other_options_are_not_resumed(self):
+        self.build(resume=False)
+        self.options = options_digest([self.template_path], None, True)
+        report = BuildReport()
+        self.build(resume=True, report=report)
+        self.assertEqual(report.counters["pages built"], 3)
+
+    def test_cut_short_line_is_dropped(self):
+        self.build(resume=False)
+        with open(self.journal_path, "a") as f:
+            f.write('{"source": "x.md", "sour')
+        journal = BuildJournal(self.journal_path, self.out_dir, self.options, resume=True)
+        journal.close()
+        self.assertEqual(len(journal.entries), 3)
+        with open(self.journal_path) as f:
+            self.assertTrue(f.read().endswith("}\n"))
+
+    def test_resumable_generation(self):
+        self.assertIsNone(resumable_generation(self.journal_path, None))
+        BuildJournal(self.journal_path, self.out_dir, self.options).close()
+        self.assertIsNone(resumable_generation(self.journal_path, None))
+        os.makedirs(self.out_dir)
+        self.assertEqual(resumable_generation(self.journal_path, None), self.out_dir)
+        self.assertIsNone(resumable_generation(self.journal_path, self.out_dir))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from largefile import LARGE_FILE_BYTES, LargePage, find_title, iter_lines, load_page, output_page
+from pages import RenderedPage, render_html, render_page
+from template import Template
+
+SOURCE = """# Big   reference
+
+Intro with **bold**, a [link](other/) and ![img](img.png).
+
+```python
+x = 1
+
+y = 2
+```
+
+* one
+* two
+
+> quoted
+"""
+
+class TestLargeFile(unittest.TestCase):
+    def test_iter_lines(self):
+        self.assertEqual(list(iter_lines(b"a\r\nb\n\nc")), ["a", "b", "", "c"])
+        self.assertEqual(list(iter_lines("é\n".encode())), ["é"])
+        self.assertEqual(list(iter_lines(b"")), [])
+
+    def test_find_title(self):
+        self.assertEqual(find_title(["intro", "  # Title  "]), "Title")
+        with self.assertRaises(ValueError):
+            find_title(["## Not a title"])
+
+    def test_matches_regular_rendering(self):
+        template = Template("<title>{{ Title }}</title>\n<main>  {{ Content }}  </main>", minify=True)
+        manifest = {"docs/img.png": "docs/img.1234.png"}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "big.md")
+            with open(path, "w") as f:
+                f.write(SOURCE)
+            large = LargePage(path, template, manifest, "/docs/", minify=True)
+            html = "".join(large.iter_chunks())
+        regular = render_page(SOURCE, template, manifest, "/docs/", minify=True)
+        self.assertEqual(html, render_html(regular))
+        self.assertIn('src="/docs/img.1234.png"', html)
+        self.assertEqual(large.title, "Big   reference")
+        self.assertEqual(large.references, regular.references)
+        self.assertEqual(large.saved, regular.saved)
+        self.assertTrue(large.text.startswith("Big reference Intro with bold"))
+
+    def test_crlf_renders_like_lf(self):
+        template = Template("{{ Content }}")
+        crlf = SOURCE.replace("\n", "\r\n")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "big.md")
+            with open(path, "w", newline="") as f:
+                f.write(crlf)
+            html = "".join(LargePage(path, template).iter_chunks())
+        self.assertNotIn("\r", html)
+        self.assertEqual(html, render_html(render_page(crlf, template)))
+        self.assertEqual(html, render_html(render_page(SOURCE, template)))
+
+    def test_load_page_maps_large_sources(self):
+        template = Template("{{ Content }}")
+        with tempfile.TemporaryDirectory() as tmp:
+            small = os.path.join(tmp, "small.md")
+            big = os.path.join(tmp, "big.md")
+            with open(small, "w") as f:
+                f.write(SOURCE)
+            with open(big, "w") as f:
+                f.write(SOURCE * (LARGE_FILE_BYTES // len(SOURCE) + 1))
+            self.assertIsInstance(load_page(small, template), RenderedPage)
+            page = load_page(big, template)
+            self.assertIsInstance(page, LargePage)
+            dest_path = os.path.join(tmp, "out", "index.html")
+            output_page(page, dest_path)
+            with open(dest_path) as f:
+                self.assertTrue(f.read().startswith("<div><h1>Big   reference</h1>"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from largefile import LARGE_FILE_BYTES
+from livereload import LiveSite, diff_blocks, inject_script
+
+class TestDiffBlocks(unittest.TestCase):
+    def test_no_changes(self):
+        self.assertEqual(diff_blocks(["<p>a</p>", "<p>b</p>"], ["<p>a</p>", "<p>b</p>"]), [])
+
+    def test_replace_insert_delete(self):
+        old = ["<h1>t</h1>", "<p>a</p>", "<p>b</p>", "<p>c</p>"]
+        new = ["<h1>t</h1>", "<p>A</p>", "<p>b</p>", "<p>new</p>", "<p>c</p>"]
+        self.assertEqual(
+            diff_blocks(old, new),
+            [
+                {"start": 1, "end": 2, "html": ["<p>A</p>"]},
+                {"start": 3, "end": 3, "html": ["<p>new</p>"]},
+            ],
+        )
+        self.assertEqual(diff_blocks(old, old[:2]), [{"start": 2, "end": 4, "html": []}])
+
+    def test_applying_ops_in_reverse_reproduces_new(self):
+        old = ["a", "b", "c", "d", "e"]
+        new = ["a", "x", "c", "e", "f"]
+        blocks = list(old)
+        for op in reversed(diff_blocks(old, new)):
+            blocks[op["start"]:op["end"]] = op["html"]
+        self.assertEqual(blocks, new)
+
+class TestInjectScript(unittest.TestCase):
+    def test_before_body_end(self):
+        html = inject_script("<body><p>x</p></body></html>")
+        self.assertTrue(html.endswith("</script></body></html>"))
+        self.assertIn("EventSource", html)
+
+class TestLiveSite(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content_dir = os.path.join(self.tmp.name, "content")
+        os.makedirs(self.content_dir)
+        self.template_path = os.path.join(self.tmp.name, "template.html")
+        self.write(self.template_path, "<title>{{ Title }}</title><body>{{ Content }}</body>")
+        self.source = os.path.join(self.content_dir, "index.md")
+        self.write(self.source, "# Title\n\nFirst\n\nSecond")
+        self.site = LiveSite(self.content_dir, self.template_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, content):
+        with open(path, "w") as f:
+            f.write(content)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_rerender_publishes_block_patch(self):
+        data, _, _ = self.site.get("/")
+        self.assertIn(b'<div data-live-root="1">', data)
+        events = self.site.subscribe("index.md")
+        self.write(self.source, "# New title\n\nFirst\n\nChanged")
+        data, _, _ = self.site.get("/")
+        self.assertIn(b'data-live-root="2"', data)
+        patch = json.loads(events.get_nowait())
+        self.assertEqual(patch["from"], 1)
+        self.assertEqual(patch["to"], 2)
+        self.assertEqual(patch["title"], "New title")
+        self.assertEqual(
+            patch["ops"],
+            [
+                {"start": 0, "end": 1, "html": ["<h1>New title</h1>"]},
+                {"start": 2, "end": 3, "html": ["<p>Changed</p>"]},
+            ],
+        )
+
+    def test_template_change_asks_for_reload(self):
+        self.site.get("/")
+        events = self.site.subscribe("index.md")
+        self.write(self.template_path, "<body>{{ Content }}</body>")
+        self.site.get("/")
+        self.assertEqual(json.loads(events.get_nowait()), {"reload": True})
+
+    def test_large_source_asks_for_reload(self):
+        self.write(self.source, "# Big\n\n" + "Paragraph text.\n\n" * (LARGE_FILE_BYTES // 17 + 1))
+        data, _, _ = self.site.get("/")
+        self.assertIn(b'<template data-live-root="1"></template><script>', data)
+        self.assertIn(b"<title>Big</title>", data)
+        events = self.site.subscribe("index.md")
+        self.write(self.source, "# Small\n\nFirst")
+        data, _, _ = self.site.get("/")
+        self.assertIn(b'<div data-live-root="2">', data)
+        self.assertEqual(json.loads(events.get_nowait()), {"reload": True})
+
+    def test_watcher_survives_failed_renders(self):
+        self.site.get("/")
+        self.site.subscribe("index.md")
+        failures = []
+
+        def fail(rel_source, template):
+            failures.append(rel_source)
+            raise AttributeError("broken page")
+
+        self.site.render_page = fail
+        stop = threading.Event()
+        watcher = threading.Thread(target=self.site.watch, args=(stop, 0.001))
+        watcher.start()
+        try:
+            with self.assertLogs(level="WARNING"):
+                self.write(self.source, "# Changed")
+                deadline = time.monotonic() + 5
+                while len(failures) < 2 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+            self.assertTrue(watcher.is_alive())
+            self.assertGreaterEqual(len(failures), 2)
+        finally:
+            stop.set()
+            watcher.join()
+
+    def test_unsubscribe(self):
+        events = self.site.subscribe("index.md")
+        self.site.unsubscribe("index.md", events)
+        self.assertEqual(self.site.subscribers, {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import http.client
+import os
+import tempfile
+import threading
+import unittest
+from metrics import REGISTRY, Histogram, Registry, max_resident_memory_bytes, resident_memory_bytes
+from server import StaticServer
+
+class TestMetrics(unittest.TestCase):
+    def test_counter_exposition(self):
+        registry = Registry()
+        counter = registry.counter("hits_total", "Hits.", ("cache",))
+        counter.inc(cache="page")
+        counter.inc(2, cache="page")
+        counter.inc(cache='a"b')
+        self.assertEqual(counter.get(cache="page"), 3)
+        self.assertEqual(
+            registry.render(),
+            '# HELP hits_total Hits.\n'
+            '# TYPE hits_total counter\n'
+            'hits_total{cache="a\\"b"} 1\n'
+            'hits_total{cache="page"} 3\n',
+        )
+
+    def test_unlabeled_counter_starts_at_zero(self):
+        registry = Registry()
+        counter = registry.counter("builds_total", "Builds.")
+        registry.counter("hits_total", "Hits.", ("cache",))
+        self.assertIn("\nbuilds_total 0\n", registry.render())
+        self.assertNotIn("\nhits_total", registry.render())
+        counter.inc()
+        self.assertIn("\nbuilds_total 1\n", registry.render())
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5.0)
+        samples = [(name + labels, value) for name, labels, value in histogram.samples()]
+        self.assertEqual(samples, [
+            ('latency_seconds_bucket{le="0.1"}', 1),
+            ('latency_seconds_bucket{le="1"}', 2),
+            ('latency_seconds_bucket{le="+Inf"}', 3),
+            ("latency_seconds_sum", 5.55),
+            ("latency_seconds_count", 3),
+        ])
+
+    def test_histogram_time(self):
+        histogram = Histogram("stage_seconds", "Stages.", ("stage",))
+        with histogram.time(stage="parse"):
+            pass
+        self.assertEqual(list(histogram.samples())[-1], ("stage_seconds_count", '{stage="parse"}', 1))
+
+    def test_process_gauges(self):
+        text = REGISTRY.render()
+        self.assertIn("process_max_resident_memory_bytes ", text)
+        self.assertIn("process_start_time_seconds ", text)
+        self.assertGreaterEqual(max_resident_memory_bytes(), resident_memory_bytes() or 0)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmp.name, "index.html"), "w") as f:
+            f.write("<p>hi</p>")
+        self.server = StaticServer(("127.0.0.1", 0), self.tmp.name, metrics=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.conn = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=5)
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def get(self, path):
+        self.conn.request("GET", path)
+        response = self.conn.getresponse()
+        return response, response.read().decode()
+
+    def test_counts_requests_by_status(self):
+        before = self.find("ssg_http_requests_total")
+        ok = before.get(method="GET", code=200)
+        missing = before.get(method="GET", code=404)
+        self.get("/")
+        self.get("/nope")
+        response, body = self.get("/metrics")
+        self.assertEqual(response.status, 200)
+        self.assertTrue(response.getheader("Content-Type").startswith("text/plain; version=0.0.4"))
+        self.assertIn(f'ssg_http_requests_total{{method="GET",code="200"}} {ok + 1}', body)
+        self.assertIn(f'ssg_http_requests_total{{method="GET",code="404"}} {missing + 1}', body)
+        self.assertIn('ssg_http_request_duration_seconds_count{method="GET"}', body)
+        self.assertIn('ssg_cache_misses_total{cache="hot_file"}', body)
+
+    def test_disabled_by_default(self):
+        self.server.metrics = False
+        response, _ = self.get("/metrics")
+        self.assertEqual(response.status, 404)
+
+    def find(self, name):
+        return next(metric for metric in REGISTRY.metrics if metric.name == name)
+
+
+if __name__ == "__main__":
+    unittest.main()
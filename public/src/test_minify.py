@@ -0,0 +1,42 @@
+import unittest
+from markdown import markdown_to_html_node
+from minify import StreamMinifier, minify_template
+
+class TestMinifyTemplate(unittest.TestCase):
+    def test_collapses_whitespace_around_block_tags(self):
+        html = "<html>\n  <head>\n    <title> {{ Title }} </title>\n  </head>\n  <body>\n    <article>\n      {{ Content }}\n    </article>\n  </body>\n</html>\n"
+        self.assertEqual(
+            minify_template(html),
+            "<html><head><title>{{ Title }}</title></head><body><article>{{ Content }}</article></body></html>",
+        )
+
+    def test_keeps_single_space_between_inline_elements(self):
+        self.assertEqual(minify_template("<p><b>a</b>\n   <i>b</i></p>"), "<p><b>a</b> <i>b</i></p>")
+
+    def test_removes_comments(self):
+        self.assertEqual(minify_template("<div><!-- note --></div>"), "<div></div>")
+
+    def test_preserves_pre_and_script(self):
+        html = "<div>\n<pre>  a\n   b</pre>\n<script>\n  var x = 1;\n</script>\n</div>"
+        self.assertEqual(
+            minify_template(html),
+            "<div><pre>  a\n   b</pre><script>\n  var x = 1;\n</script></div>",
+        )
+
+class TestStreamMinifier(unittest.TestCase):
+    def test_collapses_text_chunks(self):
+        node = markdown_to_html_node("Some text\nover   two lines")
+        minifier = StreamMinifier()
+        html = "".join(minifier.minify(node.iter_html()))
+        self.assertEqual(html, "<div><p>Some text over two lines</p></div>")
+        self.assertEqual(minifier.saved, 2)
+
+    def test_preserves_code_blocks(self):
+        markdown = "```\ndef f():\n    return  1\n```\n\nInline `a   b`   here"
+        node = markdown_to_html_node(markdown)
+        html = "".join(StreamMinifier().minify(node.iter_html()))
+        self.assertIn("<code>def f():\n    return  1</code>", html)
+        self.assertIn("<code>a   b</code> here", html)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+import unittest
+from htmlnode import LeafNode, ParentNode
+from navigation import NAVIGATION_SCRIPT_TAG, format_navigation_script, table_of_contents
+from outputs import OutputWriter
+from pages import compile_template, render_html, render_page, render_page_data, write_page
+
+class TestTableOfContents(unittest.TestCase):
+    def test_headings_in_order(self):
+        tree = ParentNode("div", [
+            ParentNode("h1", [LeafNode(None, "Title")]),
+            ParentNode("h2", [LeafNode(None, "Intro "), LeafNode("code", "x")]),
+            ParentNode("blockquote", [ParentNode("h3", [LeafNode(None, "Quoted")])]),
+            ParentNode("h2", [LeafNode(None, "End")]),
+        ])
+        self.assertEqual(table_of_contents(tree), [
+            {"level": 2, "text": "Intro x"},
+            {"level": 3, "text": "Quoted"},
+            {"level": 2, "text": "End"},
+        ])
+
+class TestPageData(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.template_path = os.path.join(self.tmp.name, "template.html")
+        with open(self.template_path, "w") as f:
+            f.write("<head><title>{{ Title }}</title></head><body><nav>{{ Section }}</nav>{{ Content }}</body>")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_content_comes_from_the_render_pass(self):
+        template = compile_template(self.template_path, page_data=True)
+        page = render_page("# Post\n\n## Part *one*\n\nText", template, base="/blog/post/")
+        html = render_html(page)
+        data = json.loads(render_page_data(page))
+        self.assertIn(NAVIGATION_SCRIPT_TAG + "</head>", html)
+        self.assertTrue(data["content"].startswith('<div data-page-content="">'))
+        self.assertIn(data["content"], html)
+        self.assertEqual({key: data[key] for key in ("title", "url", "section", "toc")}, {
+            "title": "Post",
+            "url": "/blog/post/",
+            "section": "blog",
+            "toc": [{"level": 2, "text": "Part one"}],
+        })
+
+    def test_written_next_to_the_page(self):
+        dest_dir = os.path.join(self.tmp.name, "public")
+        writer = OutputWriter(dest_dir)
+        template = compile_template(self.template_path, page_data=True)
+        write_page(render_page("# Post", template, base="/post/"), os.path.join(dest_dir, "post", "index.html"),
+                   writer)
+        with open(os.path.join(dest_dir, "post", "page.json")) as f:
+            self.assertEqual(json.load(f)["title"], "Post")
+        self.assertEqual(writer.written, 1)
+
+    def test_off_by_default(self):
+        template = compile_template(self.template_path)
+        page = render_page("# Post", template)
+        self.assertNotIn("data-page-content", render_html(page))
+        self.assertIsNone(render_page_data(page))
+
+    def test_script_loads_page_data(self):
+        script = format_navigation_script()
+        self.assertIn('"[data-page-content]"', script)
+        self.assertIn('"page.json"', script)
+
+if __name__ == "__main__":
+    unittest.main()
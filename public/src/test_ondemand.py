@@ -0,0 +1,91 @@
+import http.client
+import os
+import tempfile
+import threading
+import unittest
+from ondemand import OnDemandServer, OnDemandSite, PageCache
+
+class TestPageCache(unittest.TestCase):
+    def test_validator_mismatch_is_a_miss(self):
+        cache = PageCache()
+        cache.put("a", 1, b"one")
+        self.assertEqual(cache.get("a", 1), b"one")
+        self.assertIsNone(cache.get("a", 2))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_bounded_by_bytes(self):
+        cache = PageCache(max_bytes=5)
+        cache.put("a", 1, b"aaa")
+        cache.put("b", 1, b"bbb")
+        self.assertIsNone(cache.get("a", 1))
+        self.assertEqual(cache.size, 3)
+        cache.put("c", 1, b"cccccc")
+        self.assertIsNone(cache.get("c", 1))
+
+class TestOnDemandSite(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content_dir = os.path.join(self.tmp.name, "content")
+        self.static_dir = os.path.join(self.tmp.name, "static")
+        os.makedirs(os.path.join(self.content_dir, "blog"))
+        os.makedirs(self.static_dir)
+        self.template_path = os.path.join(self.tmp.name, "template.html")
+        self.write(self.template_path, "<title>{{ Title }}</title>{{ Content }}")
+        self.write(os.path.join(self.content_dir, "index.md"), "# Home")
+        self.write(os.path.join(self.content_dir, "blog", "post.md"), "# Post")
+        self.write(os.path.join(self.static_dir, "index.css"), "body{}")
+        self.site = OnDemandSite(self.content_dir, self.template_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, content):
+        with open(path, "w") as f:
+            f.write(content)
+
+    def test_renders_and_caches(self):
+        data, _, _ = self.site.get("/blog/post/")
+        self.assertEqual(data, b"<title>Post</title><div><h1>Post</h1></div>")
+        self.site.get("/blog/post/")
+        self.assertEqual((self.site.cache.hits, self.site.cache.misses), (1, 1))
+        self.assertIsNone(self.site.get("/missing/"))
+
+    def test_invalidated_by_source_mtime(self):
+        path = os.path.join(self.content_dir, "index.md")
+        self.site.get("/")
+        self.write(path, "# Changed")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        data, _, _ = self.site.get("/")
+        self.assertIn(b"Changed", data)
+
+    def test_served_over_http(self):
+        server = OnDemandServer(("127.0.0.1", 0), self.site, self.static_dir)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=5)
+        try:
+            conn.request("GET", "/")
+            response = conn.getresponse()
+            self.assertEqual(response.read(), b"<title>Home</title><div><h1>Home</h1></div>")
+            conn.request("GET", "/", headers={"If-None-Match": response.getheader("ETag")})
+            response = conn.getresponse()
+            response.read()
+            self.assertEqual(response.status, 304)
+            conn.request("GET", "/blog/post")
+            response = conn.getresponse()
+            response.read()
+            self.assertEqual(response.status, 301)
+            self.write(os.path.join(self.content_dir, "日本.md"), "# Ja")
+            conn.request("GET", "/%E6%97%A5%E6%9C%AC?lang=ja")
+            response = conn.getresponse()
+            response.read()
+            self.assertEqual((response.status, response.getheader("Location")), (301, "/%E6%97%A5%E6%9C%AC/?lang=ja"))
+            conn.request("GET", "/index.css")
+            self.assertEqual(conn.getresponse().read(), b"body{}")
+        finally:
+            conn.close()
+            server.shutdown()
+            server.server_close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import unittest
+from outputs import OutputWriter
+
+class TestOutputWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.previous = os.path.join(self.tmp.name, "previous")
+        self.dest = os.path.join(self.tmp.name, "dest")
+        self.hashes_path = os.path.join(self.tmp.name, "state", "output-hashes.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, dest_dir, previous_dir, pages, hashes_path=None):
+        writer = OutputWriter(dest_dir, previous_dir, hashes_path)
+        for rel_path, content in pages.items():
+            writer.write(os.path.join(dest_dir, rel_path), content.encode("utf-8"))
+        writer.save()
+        return writer
+
+    def test_identical_output_keeps_previous_file(self):
+        self.build(self.previous, None, {"index.html": "<p>one</p>", "a/index.html": "<p>a</p>"},
+                   self.hashes_path)
+        before = os.stat(os.path.join(self.previous, "a", "index.html"))
+
+        writer = self.build(self.dest, self.previous, {"index.html": "<p>two</p>", "a/index.html": "<p>a</p>"},
+                            self.hashes_path)
+        self.assertEqual((writer.written, writer.unchanged), (1, 1))
+        after = os.stat(os.path.join(self.dest, "a", "index.html"))
+        self.assertEqual((after.st_ino, after.st_mtime_ns), (before.st_ino, before.st_mtime_ns))
+        with open(os.path.join(self.dest, "index.html")) as f:
+            self.assertEqual(f.read(), "<p>two</p>")
+        with open(os.path.join(self.previous, "index.html")) as f:
+            self.assertEqual(f.read(), "<p>one</p>")
+
+    def test_recorded_hash_is_not_trusted_after_file_changes(self):
+        self.build(self.previous, None, {"index.html": "<p>one</p>"}, self.hashes_path)
+        with open(os.path.join(self.previous, "index.html"), "w") as f:
+            f.write("<p>two</p>")
+
+        writer = self.build(self.dest, self.previous, {"index.html": "<p>two</p>"}, self.hashes_path)
+        self.assertEqual(writer.unchanged, 1)
+
+    def test_hashes_are_saved(self):
+        self.build(self.previous, None, {"index.html": "<p>one</p>"}, self.hashes_path)
+        with open(self.hashes_path) as f:
+            hashes = json.load(f)
+        self.assertEqual(list(hashes), ["index.html"])
+        self.assertEqual(hashes["index.html"][1], len("<p>one</p>"))
+
+    def test_in_place_leaves_identical_file_alone(self):
+        self.build(self.dest, None, {"index.html": "<p>one</p>"})
+        before = os.stat(os.path.join(self.dest, "index.html"))
+        writer = self.build(self.dest, self.dest, {"index.html": "<p>one</p>"})
+        after = os.stat(os.path.join(self.dest, "index.html"))
+        self.assertEqual(writer.unchanged, 1)
+        self.assertEqual((after.st_ino, after.st_mtime_ns), (before.st_ino, before.st_mtime_ns))
+
+    def test_stream(self):
+        self.build(self.previous, None, {"big.html": "abcdef"})
+        writer = OutputWriter(self.dest, self.previous)
+        self.assertFalse(writer.stream(os.path.join(self.dest, "big.html"), iter(["abc", "def"])))
+        self.assertTrue(writer.stream(os.path.join(self.dest, "other.html"), iter(["x"])))
+        self.assertEqual(sorted(os.listdir(self.dest)), ["big.html", "other.html"])
+
+    def test_precompressed_siblings_are_kept(self):
+        self.build(self.previous, None, {"index.html": "<p>one</p>"})
+        page = os.path.join(self.previous, "index.html")
+        with open(page + ".gz", "wb") as f:
+            f.write(b"gz")
+        os.utime(page + ".gz", ns=(os.stat(page).st_atime_ns, os.stat(page).st_mtime_ns))
+
+        self.build(self.dest, self.previous, {"index.html": "<p>one</p>"})
+        self.assertTrue(os.path.samefile(page + ".gz", os.path.join(self.dest, "index.html.gz")))
+
+if __name__ == "__main__":
+    unittest.main()
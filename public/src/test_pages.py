@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from pages import compile_template, output_path_for, render_page, site_pages, source_candidates, url_for
+from template import Template
+
+class TestPagePaths(unittest.TestCase):
+    def test_output_path_for(self):
+        self.assertEqual(output_path_for("index.md"), "index.html")
+        self.assertEqual(output_path_for("blog/index.md"), "blog/index.html")
+        self.assertEqual(output_path_for("blog/post.md"), "blog/post/index.html")
+
+    def test_url_for(self):
+        self.assertEqual(url_for("index.html"), "/")
+        self.assertEqual(url_for("blog/post/index.html"), "/blog/post/")
+
+    def test_source_candidates_inverts_output_path(self):
+        self.assertEqual(source_candidates("/"), ["index.md"])
+        self.assertEqual(source_candidates("/index.html"), ["index.md"])
+        self.assertEqual(source_candidates("/blog/post/"), ["blog/post/index.md", "blog/post.md"])
+        self.assertEqual(source_candidates("/blog/post/index.html"), ["blog/post/index.md", "blog/post.md"])
+        self.assertEqual(source_candidates("/a/../../b/"), ["b/index.md", "b.md"])
+        self.assertEqual(source_candidates("/other.html"), [])
+        for rel_source in ("index.md", "blog/index.md", "blog/post.md"):
+            self.assertIn(rel_source, source_candidates(url_for(output_path_for(rel_source))))
+
+class TestRenderPage(unittest.TestCase):
+    def test_render_page(self):
+        template = Template("<title>{{ Title }}</title>{{ Content }}")
+        page = render_page("# Hello\n\n![a](img.png)", template, {"blog/img.png": "blog/img.1.png"}, "/blog/")
+        self.assertEqual(page.title, "Hello")
+        self.assertEqual(page.references, ["img.png"])
+        self.assertEqual(
+            "".join(page.iter_chunks()),
+            '<title>Hello</title><div><h1>Hello</h1><p><img src="/blog/img.1.png" alt="a"></p></div>',
+        )
+
+    def test_section_and_url_values(self):
+        template = Template("{{ Section }} {{ Url }}")
+        page = render_page("# Post", template, base="/blog/post/")
+        self.assertEqual("".join(page.iter_chunks()), "blog /blog/post/")
+
+class TestSitePages(unittest.TestCase):
+    def test_pages_listing_is_bound_to_templates_that_use_it(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            content_dir = os.path.join(tmp, "content")
+            os.makedirs(os.path.join(content_dir, "blog"))
+            for rel_source, text in (("index.md", "# Home"), ("blog/post.md", "no heading")):
+                with open(os.path.join(content_dir, *rel_source.split("/")), "w") as f:
+                    f.write(text)
+            self.assertEqual(site_pages(content_dir), [
+                {"title": "Home", "url": "/", "section": ""},
+                {"title": "/blog/post/", "url": "/blog/post/", "section": "blog"},
+            ])
+            template_path = os.path.join(tmp, "template.html")
+            with open(template_path, "w") as f:
+                f.write("{% for p in Pages %}{{ p.url }};{% endfor %}")
+            template = compile_template(template_path, content_dir=content_dir)
+            self.assertEqual("".join(template.render({})), "/;/blog/post/;")
+            with open(template_path, "w") as f:
+                f.write("{{ Title }}")
+            self.assertEqual(compile_template(template_path, content_dir=content_dir).globals, {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import threading
+import time
+import unittest
+from pipeline import run_pipeline
+
+class TestPipeline(unittest.TestCase):
+    def test_runs_every_item_through_every_stage(self):
+        written = {}
+        count = run_pipeline(range(50), lambda i: i * 2, lambda i, data: data + 1,
+                             lambda i, result: written.__setitem__(i, result))
+        self.assertEqual(count, 50)
+        self.assertEqual(written, {i: i * 2 + 1 for i in range(50)})
+
+    def test_backpressure_bounds_items_in_flight(self):
+        lock = threading.Lock()
+        state = {"in_flight": 0, "peak": 0, "pulled": 0}
+
+        def items():
+            for i in range(100):
+                state["pulled"] += 1
+                yield i
+
+        def read(i):
+            with lock:
+                state["in_flight"] += 1
+                state["peak"] = max(state["peak"], state["in_flight"])
+            return i
+
+        def write(i, result):
+            time.sleep(0.002)
+            with lock:
+                state["in_flight"] -= 1
+
+        run_pipeline(items(), read, lambda i, data: data, write, depth=4, readers=2, writers=1)
+        self.assertEqual(state["pulled"], 100)
+        # Both queues, one item per reader and writer, and one being processed
+        self.assertLessEqual(state["peak"], 2 * 4 + 2 + 1 + 1)
+
+    def test_errors_are_raised_from_any_stage(self):
+        def boom(*args):
+            raise RuntimeError("boom")
+
+        identity = lambda i, data=None: data
+        for read, process, write in ((boom, identity, lambda *a: None),
+                                     (lambda i: i, boom, lambda *a: None),
+                                     (lambda i: i, identity, boom)):
+            with self.assertRaisesRegex(RuntimeError, "boom"):
+                run_pipeline(range(100), read, process, write, depth=2)
+
+    def test_interrupt_in_process_stops_every_thread(self):
+        def interrupt(i, data):
+            raise KeyboardInterrupt
+
+        raised = []
+
+        def run():
+            try:
+                run_pipeline(range(1000), lambda i: i, interrupt, lambda *a: None, depth=1, readers=4)
+            except KeyboardInterrupt:
+                raised.append(True)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(raised, [True])
+
+
+if __name__ == "__main__":
+    unittest.main()
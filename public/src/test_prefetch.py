@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+import unittest
+from fingerprint import FingerprintCache
+from main import parse_args
+from pages import compile_template, render_page
+from prefetch import (
+    REGISTER_SERVICE_WORKER,
+    add_head_tags,
+    format_service_worker,
+    page_url,
+    precache_manifest,
+    prefetch_urls,
+)
+
+class TestPrefetch(unittest.TestCase):
+    def test_page_url(self):
+        self.assertEqual(page_url("/majesty"), "/majesty/")
+        self.assertEqual(page_url("post", "/blog/"), "/blog/post/")
+        self.assertEqual(page_url("../index.html#top", "/blog/post/"), "/blog/")
+        self.assertEqual(page_url("/?q=1"), "/")
+        self.assertIsNone(page_url("/images/a.png"))
+        self.assertIsNone(page_url("https://example.com/"))
+        self.assertIsNone(page_url("#section"))
+
+    def test_prefetch_urls_are_distinct_and_capped(self):
+        references = ["/a", "/images/x.png", "/a/", "/blog/", "https://example.com/", "/", "/c", "/d"]
+        self.assertEqual(prefetch_urls(references, "/blog/", 3), ["/a/", "/", "/c/"])
+
+    def test_head_tags(self):
+        self.assertEqual(add_head_tags("<head></HEAD><body>", "{{ Prefetch }}"), "<head>{{ Prefetch }}</HEAD><body>")
+        self.assertIn('register("/sw.js")', add_head_tags("<head></head>", REGISTER_SERVICE_WORKER))
+        self.assertEqual(add_head_tags("<body>", "{{ Prefetch }}"), "<body>")
+
+    def test_rendered_page_prefetches_linked_pages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            template_path = os.path.join(tmp, "template.html")
+            with open(template_path, "w") as f:
+                f.write("<head></head>{{ Content }}")
+            template = compile_template(template_path, prefetch=2)
+            page = render_page("# T\n\n[a](/a) [self](/t/) [b](b) [c](/c)", template, base="/t/")
+            html = "".join(page.iter_chunks())
+        self.assertTrue(html.startswith('<head><link rel="prefetch" href="/a/"><link rel="prefetch" href="/t/b/">'
+                                        '</head>'))
+
+class TestPrecacheManifest(unittest.TestCase):
+    def test_template_assets_with_hashes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            static_dir = os.path.join(tmp, "static")
+            os.makedirs(static_dir)
+            for name in ("index.css", "app.js", "unused.css"):
+                with open(os.path.join(static_dir, name), "w") as f:
+                    f.write(name)
+            template_path = os.path.join(tmp, "template.html")
+            with open(template_path, "w") as f:
+                f.write('<link href="/index.css" rel="stylesheet"><script src="/app.js"></script>'
+                        '<a href="https://example.com/">x</a><a href="/missing.css">y</a>')
+            precache = precache_manifest([template_path], static_dir, FingerprintCache(),
+                                         {"index.css": "index.1a2b.css"})
+            self.assertEqual([asset["url"] for asset in precache["assets"]], ["/app.js", "/index.1a2b.css"])
+            self.assertEqual(len(precache["assets"][0]["revision"]), 16)
+            with open(os.path.join(static_dir, "app.js"), "w") as f:
+                f.write("changed")
+            changed = precache_manifest([template_path], static_dir, FingerprintCache())
+            self.assertNotEqual(changed["version"], precache["version"])
+        self.assertIn(f"const VERSION = {json.dumps(precache['version'])};", format_service_worker(precache))
+
+class TestPrefetchOption(unittest.TestCase):
+    def test_parses_before_a_command(self):
+        args = parse_args(["--prefetch", "2", "daemon"])
+        self.assertEqual((args.prefetch, args.command), (2, "daemon"))
+        self.assertEqual(parse_args(["daemon"]).prefetch, 0)
+        self.assertEqual(parse_args(["--prefetch=4"]).prefetch, 4)
+
+if __name__ == "__main__":
+    unittest.main()
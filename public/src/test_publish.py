@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+from publish import (
+    current_generation,
+    generations_dir,
+    link_unchanged,
+    new_generation,
+    publish,
+    stale_generations,
+)
+
+class TestPublish(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.public_dir = os.path.join(self.tmp.name, "public")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def test_publish_swaps_generations(self):
+        self.assertIsNone(current_generation(self.public_dir))
+        first = new_generation(self.public_dir)
+        self.write(os.path.join(first, "index.html"), "one")
+        publish(first, self.public_dir)
+        self.assertTrue(os.path.islink(self.public_dir))
+        self.assertEqual(self.read(os.path.join(self.public_dir, "index.html")), "one")
+
+        second = new_generation(self.public_dir)
+        self.write(os.path.join(second, "index.html"), "two")
+        self.assertEqual(self.read(os.path.join(self.public_dir, "index.html")), "one")
+        publish(second, self.public_dir)
+        self.assertEqual(self.read(os.path.join(self.public_dir, "index.html")), "two")
+        self.assertEqual(current_generation(self.public_dir), os.path.realpath(second))
+        self.assertEqual(sorted(os.listdir(generations_dir(self.public_dir))),
+                         sorted([os.path.basename(first), os.path.basename(second)]))
+
+    def test_publish_over_a_plain_directory(self):
+        self.write(os.path.join(self.public_dir, "index.html"), "old")
+        staging = new_generation(self.public_dir)
+        self.write(os.path.join(staging, "index.html"), "new")
+        publish(staging, self.public_dir)
+        self.assertEqual(self.read(os.path.join(self.public_dir, "index.html")), "new")
+        self.assertEqual(len(os.listdir(generations_dir(self.public_dir))), 2)
+
+    def test_stale_generations_keep_live_and_newest(self):
+        generations = [new_generation(self.public_dir) for _ in range(4)]
+        publish(generations[1], self.public_dir)
+        self.assertEqual(stale_generations(self.public_dir, keep=2), [generations[0]])
+        self.assertEqual(stale_generations(self.public_dir, keep=0), [generations[0], generations[2], generations[3]])
+
+    def test_live_generation_is_never_stale(self):
+        # Reach the project through a symlink, so generation paths are not real paths
+        real = os.path.join(self.tmp.name, "real")
+        os.makedirs(real)
+        os.symlink(real, os.path.join(self.tmp.name, "link"))
+        public_dir = os.path.join(self.tmp.name, "link", "public")
+        generations = [new_generation(public_dir) for _ in range(4)]
+        publish(generations[0], public_dir)
+        self.assertEqual(stale_generations(public_dir, keep=2), [generations[1]])
+
+    def test_link_unchanged(self):
+        src = os.path.join(self.tmp.name, "static", "a.css")
+        previous = os.path.join(self.tmp.name, "previous", "a.css")
+        self.write(src, "body{}")
+        self.write(previous, "body{}")
+        self.write(previous + ".gz", "gz")
+        stat = os.stat(src)
+        for path in (previous, previous + ".gz"):
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.makedirs(os.path.join(self.tmp.name, "next"))
+
+        dest = os.path.join(self.tmp.name, "next", "a.css")
+        self.assertTrue(link_unchanged(src, dest, previous))
+        self.assertTrue(os.path.samefile(dest, previous))
+        self.assertTrue(os.path.samefile(dest + ".gz", previous + ".gz"))
+
+        os.utime(src, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        self.assertFalse(link_unchanged(src, os.path.join(self.tmp.name, "next", "b.css"), previous))
+        self.assertFalse(link_unchanged(src, dest + "x", os.path.join(self.tmp.name, "missing.css")))
+
+
+if __name__ == "__main__":
+    unittest.main()
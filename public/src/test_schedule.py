@@ -0,0 +1,37 @@
+import unittest
+from schedule import critical_path, format_path, longest_first, run_longest_first, simulate
+
+def square(x):
+    return x * x
+
+class TestSchedule(unittest.TestCase):
+    def test_longest_first_minimizes_makespan(self):
+        costs = {"a.md": 1, "b.md": 1, "c.md": 1, "d.md": 1, "huge.md": 4}
+        self.assertEqual(longest_first(costs), ["huge.md", "a.md", "b.md", "c.md", "d.md"])
+        naive, _ = critical_path(simulate(sorted(costs), costs, 2))
+        makespan, names = critical_path(simulate(longest_first(costs), costs, 2))
+        self.assertEqual(naive, 6)
+        self.assertEqual(makespan, 4)
+        self.assertEqual(names, ["huge.md"])
+
+    def test_simulate_lanes(self):
+        lanes = simulate(["a", "b", "c"], {"a": 3, "b": 1, "c": 1}, 2)
+        self.assertEqual(lanes, [[("a", 0.0, 3.0)], [("b", 0.0, 1.0), ("c", 1.0, 2.0)]])
+
+    def test_critical_path_of_nothing(self):
+        self.assertEqual(critical_path(simulate([], {}, 2)), (0.0, []))
+
+    def test_format_path(self):
+        self.assertEqual(format_path(1.5, ["a", "b", "c"], limit=2), "1.500s (a, b and 1 more)")
+
+    def test_run_longest_first(self):
+        jobs = {str(i): (i,) for i in range(6)}
+        costs = {str(i): float(i) for i in range(6)}
+        results, predicted, actual = run_longest_first(square, jobs, costs, 2)
+        self.assertEqual(results, {str(i): i * i for i in range(6)})
+        self.assertEqual(len(predicted), 2)
+        self.assertEqual(sorted(name for lane in actual for name, _, _ in lane), sorted(jobs))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+import gzip
+import http.client
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from server import HotFileCache, StaticRequestHandler, StaticServer, parse_accept_encoding
+
+class TestParseAcceptEncoding(unittest.TestCase):
+    def test_q_values(self):
+        self.assertEqual(parse_accept_encoding("gzip, br;q=0.5, zstd;q=0"), {"gzip", "br"})
+
+    def test_wildcard_and_missing(self):
+        self.assertEqual(parse_accept_encoding(None), set())
+        self.assertTrue({"gzip", "br", "zstd"} <= parse_accept_encoding("*"))
+
+class TestHotFileCache(unittest.TestCase):
+    def test_hits_until_file_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "a.txt")
+            with open(path, "w") as f:
+                f.write("one")
+            cache = HotFileCache()
+            self.assertEqual(cache.get(path, os.stat(path)), b"one")
+            self.assertEqual(cache.get(path, os.stat(path)), b"one")
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            with open(path, "w") as f:
+                f.write("three")
+            self.assertEqual(cache.get(path, os.stat(path)), b"three")
+
+    def test_evicts_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = HotFileCache(max_bytes=10)
+            paths = []
+            for name in ("a", "b", "c"):
+                path = os.path.join(tmp, name)
+                with open(path, "w") as f:
+                    f.write("x" * 4)
+                paths.append(path)
+                cache.get(path, os.stat(path))
+            self.assertEqual(list(cache.entries), paths[1:])
+            self.assertEqual(cache.size, 8)
+
+    def test_large_files_bypass_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "big")
+            with open(path, "w") as f:
+                f.write("x" * 100)
+            self.assertIsNone(HotFileCache(max_file_size=10).get(path, os.stat(path)))
+
+class TestStaticServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        os.makedirs(os.path.join(root, "docs"))
+        self.page = "<p>hello</p>" * 100
+        self.write("index.html", self.page)
+        self.write("docs/index.html", "<p>docs</p>")
+        self.write("app.12345678.css", "body{}")
+        self.write("big.bin", "x" * 200_000)
+        self.write("_headers", "/app.12345678.css\n  Cache-Control: public, max-age=31536000, immutable\n")
+        with open(os.path.join(root, "index.html.gz"), "wb") as f:
+            f.write(gzip.compress(self.page.encode()))
+        self.server = StaticServer(("127.0.0.1", 0), root)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.conn = http.client.HTTPConnection("127.0.0.1", self.server.server_address[1], timeout=5)
+
+    def tearDown(self):
+        self.conn.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def write(self, rel_path, content):
+        with open(os.path.join(self.tmp.name, rel_path), "w") as f:
+            f.write(content)
+
+    def get(self, path, headers=None):
+        self.conn.request("GET", path, headers=headers or {})
+        response = self.conn.getresponse()
+        return response, response.read()
+
+    def test_serves_index_with_validators(self):
+        response, body = self.get("/")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body.decode(), self.page)
+        self.assertEqual(response.getheader("Content-Type"), "text/html; charset=utf-8")
+        self.assertEqual(response.getheader("Cache-Control"), "no-cache")
+        self.assertEqual(response.getheader("Vary"), "Accept-Encoding")
+        self.assertTrue(response.getheader("ETag"))
+        self.assertTrue(response.getheader("Last-Modified"))
+
+    def test_conditional_requests(self):
+        response, _ = self.get("/docs/")
+        etag = response.getheader("ETag")
+        response, body = self.get("/docs/", {"If-None-Match": etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b"")
+        response, _ = self.get("/docs/", {"If-Modified-Since": response.getheader("Last-Modified")})
+        self.assertEqual(response.status, 304)
+
+    def test_precompressed_negotiation(self):
+        response, body = self.get("/", {"Accept-Encoding": "br, gzip"})
+        self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(gzip.decompress(body).decode(), self.page)
+        plain, _ = self.get("/")
+        self.assertNotEqual(response.getheader("ETag"), plain.getheader("ETag"))
+
+    def test_headers_file_rules(self):
+        response, _ = self.get("/app.12345678.css")
+        self.assertEqual(response.getheader("Cache-Control"), "public, max-age=31536000, immutable")
+
+    def test_headers_file_reloaded_after_publish(self):
+        self.get("/app.12345678.css")
+        generation = os.path.join(self.tmp.name, "generation")
+        os.makedirs(generation)
+        with open(os.path.join(generation, "_headers"), "w") as f:
+            f.write("/app.12345678.css\n  Cache-Control: public, max-age=60\n")
+        # Same mtime as the old file: only the real path tells them apart
+        old_stat = os.stat(os.path.join(self.tmp.name, "_headers"))
+        os.utime(os.path.join(generation, "_headers"), ns=(old_stat.st_atime_ns, old_stat.st_mtime_ns))
+        os.replace(os.path.join(self.tmp.name, "_headers"), os.path.join(self.tmp.name, "old_headers"))
+        os.symlink(os.path.join(generation, "_headers"), os.path.join(self.tmp.name, "_headers"))
+        response, _ = self.get("/app.12345678.css")
+        self.assertEqual(response.getheader("Cache-Control"), "public, max-age=60")
+        os.remove(os.path.join(self.tmp.name, "_headers"))
+        response, _ = self.get("/app.12345678.css")
+        self.assertEqual(response.getheader("Cache-Control"), "no-cache")
+
+    def test_large_file_uses_sendfile_path(self):
+        response, body = self.get("/big.bin")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(body), 200_000)
+
+    def test_redirect_and_not_found(self):
+        response, _ = self.get("/docs")
+        self.assertEqual(response.status, 301)
+        self.assertEqual(response.getheader("Location"), "/docs/")
+        response, _ = self.get("/missing.html")
+        self.assertEqual(response.status, 404)
+        response, _ = self.get("/../../etc/passwd")
+        self.assertEqual(response.status, 404)
+
+    def test_redirect_keeps_encoding_and_query(self):
+        os.makedirs(os.path.join(self.tmp.name, "日本"))
+        self.write("日本/index.html", "<p>ja</p>")
+        response, _ = self.get("/%E6%97%A5%E6%9C%AC?lang=ja")
+        self.assertEqual(response.status, 301)
+        self.assertEqual(response.getheader("Location"), "/%E6%97%A5%E6%9C%AC/?lang=ja")
+        response, body = self.get(response.getheader("Location"))
+        self.assertEqual(body, b"<p>ja</p>")
+
+class QuickTimeoutHandler(StaticRequestHandler):
+    timeout = 0.2
+
+class TestIdleConnections(unittest.TestCase):
+    def test_idle_connection_is_closed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            server = StaticServer(("127.0.0.1", 0), tmp, handler_class=QuickTimeoutHandler)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                with socket.create_connection(server.server_address, timeout=5) as sock:
+                    self.assertEqual(sock.recv(1), b"")
+            finally:
+                server.shutdown()
+                server.server_close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import json
+import os
+import tempfile
+import unittest
+from htmlnode import LeafNode, ParentNode
+from shard import (
+    SEARCH_INDEX_FILE,
+    SHARD_MANIFEST,
+    SITEMAP_FILE,
+    merge_shards,
+    parse_shard,
+    partition,
+    plain_text,
+    plan_digest,
+    plan_shards,
+    write_shard_manifest,
+)
+
+class TestPartition(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for spec in ("0/4", "5/4", "1", "a/b"):
+            with self.assertRaises(ValueError):
+                parse_shard(spec)
+
+    def test_balances_by_cost_not_count(self):
+        costs = {"big.md": 100, "a.md": 10, "b.md": 10, "c.md": 10, "d.md": 10}
+        self.assertEqual(partition(costs, 2), [["big.md"], ["a.md", "b.md", "c.md", "d.md"]])
+
+    def test_deterministic(self):
+        costs = {f"p{i}.md": i % 7 for i in range(50)}
+        shuffled = dict(reversed(list(costs.items())))
+        groups = partition(costs, 3)
+        self.assertEqual(groups, partition(shuffled, 3))
+        self.assertEqual(plan_digest(groups), plan_digest(partition(shuffled, 3)))
+        self.assertEqual(sorted(sum(groups, [])), sorted(costs))
+
+    def test_plan_uses_shared_inputs_only(self):
+        sizes = {"a.md": 300, "b.md": 100, "c.md": 100, "d.md": 100}
+        self.assertEqual(plan_shards(sizes, 2), [["a.md"], ["b.md", "c.md", "d.md"]])
+        with tempfile.TemporaryDirectory() as tmp:
+            costs_path = os.path.join(tmp, "page-costs.json")
+            with open(costs_path, "w") as f:
+                json.dump({"a.md": 0.1, "b.md": 0.5}, f)
+            self.assertEqual(plan_shards(sizes, 2, costs_path), [["b.md"], ["a.md", "c.md", "d.md"]])
+
+    def test_plain_text(self):
+        node = ParentNode("div", [LeafNode("h1", "Title"), ParentNode("p", [LeafNode(None, "a\n b"), LeafNode("b", "c")])])
+        self.assertEqual(plain_text(node), "Title a b c")
+
+
+class TestMerge(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.groups = [["index.md"], ["blog.md"]]
+        self.shards = [self.shard(1, {"index.html": "home", "index.css": "body{}"}, "/"),
+                       self.shard(2, {"blog/index.html": "blog"}, "/blog/")]
+        self.out = os.path.join(self.tmp.name, "out")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def shard(self, index, files, url, groups=None):
+        shard_dir = os.path.join(self.tmp.name, f"shard{index}")
+        for rel_path, content in files.items():
+            path = os.path.join(shard_dir, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(content)
+        pages = [{"url": url, "title": url, "text": "words"}]
+        write_shard_manifest(shard_dir, index, 2, plan_digest(groups or self.groups), 2, pages)
+        return shard_dir
+
+    def test_merge(self):
+        summary = merge_shards(self.shards, self.out, "https://example.com/")
+        self.assertEqual(summary, {"shards": 2, "files": 3, "pages": 2})
+        self.assertFalse(os.path.exists(os.path.join(self.out, SHARD_MANIFEST)))
+        with open(os.path.join(self.out, "blog", "index.html")) as f:
+            self.assertEqual(f.read(), "blog")
+        with open(os.path.join(self.out, SITEMAP_FILE)) as f:
+            sitemap = f.read()
+        self.assertIn("<loc>https://example.com/</loc>", sitemap)
+        self.assertIn("<loc>https://example.com/blog/</loc>", sitemap)
+        with open(os.path.join(self.out, SEARCH_INDEX_FILE)) as f:
+            self.assertEqual([page["url"] for page in json.load(f)], ["/", "/blog/"])
+
+    def test_detects_overlapping_outputs(self):
+        with open(os.path.join(self.shards[1], "index.css"), "w") as f:
+            f.write("body{}")
+        with self.assertRaisesRegex(ValueError, "index.css"):
+            merge_shards(self.shards, self.out)
+
+    def test_rejects_incomplete_or_mismatched_shards(self):
+        with self.assertRaisesRegex(ValueError, "exactly once"):
+            merge_shards(self.shards[:1], self.out)
+        self.shard(2, {}, "/blog/", groups=[["index.md", "blog.md"], []])
+        with self.assertRaisesRegex(ValueError, "different partitions"):
+            merge_shards(self.shards, self.out)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+import os
+import tempfile
+import unittest
+from state import load_state, save_state
+
+class TestState(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "state", "entries.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        save_state(self.path, {"a": [1, 2]})
+        self.assertEqual(load_state(self.path, {}), {"a": [1, 2]})
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["entries.json"])
+
+    def test_missing_or_corrupt_gives_default(self):
+        self.assertEqual(load_state(None, {}), {})
+        self.assertIsNone(load_state(self.path))
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as f:
+            f.write('{"a": ')
+        self.assertEqual(load_state(self.path, {}), {})
+
+if __name__ == "__main__":
+    unittest.main()
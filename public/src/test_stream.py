@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+from stream import LinkGraph, generate_pages_streaming, scan_sources
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content_dir = os.path.join(self.tmp.name, "content")
+        self.out_dir = os.path.join(self.tmp.name, "public")
+        self.template_path = os.path.join(self.tmp.name, "template.html")
+        with open(self.template_path, "w") as f:
+            f.write("<title>{{ Title }}</title>{{ Content }}")
+        self.write("index.md", "# Home\n\n![logo](/images/logo.png)")
+        self.write("blog/post.md", "# Post\n\n![pic](pic.png)")
+        self.write("blog/notes.txt", "not markdown")
+        self.links = LinkGraph(os.path.join(self.tmp.name, "state", "links.sqlite"))
+
+    def tearDown(self):
+        self.links.close()
+        self.tmp.cleanup()
+
+    def write(self, rel_path, content):
+        path = os.path.join(self.content_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def test_scan_sources(self):
+        found = sorted(scan_sources(self.content_dir))
+        self.assertEqual(found, [
+            ("blog/post.md", os.path.join(self.content_dir, "blog", "post.md")),
+            ("index.md", os.path.join(self.content_dir, "index.md")),
+        ])
+
+    def test_generate_pages_streaming(self):
+        written = generate_pages_streaming(self.content_dir, self.template_path, self.out_dir, self.links, window=1)
+        self.assertEqual(written, 2)
+        with open(os.path.join(self.out_dir, "blog", "post", "index.html")) as f:
+            self.assertEqual(f.read(), '<title>Post</title><div><h1>Post</h1><p><img src="pic.png" alt="pic"></p></div>')
+        self.assertIn("images/logo.png", self.links)
+        self.assertIn("blog/post/pic.png", self.links)
+        self.assertNotIn("pic.png", self.links)
+        self.assertEqual(self.links.pages_linking_to("blog/post/pic.png"), ["/blog/post/"])
+
+    def test_link_graph_template_references(self):
+        self.links.add("index.css")
+        self.assertIn("index.css", self.links)
+        self.assertEqual(self.links.pages_linking_to("index.css"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
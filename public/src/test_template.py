@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from template import Template, load_template
+
+class TestTemplate(unittest.TestCase):
+    def test_render_substitutes_placeholders(self):
+        template = Template("<title>{{ Title }}</title><main>{{Content}}</main>")
+        html = "".join(template.render({"Title": "Hi", "Content": iter(["<p>", "x", "</p>"])}))
+        self.assertEqual(html, "<title>Hi</title><main><p>x</p></main>")
+
+    def test_repeated_and_unknown_placeholders(self):
+        template = Template("{{ Title }} - {{ Title }} {{ Other }}")
+        self.assertEqual("".join(template.render({"Title": "A"})), "A - A {{ Other }}")
+
+    def test_minify_counts_saved_bytes(self):
+        template = Template("<body>\n    {{ Content }}\n</body>\n", minify=True)
+        self.assertEqual(template.text, "<body>{{ Content }}</body>")
+        self.assertEqual(template.saved, 7)
+
+    def test_loops_and_dotted_names(self):
+        template = Template("{% for p in Pages %}<a href='{{ p.url }}'>{{ p.title }}</a>{% endfor %}")
+        pages = [{"url": "/", "title": "Home"}, {"url": "/blog/", "title": "Blog"}]
+        self.assertEqual("".join(template.render({"Pages": pages})),
+                         "<a href='/'>Home</a><a href='/blog/'>Blog</a>")
+        self.assertEqual("".join(template.render({})), "")
+        self.assertEqual(template.names, {"Pages"})
+
+    def test_conditionals(self):
+        template = Template("{% for p in Pages %}{% if p.url == Url %}[{{ p.title }}]"
+                            "{% elif not p.title %}?{% else %}{{ p.title }}{% endif %}{% endfor %}")
+        pages = [{"url": "/", "title": "Home"}, {"url": "/a/", "title": "A"}, {"url": "/b/", "title": ""}]
+        self.assertEqual("".join(template.render({"Pages": pages, "Url": "/a/"})), "Home[A]?")
+        self.assertEqual(template.names, {"Pages", "Url"})
+
+    def test_globals_are_overridden_by_values(self):
+        template = Template("{{ Section }}")
+        template.globals["Section"] = "root"
+        self.assertEqual("".join(template.render({})), "root")
+        self.assertEqual("".join(template.render({"Section": "blog"})), "blog")
+
+    def test_cached_fragments_are_rendered_once_per_key(self):
+        template = Template('{% cache "nav" Section %}<nav>{% for p in Pages %}{{ p.title }}{% endfor %}</nav>'
+                            '{% endcache %}{{ Title }}')
+        template.bind("Pages", [{"title": "A"}])
+        outputs = ["".join(template.render({"Section": section, "Title": section})) for section in "aab"]
+        self.assertEqual(outputs, ["<nav>A</nav>a", "<nav>A</nav>a", "<nav>A</nav>b"])
+        self.assertEqual((template.fragments.rendered, template.fragments.reused), (2, 1))
+
+    def test_bind_invalidates_fragments(self):
+        template = Template('{% cache "nav" %}{% for p in Pages %}{{ p }}{% endfor %}{% endcache %}')
+        template.bind("Pages", ["a"])
+        self.assertEqual("".join(template.render({})), "a")
+        self.assertEqual("".join(template.render({})), "a")
+        template.bind("Pages", ["a", "b"])
+        self.assertEqual("".join(template.render({})), "ab")
+
+    def test_errors_name_the_line(self):
+        with self.assertRaisesRegex(ValueError, r"t.html:2: for is never closed"):
+            Template("x\n{% for a in b %}", name="t.html")
+        with self.assertRaisesRegex(ValueError, r"<template>:1: unknown tag"):
+            Template("{% block x %}")
+        with self.assertRaisesRegex(ValueError, r"endif without if"):
+            Template("{% for a in b %}{% endif %}")
+        with self.assertRaisesRegex(ValueError, r"endcache without cache"):
+            Template('{% if a %}{% endcache %}')
+
+class TestLoadTemplate(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.write("template.html", '<nav>{% include "partials/nav.html" %}</nav>{{ Content }}')
+        self.write("partials/nav.html", '{% include "partials/link.html" %}|')
+        self.write("partials/link.html", "<a>{{ Title }}</a>")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+
+    def test_includes_are_expanded(self):
+        template = load_template(os.path.join(self.dir, "template.html"))
+        self.assertEqual("".join(template.render({"Title": "T", "Content": "c"})), "<nav><a>T</a>|</nav>c")
+        self.assertEqual([os.path.relpath(path, self.dir) for path in template.files],
+                         ["template.html", os.path.join("partials", "nav.html"), os.path.join("partials", "link.html")])
+
+    def test_include_cycle(self):
+        self.write("partials/link.html", '{% include "partials/nav.html" %}')
+        with self.assertRaisesRegex(ValueError, "cycle"):
+            load_template(os.path.join(self.dir, "template.html"))
+
+    def test_compiled_code_is_cached(self):
+        cache_dir = os.path.join(self.dir, "cache")
+        first = load_template(os.path.join(self.dir, "template.html"), cache_dir=cache_dir)
+        cached = os.listdir(cache_dir)
+        self.assertEqual(len(cached), 1)
+        second = load_template(os.path.join(self.dir, "template.html"), cache_dir=cache_dir)
+        self.assertEqual(second.names, first.names)
+        self.assertEqual(os.listdir(cache_dir), cached)
+        self.assertEqual("".join(second.render({"Title": "T", "Content": "c"})), "<nav><a>T</a>|</nav>c")
+        self.write("partials/link.html", "<b>{{ Title }}</b>")
+        load_template(os.path.join(self.dir, "template.html"), cache_dir=cache_dir)
+        self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+if __name__ == "__main__":
+    unittest.main()